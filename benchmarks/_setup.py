@@ -0,0 +1,43 @@
+"""
+Shared setup for the benchmark scripts.
+
+Each script runs Django against a throwaway SQLite file (never ``db.sqlite3``)
+and migrates it, so it can be run directly: ``python benchmarks/bench_matching.py``.
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'blood_donation.settings')
+
+
+def setup_django(db_path=None):
+    """Point the default database at a scratch file, then set up and migrate"""
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='blood_bench_'), 'bench.sqlite3')
+    settings.DATABASES['default']['NAME'] = db_path
+    django.setup()
+    call_command('migrate', verbosity=0)
+    return db_path
+
+
+def timed(func, repeat=20):
+    """Run ``func`` ``repeat`` times and return (median_ms, p95_ms, last_result)"""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+    return statistics.median(samples), p95, result
@@ -0,0 +1,64 @@
+"""
+Bulk certificate rendering throughput.
+
+Renders the same batch of donation certificates into a ZIP (written to
+/dev/null) in-process and with process pools of increasing size, with the
+disk cache disabled, and reports certificates per second overall and per
+worker.
+
+    python benchmarks/bench_certificates.py [--donations 2000] [--workers 1 2 4]
+"""
+import argparse
+import datetime
+import os
+import random
+import time
+
+from _setup import setup_django
+
+
+def seed(count):
+    from blood_app.models import BloodDonation, User
+
+    rng = random.Random(3)
+    donors = User.objects.bulk_create(
+        User(name=f'Donor {i:05d}', age=rng.randint(18, 65), gender='Female', email=f'donor{i}@example.com',
+             phone='9876543210', city='City', district='Kollam', blood_group='A+')
+        for i in range(count // 4 + 1)
+    )
+    BloodDonation.objects.bulk_create(
+        (
+            BloodDonation(donor=rng.choice(donors), donation_date=datetime.date(2025, 1, 1) + datetime.timedelta(days=i % 60),
+                          hospital_name='Camp Hospital', blood_group='A+')
+            for i in range(count)
+        ),
+        batch_size=2000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--donations', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    args = parser.parse_args()
+
+    setup_django()
+    from blood_app.bulk_certificates import matching_donations, render_all, stream_zip
+
+    seed(args.donations)
+    donations = matching_donations(hospital='Camp Hospital')
+    print(f'{args.donations} certificates, {os.cpu_count()} CPU(s) available')
+    print(f"{'workers':>8}{'seconds':>10}{'certs/s':>10}{'per worker':>12}")
+    for workers in [0] + args.workers:
+        start = time.perf_counter()
+        with open(os.devnull, 'wb') as sink:
+            for chunk in stream_zip(render_all(donations, workers=workers, use_cache=False)):
+                sink.write(chunk)
+        elapsed = time.perf_counter() - start
+        rate = args.donations / elapsed
+        label = 'inline' if workers == 0 else str(workers)
+        print(f'{label:>8}{elapsed:>10.2f}{rate:>10.0f}{rate / max(workers, 1):>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+"Eligible now" at 1M donations.
+
+Seeds synthetic donors and donations (spread over five years), runs ANALYZE,
+then compares deciding eligibility per donor in Python (loading every willing
+donor and checking ``get_last_donation_date()``) with the SQL predicate of
+``eligibility.eligible``, for a count, the first donor list page and the
+notification targeting of one blood group. Checks both give the same donors
+and prints the query plans.
+
+    python benchmarks/bench_eligibility.py [--donors 250000] [--donations 1000000]
+"""
+import argparse
+import datetime
+import time
+
+from _setup import setup_django, timed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--donors', type=int, default=250_000)
+    parser.add_argument('--donations', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--group', default='O+', help='Requested blood group for notification targeting')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from django.utils import timezone
+
+    from blood_app import sqlite, synthetic
+    from blood_app.eligibility import eligible, interval_days
+    from blood_app.matching import find_compatible_donors
+    from blood_app.models import User
+
+    start = time.perf_counter()
+    synthetic.generate(args.donors, donations=args.donations, requests=0, contacts=0)
+    sqlite.maintain(connection)
+    print(f'Seeded {args.donors:,} donors and {args.donations:,} donations in {time.perf_counter() - start:.0f}s')
+
+    today = timezone.localdate()
+
+    def in_python():
+        ids = []
+        for donor in User.objects.filter(willing_to_donate=True).order_by('id'):
+            last = donor.get_last_donation_date()
+            if not settings.DONOR_MIN_AGE <= donor.age <= settings.DONOR_MAX_AGE:
+                continue
+            if last is None or last <= today - datetime.timedelta(days=interval_days(donor.gender)):
+                ids.append(donor.id)
+        return ids
+
+    willing = User.objects.filter(willing_to_donate=True)
+    python_ms, _, python_ids = timed(in_python, repeat=1)
+    sql_ms, _, sql_ids = timed(lambda: list(eligible(willing).order_by('id').values_list('id', flat=True)), repeat=1)
+    assert python_ids == sql_ids, 'Python and SQL disagree on who is eligible'
+    print(f'{len(sql_ids):,} of {willing.count():,} willing donors eligible now')
+    print(f"{'':<40}{'median ms':>12}{'p95 ms':>10}")
+    print(f"{'all eligible ids, per-donor Python':<40}{python_ms:>12.1f}")
+    print(f"{'all eligible ids, SQL predicate':<40}{sql_ms:>12.1f}")
+
+    cases = {
+        'count': lambda: eligible(willing).count(),
+        'donor_list first page': lambda: list(eligible(willing).order_by('name', 'id')[:25]),
+        f'notification targeting ({args.group})': lambda: list(
+            find_compatible_donors(args.group, eligible(willing.exclude(email=''))).values_list('name', 'email')),
+    }
+    plans = {}
+    for label, run in cases.items():
+        median, p95, _ = timed(run, args.repeat)
+        print(f'{label:<40}{median:>12.1f}{p95:>10.1f}')
+    for label, queryset in {
+        'count': eligible(willing),
+        'notification targeting': find_compatible_donors(args.group, eligible(willing.exclude(email=''))),
+    }.items():
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plans[label] = [row[-1] for row in cursor.fetchall()]
+    for label, plan in plans.items():
+        print(f'plan, {label}: {plan}')
+
+
+if __name__ == '__main__':
+    main()
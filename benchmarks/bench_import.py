@@ -0,0 +1,131 @@
+"""
+Bulk import throughput.
+
+Writes synthetic donor and donation files (a few percent of rows invalid),
+runs ``import_donors`` and ``import_donations`` on them and reports rows per
+second for each, with the time spent validating rows separately. The target
+is 50k rows/s on SQLite. Then compares writing the valid donors with
+``bulk.insert_rows`` and with ``bulk_create``, the ceiling for either path.
+
+    python benchmarks/bench_import.py [--donors 50000] [--donations 100000] [--format csv]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+
+from _setup import setup_django
+
+GROUPS = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+FIRST = ['Anu', 'Arjun', 'Biju', 'Deepa', 'Fathima', 'Gokul', 'Hari', 'Jisha', 'Manu', 'Nisha', 'Rahul', 'Sreeja']
+LAST = ['Kumar', 'Nair', 'Menon', 'Pillai', 'Thomas', 'Joseph', 'Varghese', 'Das', 'Krishnan', 'Mathew']
+
+
+def write(path, fmt, fields, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        if fmt == 'csv':
+            writer = csv.DictWriter(f, fields)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                f.write(json.dumps(row) + '\n')
+
+
+def donor_rows(count, rng):
+    from blood_app import geography
+
+    pairs = [(district, taluk) for district, taluks in geography.TALUKS_BY_DISTRICT.items() for taluk in taluks]
+    for i in range(count):
+        district, taluk = rng.choice(pairs)
+        yield {
+            'name': f'{rng.choice(FIRST)} {rng.choice(LAST)} {i}',
+            'age': rng.randint(18, 65) if rng.random() > 0.02 else 'old',
+            'gender': rng.choice(['Male', 'Female']),
+            'email': f'donor{i}@example.com',
+            'phone': f'9{rng.randrange(10 ** 9):09d}',
+            'city': taluk,
+            'district': district,
+            'taluk': taluk,
+            'blood_group': rng.choice(GROUPS),
+            'willing_to_donate': rng.random() > 0.1,
+        }
+
+
+def donation_rows(count, donors, rng):
+    for _ in range(count):
+        yield {
+            'donor_email': f'donor{rng.randrange(donors)}@example.com',
+            'donation_date': f'20{rng.randint(15, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}',
+            'hospital_name': f'Hospital {rng.randrange(40)}',
+            'blood_group': rng.choice(GROUPS),
+            'units_donated': rng.randint(1, 3) if rng.random() > 0.02 else 0,
+            'notes': '',
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--donors', type=int, default=50000)
+    parser.add_argument('--donations', type=int, default=100000)
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default='csv')
+    args = parser.parse_args()
+
+    setup_django()
+    from blood_app import importer
+    from blood_app.forms import BloodDonationForm, UserForm
+
+    rng = random.Random(7)
+    directory = tempfile.mkdtemp(prefix='blood_import_')
+    donors_path = os.path.join(directory, f'donors.{args.format}')
+    donations_path = os.path.join(directory, f'donations.{args.format}')
+    donor_fields = ['name', 'age', 'gender', 'email', 'phone', 'city', 'district', 'taluk', 'blood_group', 'willing_to_donate']
+    write(donors_path, args.format, donor_fields, donor_rows(args.donors, rng))
+    donation_fields = ['donor_email', 'donation_date', 'hospital_name', 'blood_group', 'units_donated', 'notes']
+    write(donations_path, args.format, donation_fields, donation_rows(args.donations, args.donors, rng))
+
+    for label, path, run, form_class, exclude in [
+        ('donors', donors_path, importer.import_donors, UserForm, ('photo',)),
+        ('donations', donations_path, importer.import_donations, BloodDonationForm, ('donor',)),
+    ]:
+        with importer.open_text(path) as stream:
+            rows = list(importer.read_rows(stream, args.format))
+        validator = importer.RowValidator(form_class, exclude)
+        start = time.perf_counter()
+        for _, row in rows:
+            validator.clean(row)
+        validating = time.perf_counter() - start
+
+        start = time.perf_counter()
+        result, _ = importer.import_file(run, path)
+        elapsed = time.perf_counter() - start
+        print(f'{label:<10} {len(rows):>7} rows  {elapsed:6.2f}s  {len(rows) / elapsed:>8,.0f} rows/s  '
+              f'(validation alone {len(rows) / validating:,.0f} rows/s)  '
+              f'created={result.created} rejected={result.rejected}')
+
+    from django.db import transaction
+
+    from blood_app.bulk import insert_rows
+    from blood_app.models import User
+
+    with importer.open_text(donors_path) as stream:
+        validator = importer.RowValidator(UserForm, ('photo',))
+        cleaned = [validator.clean(row) for _, row in importer.read_rows(stream, args.format)]
+    valid = [data for data, errors in cleaned if not errors]
+    for label, write_rows in [
+        ('insert_rows', lambda rows: insert_rows(User, rows)),
+        ('bulk_create', lambda rows: User.objects.bulk_create([User(**row) for row in rows], batch_size=1000)),
+    ]:
+        rows = [dict(data, email=f'{label}.{data["email"]}') for data in valid]
+        start = time.perf_counter()
+        with transaction.atomic():
+            write_rows(rows)
+        elapsed = time.perf_counter() - start
+        print(f'donor rows only, {label:<12} {len(rows) / elapsed:>8,.0f} rows/s')
+
+
+if __name__ == '__main__':
+    main()
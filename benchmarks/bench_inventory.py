@@ -0,0 +1,86 @@
+"""
+Concurrent inventory movements.
+
+Several threads hammer the same blood group with donations and issues through
+``apply_transaction``. Afterwards the stored balance must equal the sum of
+the ledger and the expected net movement; a read-modify-write implementation
+loses increments here.
+
+    python benchmarks/bench_inventory.py [--threads 8] [--movements 200]
+"""
+import argparse
+import random
+import threading
+import time
+
+from _setup import setup_django
+
+
+def worker(seed, movements, results):
+    from django.db import OperationalError, connection
+
+    from blood_app.inventory import InsufficientInventory, apply_transaction
+
+    rng = random.Random(seed)
+    net = retries = rejected = 0
+    try:
+        for _ in range(movements):
+            units = rng.choice([1, 2, 3]) if rng.random() < 0.6 else -rng.choice([1, 2])
+            while True:
+                try:
+                    apply_transaction('O+', 'Donation' if units > 0 else 'Issue', units)
+                except InsufficientInventory:
+                    rejected += 1
+                except OperationalError:
+                    # SQLite lets one writer in at a time; back off and retry
+                    retries += 1
+                    time.sleep(0.001)
+                    continue
+                else:
+                    net += units
+                break
+    finally:
+        connection.close()
+    results.append((net, retries, rejected))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--movements', type=int, default=200)
+    args = parser.parse_args()
+
+    from django.conf import settings
+    settings.DATABASES['default'].setdefault('OPTIONS', {})['timeout'] = 30
+    setup_django()
+    from django.db.models import Sum
+
+    from blood_app.models import BloodInventory, InventoryTransaction
+
+    results = []
+    threads = [
+        threading.Thread(target=worker, args=(seed, args.movements, results))
+        for seed in range(args.threads)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    expected = sum(net for net, _, _ in results)
+    balance = BloodInventory.objects.get(blood_group='O+').available_units
+    ledger = InventoryTransaction.objects.aggregate(total=Sum('units'))['total'] or 0
+    applied = InventoryTransaction.objects.count()
+    print(f'{args.threads} threads x {args.movements} movements in {elapsed:.2f}s '
+          f'({applied / elapsed:.0f} applied/s)')
+    print(f'retries: {sum(r for _, r, _ in results)}, rejected overdraws: {sum(r for _, _, r in results)}')
+    print(f'balance {balance}, ledger {ledger}, expected {expected}')
+    assert balance == ledger == expected, 'lost update'
+    assert balance >= 0
+    print('OK: no lost updates')
+
+
+if __name__ == '__main__':
+    main()
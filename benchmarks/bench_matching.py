@@ -0,0 +1,71 @@
+"""
+Compatibility matching at 100k donors.
+
+Compares the old exact-group lookup with ``find_compatible_donors`` and checks
+that the compatible lookup stays a single query for every recipient group.
+
+    python benchmarks/bench_matching.py [--donors 100000]
+"""
+import argparse
+import random
+
+from _setup import setup_django, timed
+
+
+def seed(count):
+    from blood_app.matching import BLOOD_GROUPS
+    from blood_app.models import User
+
+    rng = random.Random(42)
+    districts = [value for value, _ in User.DISTRICT_CHOICES]
+    User.objects.bulk_create(
+        (
+            User(
+                name=f'Donor {i:06d}',
+                age=rng.randint(18, 65),
+                gender=rng.choice(['Male', 'Female']),
+                email=f'donor{i}@example.com',
+                phone='9876543210',
+                city='City',
+                district=rng.choice(districts),
+                blood_group=rng.choice(BLOOD_GROUPS),
+                willing_to_donate=rng.random() < 0.8,
+            )
+            for i in range(count)
+        ),
+        batch_size=5000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--donors', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    from blood_app.matching import BLOOD_GROUPS, find_compatible_donors
+    from blood_app.models import User
+
+    seed(args.donors)
+    print(f'{args.donors} donors, median/p95 of {args.repeat} runs, full result materialised')
+    print(f"{'group':<6}{'exact ms':>12}{'compat ms':>12}{'p95 ms':>10}{'rows':>9}{'queries':>9}")
+    for group in BLOOD_GROUPS:
+        exact_ms, _, _ = timed(
+            lambda: list(User.objects.filter(willing_to_donate=True, blood_group=group).values_list('id', flat=True)),
+            args.repeat,
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            median, p95, rows = timed(
+                lambda: list(find_compatible_donors(group).values_list('id', flat=True)),
+                args.repeat,
+            )
+        queries = len(ctx.captured_queries) // args.repeat
+        print(f'{group:<6}{exact_ms:>12.1f}{median:>12.1f}{p95:>10.1f}{len(rows):>9}{queries:>9}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Certificate name search as the donor table grows.
+
+Seeds donors in steps, rebuilds the trigram index and times the ranked
+``search_names`` lookup against the old ``name__icontains`` filter, with an
+age (as the certificate form sends) and without one.
+
+    python benchmarks/bench_name_search.py [--steps 10000 50000 100000] [--budget 2000]
+"""
+import argparse
+import random
+
+from _setup import setup_django, timed
+
+SYLLABLES = ['an', 'ar', 'bi', 'de', 'go', 'ha', 'ja', 'ki', 'la', 'ma', 'ni', 'pri', 'ra', 'sa',
+             'sree', 'su', 'vi', 'ya', 'thu', 'kur', 'up', 'men', 'on', 'pil', 'lai', 'jo', 'seph']
+
+
+def random_word(rng):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+
+def seed(start, stop, rng):
+    from blood_app.models import User
+
+    User.objects.bulk_create(
+        (
+            User(
+                # A handful of real targets among varied synthetic names
+                name='Sreeja Kurup' if i % 5000 == 0 else f'{random_word(rng)} {random_word(rng)}',
+                age=30 if i % 5000 == 0 else rng.randint(18, 65),
+                gender='Male',
+                email=f'donor{i}@example.com',
+                phone='9876543210',
+                city='City',
+                blood_group='O+',
+            )
+            for i in range(start, stop)
+        ),
+        batch_size=5000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--steps', type=int, nargs='+', default=[10_000, 50_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--budget', type=int, help='NAME_SEARCH_MAX_CANDIDATES (default: settings)')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    from blood_app.models import User
+    from blood_app.search import rebuild_index, search_names
+
+    if args.budget:
+        settings.NAME_SEARCH_MAX_CANDIDATES = args.budget
+    rng = random.Random(7)
+    seeded = 0
+    print(f"{'donors':>8}  {'filter':<7}{'icontains ms':>12}{'trigram ms':>12}{'p95 ms':>9}  top match for 'sreja kurp'")
+    for target in args.steps:
+        seed(seeded, target, rng)
+        seeded = target
+        rebuild_index()
+        for label, filters in (('age=30', {'age': 30}), ('any', {})):
+            old_ms, _, _ = timed(lambda: list(User.objects.filter(name__icontains='sreja', **filters)[:50]), args.repeat)
+            median, p95, rows = timed(lambda: search_names('sreja kurp', **filters), args.repeat)
+            top = rows[0].name if rows else '-'
+            print(f'{target:>8}  {label:<7}{old_ms:>12.1f}{median:>12.1f}{p95:>9.1f}  {top}')
+
+
+if __name__ == '__main__':
+    main()
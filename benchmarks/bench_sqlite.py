@@ -0,0 +1,140 @@
+"""
+SQLite under concurrent requests: stock settings against the tuned profile.
+
+Writer threads record donations (the ``record_donation`` write path: donation,
+counters, inventory ledger) while reader threads run donor searches. Every
+operation ends with ``close_old_connections()`` as a request would, so
+``CONN_MAX_AGE`` matters. Each profile runs in its own process on a fresh
+database file:
+
+* ``default``: rollback journal, no pragmas, ``CONN_MAX_AGE=0``, 5 s timeout
+* ``tuned``: ``SQLITE_PRAGMAS`` and ``DATABASES`` from settings.py
+
+    python benchmarks/bench_sqlite.py [--profile both] [--seconds 10] [--writers 4] [--readers 4]
+"""
+import argparse
+import random
+import subprocess
+import sys
+import threading
+import time
+
+from _setup import setup_django
+
+GROUPS = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+
+
+def seed(donors):
+    from blood_app import geography
+    from blood_app.bulk import insert_rows
+    from blood_app.models import User
+
+    rng = random.Random(3)
+    pairs = [(district, taluk) for district, taluks in geography.TALUKS_BY_DISTRICT.items() for taluk in taluks]
+    rows = []
+    for i in range(donors):
+        district, taluk = rng.choice(pairs)
+        rows.append({
+            'name': f'Donor {i}', 'age': rng.randint(18, 65), 'gender': 'Male', 'email': f'donor{i}@example.com',
+            'phone': '9000000000', 'city': taluk, 'district': district, 'taluk': taluk,
+            'blood_group': rng.choice(GROUPS), 'willing_to_donate': True,
+        })
+    insert_rows(User, rows)
+    return list(User.objects.values_list('pk', 'blood_group'))
+
+
+def writer(donors, deadline, stats, seed):
+    from django.db import OperationalError, close_old_connections, transaction
+
+    from blood_app.inventory import apply_transaction
+    from blood_app.models import BloodDonation
+
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        donor_id, blood_group = rng.choice(donors)
+        start = time.perf_counter()
+        try:
+            with transaction.atomic():
+                donation = BloodDonation.objects.create(donor_id=donor_id, hospital_name='GH', blood_group=blood_group)
+                apply_transaction(blood_group, 'Donation', 1, donation=donation)
+        except OperationalError:
+            stats['locked'] += 1
+        else:
+            stats['writes'].append(time.perf_counter() - start)
+        finally:
+            close_old_connections()
+
+
+def reader(deadline, stats, seed):
+    from django.db import OperationalError, close_old_connections
+
+    from blood_app.models import User
+
+    rng = random.Random(seed)
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            list(User.objects.filter(blood_group=rng.choice(GROUPS), willing_to_donate=True)
+                 .order_by('name', 'id')[:25])
+        except OperationalError:
+            stats['locked'] += 1
+        else:
+            stats['reads'].append(time.perf_counter() - start)
+        finally:
+            close_old_connections()
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000 if samples else 0
+
+
+def run(profile, args):
+    from django.conf import settings
+
+    if profile == 'default':
+        settings.SQLITE_PRAGMAS = {}
+        settings.DATABASES['default'].update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False, OPTIONS={})
+    setup_django()
+    from django.db import connection
+
+    from blood_app import sqlite
+
+    donors = seed(args.donors)
+    journal = sqlite.pragma(connection, 'journal_mode')
+    connection.close()
+
+    stats = {'writes': [], 'reads': [], 'locked': 0}
+    deadline = time.perf_counter() + args.seconds
+    threads = [threading.Thread(target=writer, args=(donors, deadline, stats, i)) for i in range(args.writers)]
+    threads += [threading.Thread(target=reader, args=(deadline, stats, 100 + i)) for i in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    print(f'{profile:<8} journal={journal:<7} '
+          f'writes {len(stats["writes"]) / args.seconds:7,.0f}/s (p95 {percentile(stats["writes"], 0.95):6.1f} ms)  '
+          f'reads {len(stats["reads"]) / args.seconds:7,.0f}/s (p95 {percentile(stats["reads"], 0.95):6.1f} ms)  '
+          f'locked={stats["locked"]}')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--profile', choices=['both', 'default', 'tuned'], default='both')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=4)
+    parser.add_argument('--donors', type=int, default=20000)
+    args = parser.parse_args()
+
+    if args.profile != 'both':
+        run(args.profile, args)
+        return
+    # Separate processes: settings and open connections differ per profile
+    for profile in ['default', 'tuned']:
+        subprocess.run([sys.executable, __file__, *sys.argv[1:], '--profile', profile], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Latency, query count and response size of every page at a given scale.
+
+Seeds a scratch database with ``seed_synthetic``, then requests each URL of
+blood_app/urls.py (``synthetic.sample_urls``) through the test client as a
+logged-in superuser. The first request of each URL counts queries and bytes
+(and warms the caches); the next ``--repeat`` are timed. Prints a table, and
+with ``--output`` writes the results as JSON for comparing runs.
+
+    python benchmarks/bench_views.py [--donors 10000] [--repeat 20] [--output views.json]
+"""
+import argparse
+import json
+import time
+
+from _setup import setup_django, timed
+
+
+def fetch(client, url):
+    response = client.get(url)
+    body = b''.join(response.streaming_content) if response.streaming else response.content
+    return response.status_code, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--donors', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--only', nargs='*', help='URL names to run (default: all)')
+    parser.add_argument('--output', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User as StaffUser
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+    from blood_app import synthetic
+
+    setup_test_environment()
+    start = time.perf_counter()
+    call_command('seed_synthetic', donors=args.donors, seed=args.seed, verbosity=0)
+    seeded = time.perf_counter() - start
+
+    client = Client()
+    client.force_login(StaffUser.objects.create_superuser('bench', 'bench@example.com', 'pw'))
+    results = {}
+    for name, url in synthetic.sample_urls():
+        if args.only and name not in args.only:
+            continue
+        with CaptureQueriesContext(connection) as queries:
+            status, size = fetch(client, url)
+        # Read now: every request clears the query log (reset_queries)
+        query_count = len(queries)
+        p50, p95, _ = timed(lambda: fetch(client, url), repeat=args.repeat)
+        results[name] = {
+            'url': url, 'status': status, 'p50_ms': round(p50, 2), 'p95_ms': round(p95, 2),
+            'queries': query_count, 'bytes': size,
+        }
+        print(f'{name:<28} {status}  p50 {p50:8.1f} ms  p95 {p95:8.1f} ms  {query_count:>4} queries  {size:>9,} bytes')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'donors': args.donors, 'seed': args.seed, 'repeat': args.repeat,
+                'seed_seconds': round(seeded, 1), 'views': results,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,20 @@
+from django import forms
 from django.contrib import admin
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
-from .models import User, BloodRequest, BloodDonation, BloodInventory, EmergencyContact
+from .inventory import set_available_units
+from .models import User, BloodRequest, BloodDonation, BloodInventory, InventoryTransaction, EmergencyContact, DonorNotification
 
 
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
-    list_display = ['name', 'blood_group', 'city', 'district', 'taluk', 'age', 'gender', 'willing_to_donate', 'donation_count', 'photo_preview']
+    list_display = ['name', 'blood_group', 'city', 'district', 'taluk', 'age', 'gender', 'willing_to_donate', 'donation_count', 'last_donation_date', 'photo_preview']
     list_filter = ['blood_group', 'district', 'taluk', 'gender', 'willing_to_donate', 'age']
     search_fields = ['name', 'email', 'phone']
     list_per_page = 25
     ordering = ['name']
+    readonly_fields = ['donation_count', 'total_units', 'last_donation_date']
     
     fieldsets = (
         ('Personal Information', {
@@ -26,14 +29,18 @@ class UserAdmin(admin.ModelAdmin):
         ('Blood Donation', {
             'fields': ('blood_group', 'willing_to_donate')
         }),
+        ('Donation History', {
+            'fields': ('donation_count', 'total_units', 'last_donation_date')
+        }),
     )
     
     def donation_count(self, obj):
-        count = obj.get_donation_count()
+        count = obj.donation_count
         if count > 0:
             return format_html('<span class="badge bg-success">{}</span>', count)
         return format_html('<span class="badge bg-secondary">0</span>')
     donation_count.short_description = 'Donations'
+    donation_count.admin_order_field = 'donation_count'
     
     def photo_preview(self, obj):
         if obj.photo:
@@ -53,6 +60,7 @@ class BloodRequestAdmin(admin.ModelAdmin):
     list_filter = ['blood_group', 'status', 'required_date', 'requester__district']
     search_fields = ['requester__name', 'hospital_name']
     list_per_page = 25
+    list_select_related = ['requester']
     ordering = ['-required_date']
     
     def requester_name(self, obj):
@@ -75,6 +83,7 @@ class BloodDonationAdmin(admin.ModelAdmin):
     list_filter = ['blood_group', 'donation_date', 'hospital_name', 'donor__district']
     search_fields = ['donor__name', 'hospital_name']
     list_per_page = 25
+    list_select_related = ['donor']
     ordering = ['-donation_date']
     
     def donor_name(self, obj):
@@ -91,13 +100,44 @@ class BloodDonationAdmin(admin.ModelAdmin):
         }
 
 
+class BloodInventoryAdminForm(forms.ModelForm):
+    counted_units = forms.IntegerField(
+        min_value=0,
+        required=False,
+        help_text='Units physically in stock. The difference is recorded as an Adjustment in the ledger.',
+    )
+
+    class Meta:
+        model = BloodInventory
+        fields = ['blood_group', 'critical_level']
+
+
 @admin.register(BloodInventory)
 class BloodInventoryAdmin(admin.ModelAdmin):
+    form = BloodInventoryAdminForm
     list_display = ['blood_group', 'available_units', 'critical_level', 'status_indicator', 'last_updated']
     list_filter = ['blood_group']
     search_fields = ['blood_group']
     list_per_page = 25
     ordering = ['blood_group']
+    # The balance follows the ledger (inventory.py); corrections go in through counted_units
+    readonly_fields = ['available_units', 'last_updated']
+
+    def get_readonly_fields(self, request, obj=None):
+        if obj is not None:
+            return ['blood_group'] + self.readonly_fields
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            # Only the edited column: saving the whole row would write back a stale balance
+            obj.save(update_fields=['critical_level', 'last_updated'])
+        else:
+            obj.save()
+        counted = form.cleaned_data.get('counted_units')
+        if counted is not None:
+            set_available_units(obj.blood_group, counted, note=f'Admin stock count by {request.user.get_username()}')
+            obj.refresh_from_db()
     
     def status_indicator(self, obj):
         if obj.available_units == 0:
@@ -114,12 +154,37 @@ class BloodInventoryAdmin(admin.ModelAdmin):
         }
 
 
+@admin.register(InventoryTransaction)
+class InventoryTransactionAdmin(admin.ModelAdmin):
+    list_display = ['created_at', 'blood_group', 'kind', 'units', 'note']
+    list_filter = ['blood_group', 'kind', 'created_at']
+    search_fields = ['note']
+    list_per_page = 25
+    ordering = ['-created_at']
+
+    # The ledger is append-only; balances are changed from the inventory page
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+    
+    class Media:
+        css = {
+            'all': ('css/admin.css',)
+        }
+
+
 @admin.register(EmergencyContact)
 class EmergencyContactAdmin(admin.ModelAdmin):
     list_display = ['user_name', 'name', 'relationship', 'phone', 'email']
     list_filter = ['relationship', 'user__district']
     search_fields = ['user__name', 'name', 'phone']
     list_per_page = 25
+    list_select_related = ['user']
     ordering = ['user__name', 'name']
     
     def user_name(self, obj):
@@ -132,6 +197,21 @@ class EmergencyContactAdmin(admin.ModelAdmin):
         }
 
 
+@admin.register(DonorNotification)
+class DonorNotificationAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['recipient', 'subject']
+    list_per_page = 25
+    ordering = ['-created_at']
+    raw_id_fields = ['blood_request']
+    
+    class Media:
+        css = {
+            'all': ('css/admin.css',)
+        }
+
+
 # Customize Admin Site
 admin.site.site_header = "Blood Donation Management System"
 admin.site.site_title = "Blood Donation Admin"
@@ -0,0 +1,162 @@
+"""
+Read-only JSON API, version 1.
+
+``/api/v1/donors/``, ``/api/v1/requests/`` and ``/api/v1/inventory/`` take
+the ``BloodSearchForm`` filters (the same as the donor list and exports),
+``fields=a,b`` to choose the returned fields (read with ``.values()``, so
+nothing else is loaded) and keyset pagination through ``cursor`` /
+``page_size``. Access follows the HTML pages: donors and requests are
+public, inventory needs a login.
+
+Every response carries an ETag and Last-Modified computed from the newest
+``updated_at`` / ``last_updated`` stamp of the tables behind it, one indexed
+MAX per table, so a poller that gets a 304 costs an index lookup or two and
+the search is not run. Donation changes reach donors through their counters,
+which bump ``User.updated_at``. Deleting a row moves no stamp, so the ETag
+also includes the table's delete marker (changes.py). With ``eligible_now``
+the answer also changes at midnight, so today's date is part of the
+validators.
+"""
+import datetime
+import hashlib
+from collections import namedtuple
+
+from django.contrib.auth.decorators import login_required
+from django.db.models import Max
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from . import changes, exports
+from .forms import BloodSearchForm
+from .models import BloodInventory, BloodRequest, User
+from .pagination import InvalidCursor, KeysetPaginator, page_size_from
+
+Resource = namedtuple('Resource', 'fields queryset versions')
+
+
+def _latest(queryset, field):
+    """Newest ``field`` of ``queryset``; ``field`` must be indexed so this is one index lookup"""
+    return queryset.order_by().aggregate(latest=Max(field))['latest']
+
+
+def _donor_versions():
+    # Donation counters bump User.updated_at, so donations are covered too
+    return [_latest(User.objects.all(), 'updated_at'), changes.versions('user')]
+
+
+def _request_versions():
+    return [
+        _latest(BloodRequest.objects.all(), 'updated_at'), _latest(User.objects.all(), 'updated_at'),
+        changes.versions('bloodrequest', 'user'),
+    ]
+
+
+def _inventory_versions():
+    return [_latest(BloodInventory.objects.all(), 'last_updated')]
+
+
+RESOURCES = {
+    'donors': Resource(
+        fields={
+            'id': 'id', 'name': 'name', 'blood_group': 'blood_group', 'age': 'age', 'gender': 'gender',
+            'phone': 'phone', 'city': 'city', 'district': 'district', 'taluk': 'taluk',
+            'donation_count': 'donation_count', 'last_donation_date': 'last_donation_date',
+        },
+        queryset=exports.donors_matching,
+        versions=_donor_versions,
+    ),
+    'requests': Resource(
+        fields={
+            'id': 'id', 'blood_group': 'blood_group', 'hospital_name': 'hospital_name',
+            'required_date': 'required_date', 'status': 'status', 'district': 'requester__district',
+            'taluk': 'requester__taluk',
+        },
+        queryset=exports.requests_matching,
+        versions=_request_versions,
+    ),
+    'inventory': Resource(
+        fields={
+            'blood_group': 'blood_group', 'available_units': 'available_units',
+            'critical_level': 'critical_level', 'last_updated': 'last_updated',
+        },
+        queryset=lambda form: BloodInventory.objects.order_by('blood_group'),
+        versions=_inventory_versions,
+    ),
+}
+
+
+def _error(status, message, **extra):
+    return JsonResponse({'error': message, **extra}, status=status)
+
+
+def _validators(request, name, resource):
+    versions = resource.versions()
+    form = BloodSearchForm(request.GET)
+    if form.is_valid() and form.cleaned_data.get('eligible_now'):
+        # Eligibility is relative to today, so the list changes at midnight without any write
+        today = timezone.localdate()
+        versions.append(timezone.make_aware(datetime.datetime.combine(today, datetime.time())))
+    stamps = [latest for latest in versions if isinstance(latest, datetime.datetime)]
+    raw = f'{name}|{request.get_full_path()}|{versions}'
+    return quote_etag(hashlib.sha256(raw.encode()).hexdigest()[:24]), max(stamps) if stamps else None
+
+
+def _page_url(request, cursor):
+    params = request.GET.copy()
+    params['cursor'] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+def resource_view(name):
+    resource = RESOURCES[name]
+
+    def view(request):
+        etag, last_modified = _validators(request, name, resource)
+        timestamp = last_modified.timestamp() if last_modified else None
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = _render(request, resource)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if timestamp:
+                response['Last-Modified'] = http_date(timestamp)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    view.__name__ = f'api_{name}'
+    return view
+
+
+def _render(request, resource):
+    form = BloodSearchForm(request.GET)
+    if not form.is_valid():
+        return _error(400, 'Invalid filters', errors=form.errors.get_json_data())
+    requested = [f for f in request.GET.get('fields', '').split(',') if f] or list(resource.fields)
+    unknown = [f for f in requested if f not in resource.fields]
+    if unknown:
+        return _error(400, f"Unknown field(s): {', '.join(unknown)}", fields=list(resource.fields))
+
+    queryset = resource.queryset(form)
+    # Each queryset is ordered by the keyset its list page uses (ending in a unique field)
+    ordering = queryset.query.order_by
+    lookups = {resource.fields[f]: f for f in requested}
+    # The ordering columns are read as well so the paginator can build cursors
+    keys = [name.lstrip('-') for name in ordering]
+    rows = queryset.values(*lookups, *(key for key in keys if key not in lookups))
+    paginator = KeysetPaginator(rows, ordering, page_size_from(request))
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor as e:
+        return _error(400, str(e))
+    return JsonResponse({
+        'results': [{lookups[lookup]: row[lookup] for lookup in lookups} for row in page],
+        'next': _page_url(request, page.next_cursor) if page.has_next else None,
+        'previous': _page_url(request, page.previous_cursor) if page.has_previous else None,
+    })
+
+
+donors = resource_view('donors')
+requests = resource_view('requests')
+inventory = login_required(resource_view('inventory'))
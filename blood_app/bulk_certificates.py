@@ -0,0 +1,138 @@
+"""
+Bulk donation certificates as a streamed ZIP archive.
+
+The parent process reads matching donations in chunks and hands plain dicts
+(``certificates.donation_fields``) to a ``ProcessPoolExecutor``; workers only
+build PDF bytes and never touch the database. Certificates already in the
+disk cache are read instead of re-rendered, and fresh ones are stored there.
+
+The archive is written through ``ZipStream``, an unseekable sink that hands
+each compressed member back as soon as it is written, so neither the archive
+nor the whole batch of PDFs is ever held in memory: only a couple of
+chunks per worker are in flight at a time.
+"""
+import os
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+
+from . import certificates
+from .models import BloodDonation
+
+
+def matching_donations(date_from=None, date_to=None, hospital=''):
+    donations = BloodDonation.objects.select_related('donor').order_by('donation_date', 'id')
+    if date_from:
+        donations = donations.filter(donation_date__gte=date_from)
+    if date_to:
+        donations = donations.filter(donation_date__lte=date_to)
+    if hospital:
+        donations = donations.filter(hospital_name__iexact=hospital)
+    return donations
+
+
+def default_workers():
+    return getattr(settings, 'CERTIFICATE_WORKERS', None) or os.cpu_count() or 1
+
+
+def render_all(donations, workers=None, chunk=32, use_cache=True):
+    """
+    Yield ``(donation, pdf_bytes)`` for ``donations`` in order.
+
+    Donations go to the workers ``chunk`` at a time (one task per chunk keeps
+    the pickling overhead small) with at most two chunks per worker in
+    flight. ``workers=0`` renders in this process.
+    """
+    workers = default_workers() if workers is None else workers
+    executor = ProcessPoolExecutor(max_workers=workers) if workers else None
+    in_flight = deque()
+    try:
+        for batch in _batches(donations.iterator(chunk_size=chunk), chunk):
+            in_flight.append(_submit(batch, executor, use_cache))
+            if len(in_flight) > max(workers, 1) * 2:
+                yield from _collect(*in_flight.popleft(), use_cache)
+        while in_flight:
+            yield from _collect(*in_flight.popleft(), use_cache)
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _submit(batch, executor, use_cache):
+    """Start rendering the certificates of ``batch`` that are not cached yet"""
+    cached = {}
+    if use_cache:
+        for donation in batch:
+            path = certificates.cached_path(donation)
+            if path.exists():
+                cached[donation.pk] = path.read_bytes()
+    fields = [certificates.donation_fields(d) for d in batch if d.pk not in cached]
+    if executor and fields:
+        # certificates.py does not import models, so workers need no Django setup
+        rendered = executor.submit(certificates.donation_pdfs, fields)
+    else:
+        rendered = certificates.donation_pdfs(fields)
+    return batch, cached, rendered
+
+
+def _collect(batch, cached, rendered, use_cache):
+    rendered = iter(rendered.result() if hasattr(rendered, 'result') else rendered)
+    for donation in batch:
+        pdf = cached.get(donation.pk)
+        if pdf is None:
+            pdf = next(rendered)
+            if use_cache:
+                certificates.donation_certificate(donation, 'pdf', content=pdf)
+        yield donation, pdf
+
+
+class ZipStream:
+    """Write-only, unseekable file object; ``ZipFile`` falls back to data descriptors for it"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def member_name(donation):
+    return f'{donation.donation_date:%Y-%m-%d}-BD{donation.pk:06d}-{donation.donor.name}.pdf'.replace('/', '-')
+
+
+def stream_zip(rendered, progress=None, total=None):
+    """
+    Yield the bytes of a ZIP archive holding ``(donation, pdf)`` pairs from ``rendered``.
+
+    ``progress(done, total)`` is called after every member.
+    """
+    sink = ZipStream()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for done, (donation, pdf) in enumerate(rendered, start=1):
+            archive.writestr(member_name(donation), pdf)
+            if progress:
+                progress(done, total)
+            yield sink.pop()
+    yield sink.pop()
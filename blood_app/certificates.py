@@ -0,0 +1,207 @@
+"""
+Render-once certificates.
+
+Donation and donor certificates are rendered to HTML and PDF the first time
+they are requested and written to ``CERTIFICATE_CACHE_DIR`` under a content
+key built from the ids, ``updated_at`` stamps and donation count they show.
+Editing the donor or donation changes the key, so the next request renders
+a fresh copy and removes the old one; until then every view is a file read.
+The same key is the HTTP ETag, which lets browsers revalidate with a 304.
+
+PDFs are written by a small built-in generator (one landscape A4 page set in
+the standard Helvetica fonts), so no PDF library is needed.
+"""
+import hashlib
+import os
+import uuid
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+# Bump when the certificate templates or the PDF layout change
+CERTIFICATE_VERSION = 1
+
+Certificate = namedtuple('Certificate', 'path etag last_modified')
+
+
+def _cache_dir():
+    return Path(settings.CERTIFICATE_CACHE_DIR)
+
+
+def _key(*parts):
+    raw = ':'.join(str(part) for part in (CERTIFICATE_VERSION,) + parts)
+    return hashlib.sha256(raw.encode()).hexdigest()[:24]
+
+
+def _materialise(stem, key, suffix, build):
+    """Return the cached file for ``stem``/``key``, building it (and dropping older versions) if missing"""
+    directory = _cache_dir()
+    path = directory / f'{stem}-{key}{suffix}'
+    if path.exists():
+        return path
+    directory.mkdir(parents=True, exist_ok=True)
+    # Unique per call: threads of one process may build the same certificate at once
+    tmp = directory / f'.{path.name}.{uuid.uuid4().hex}.tmp'
+    try:
+        tmp.write_bytes(build())
+        # Atomic, so concurrent requests never serve a half-written file
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    for old in directory.glob(f'{stem}-*{suffix}'):
+        if old != path:
+            old.unlink(missing_ok=True)
+    return path
+
+
+def donation_key(donation):
+    donor = donation.donor
+    return _key('donation', donation.pk, donation.updated_at.isoformat(),
+                donor.pk, donor.updated_at.isoformat(), donor.donation_count)
+
+
+def donation_certificate(donation, fmt='html', content=None):
+    """
+    The cached certificate for ``donation`` (with ``donor`` loaded) in ``fmt`` ('html' or 'pdf').
+
+    ``content`` supplies already rendered bytes to store if the file is missing.
+    """
+    if content is not None:
+        build = lambda: content
+    elif fmt == 'pdf':
+        build = lambda: donation_pdf(donation_fields(donation))
+    else:
+        build = lambda: render_to_string(
+            'blood_app/blood_donation_certificate.html', {'donation': donation}).encode()
+    key = donation_key(donation)
+    path = _materialise(f'donation-{donation.pk}', key, f'.{fmt}', build)
+    return Certificate(path, key, max(donation.updated_at, donation.donor.updated_at))
+
+
+def cached_path(donation, fmt='pdf'):
+    """Path the certificate would be cached at; it may not exist yet"""
+    return _cache_dir() / f'donation-{donation.pk}-{donation_key(donation)}.{fmt}'
+
+
+def donor_certificate(donor, fmt='html'):
+    """The cached willingness certificate for ``donor`` in ``fmt`` ('html' or 'pdf')"""
+    key = _key('donor', donor.pk, donor.updated_at.isoformat())
+    if fmt == 'pdf':
+        build = lambda: _donor_pdf(donor)
+    else:
+        build = lambda: render_to_string(
+            'blood_app/donor_certificate.html', {'donor': donor, 'generated_at': timezone.now()}).encode()
+    path = _materialise(f'donor-{donor.pk}', key, f'.{fmt}', build)
+    return Certificate(path, key, donor.updated_at)
+
+
+def donation_fields(donation):
+    """Plain values a donation PDF needs, so it can be rendered in another process"""
+    donor = donation.donor
+    return {
+        'id': donation.pk,
+        'name': donor.name,
+        'age': donor.age,
+        'gender': donor.gender,
+        'donor_blood_group': donor.blood_group,
+        'district': donor.district,
+        'city': donor.city,
+        'donation_count': donor.donation_count,
+        'units_donated': donation.units_donated,
+        'blood_group': donation.blood_group,
+        'hospital_name': donation.hospital_name,
+        'donation_date': donation.donation_date,
+        'created_at': donation.created_at,
+    }
+
+
+def donation_pdf(fields):
+    return render_pdf('Blood Donation Certificate', [
+        (12, False, 'This is to certify that'),
+        (22, True, fields['name']),
+        (11, False, f"Age: {fields['age']}  |  Gender: {fields['gender']}  |  Blood Group: {fields['donor_blood_group']}"),
+        (11, False, f"District: {fields['district'] or '-'}  |  City: {fields['city']}"),
+        (12, False, ''),
+        (12, False, f"donated {fields['units_donated']} unit(s) of {fields['blood_group']} blood"),
+        (12, False, f"at {fields['hospital_name']} on {fields['donation_date']:%B %d, %Y}."),
+        (12, False, ''),
+        (11, False, f"Total donations: {fields['donation_count']} time(s)"),
+        (11, False, f"Certificate no. BD-{fields['id']:06d}, issued {fields['created_at']:%B %d, %Y}"),
+    ])
+
+
+def donation_pdfs(fields_list):
+    """``donation_pdf`` for several certificates; the unit of work for bulk rendering"""
+    return [donation_pdf(fields) for fields in fields_list]
+
+
+def _donor_pdf(donor):
+    return render_pdf('Certificate of Willingness to Donate Blood', [
+        (12, False, 'This is to certify that'),
+        (22, True, donor.name),
+        (11, False, f'Age: {donor.age}  |  Blood Group: {donor.blood_group}'),
+        (11, False, f'District: {donor.district or "-"}  |  City: {donor.city}'),
+        (12, False, ''),
+        (12, False, 'has expressed willingness to donate blood for those in need.'),
+        (12, False, ''),
+        (11, False, f'Issued {timezone.now():%B %d, %Y}'),
+    ])
+
+
+def _pdf_string(text):
+    encoded = text.encode('cp1252', errors='replace')
+    return b'(' + encoded.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+
+def render_pdf(title, lines):
+    """
+    A one-page landscape A4 PDF with a centred ``title`` and ``lines``.
+
+    ``lines`` are ``(font_size, bold, text)`` tuples laid out top to bottom.
+    Text is centred using an average Helvetica glyph width, which is close
+    enough for a certificate.
+    """
+    width, height = 842, 595
+    ops = [b'0.86 0.21 0.27 RG 4 w 24 24 794 547 re S 1 w 34 34 774 527 re S']
+
+    def line(size, bold, text, y):
+        x = max(48, (width - len(text) * size * 0.5) / 2)
+        font = b'/F2' if bold else b'/F1'
+        ops.append(b'BT %s %d Tf %.1f %.1f Td %s Tj ET' % (font, size, x, y, _pdf_string(text)))
+
+    ops.append(b'0.86 0.21 0.27 rg')
+    line(28, True, title, height - 110)
+    ops.append(b'0 0 0 rg')
+    y = height - 170
+    for size, bold, text in lines:
+        if text:
+            line(size, bold, text, y)
+        y -= size * 1.8
+    line(11, True, 'Authorized Signatory', 90)
+    line(10, False, 'Blood Bank Authority', 74)
+    content = b'\n'.join(ops)
+
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        b'<< /Type /Pages /Kids [3 0 R] /Count 1 >>',
+        b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] '
+        b'/Resources << /Font << /F1 4 0 R /F2 5 0 R >> >> /Contents 6 0 R >>' % (width, height),
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>',
+        b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>',
+        b'<< /Length %d >>\nstream\n%s\nendstream' % (len(content), content),
+    ]
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(out)
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    for offset in offsets:
+        out += b'%010d 00000 n \n' % offset
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return bytes(out)
@@ -0,0 +1,24 @@
+"""
+Delete markers for the API's validators.
+
+``api.py`` builds its ETag and Last-Modified from the newest ``updated_at`` of
+a table. Saves and queryset updates move that stamp (``UserQuerySet`` and
+``BloodRequestQuerySet`` set it, as ``auto_now`` would), but a delete leaves
+nothing behind. So every ``User`` and ``BloodRequest`` delete, including
+cascades and queryset deletes, also bumps that table's ``ChangeMarker`` row
+from post_delete (signals.py), and the validators read the markers with the
+stamps. Donation deletes need no marker: they refresh their donor's counters,
+which stamps ``User.updated_at``.
+"""
+from . import bulk
+from .models import ChangeMarker
+
+
+def bump(name):
+    """Advance the marker ``name`` by one, creating it if needed (one upsert)"""
+    bulk.add_to_rows(ChangeMarker, ('name',), {(name,): {'version': 1}})
+
+
+def versions(*names):
+    """``[(name, version)]`` of the markers that exist among ``names``, in one indexed lookup"""
+    return list(ChangeMarker.objects.filter(name__in=names).order_by('name').values_list('name', 'version'))
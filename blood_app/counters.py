@@ -0,0 +1,78 @@
+"""
+Denormalized donation counters on ``User``.
+
+``donation_count``, ``total_units`` and ``last_donation_date`` are refreshed
+from ``BloodDonation`` whenever donations are saved or deleted (signals.py),
+and for bulk ``bulk_create``/``update``/``delete`` through
+``BloodDonationQuerySet``. A refresh is a single UPDATE with correlated
+subqueries however many donors are affected; ``reconcile_donation_counters``
+repairs any drift (``python manage.py reconcile_counters``).
+"""
+import datetime
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import Count, F, Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import BloodDonation, User
+
+_pending = ContextVar('pending_counter_refresh', default=None)
+
+
+def _actual_counters():
+    donations = BloodDonation.objects.filter(donor=OuterRef('pk')).order_by().values('donor')
+    return {
+        'donation_count': Coalesce(Subquery(donations.annotate(n=Count('id')).values('n')), 0),
+        'total_units': Coalesce(Subquery(donations.annotate(n=Sum('units_donated')).values('n')), 0),
+        'last_donation_date': Subquery(donations.annotate(d=Max('donation_date')).values('d')),
+    }
+
+
+def refresh_donation_counters(donor_ids):
+    """Recompute the counters of ``donor_ids`` in one UPDATE"""
+    donor_ids = {donor_id for donor_id in donor_ids if donor_id is not None}
+    if not donor_ids:
+        return
+    pending = _pending.get()
+    if pending is not None:
+        pending.update(donor_ids)
+        return
+    # The counters appear on certificates, so bump the stamp their cache key uses
+    User.objects.filter(pk__in=donor_ids).update(**_actual_counters(), updated_at=timezone.now())
+
+
+@contextmanager
+def deferred_counter_refresh():
+    """Collect refreshes requested inside the block and run them once at the end"""
+    if _pending.get() is not None:
+        yield
+        return
+    donor_ids = set()
+    token = _pending.set(donor_ids)
+    try:
+        yield
+    finally:
+        _pending.reset(token)
+    refresh_donation_counters(donor_ids)
+
+
+def reconcile_donation_counters():
+    """Fix every user whose stored counters disagree with their donations; returns the number fixed"""
+    never = Value(datetime.date.min)
+    actual = _actual_counters()
+    drifted = User.objects.annotate(
+        actual_count=actual['donation_count'],
+        actual_units=actual['total_units'],
+        stored_last=Coalesce('last_donation_date', never),
+        actual_last=Coalesce(actual['last_donation_date'], never),
+    ).exclude(
+        donation_count=F('actual_count'),
+        total_units=F('actual_units'),
+        stored_last=F('actual_last'),
+    )
+    donor_ids = list(drifted.values_list('pk', flat=True))
+    for start in range(0, len(donor_ids), 500):
+        User.objects.filter(pk__in=donor_ids[start:start + 500]).update(**_actual_counters(), updated_at=timezone.now())
+    return len(donor_ids)
@@ -0,0 +1,90 @@
+"""
+Cached data for the home page dashboard.
+
+The inventory, recent donations and headline counts are computed once and
+kept in the default cache (local-memory or file based, see ``CACHES``), so a
+warm hit renders the home page without touching the database.
+
+Entries are keyed by a generation number. ``invalidate`` bumps the generation
+after the writing transaction commits (signals.py and the bulk write paths
+call it), so a rebuild that raced with a write can never be served as fresh.
+When an entry is missing, one request takes a short lock with ``cache.add``
+and rebuilds it while the others keep serving the previous copy instead of
+all querying the database at once.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import BloodDonation, BloodInventory, BloodRequest, User
+
+GENERATION_KEY = 'dashboard:generation'
+STALE_KEY = 'dashboard:stale'
+LOCK_KEY = 'dashboard:lock'
+
+
+def _data_key(generation):
+    return f'dashboard:data:{generation}'
+
+
+def compute():
+    """Query the dashboard data; everything is materialised so it can be pickled"""
+    inventory = list(BloodInventory.objects.order_by('blood_group'))
+    return {
+        'inventory': inventory,
+        'critical_blood_groups': [inv for inv in inventory if inv.is_critical()],
+        'recent_donations': list(BloodDonation.objects.select_related('donor').order_by('-donation_date', '-id')[:5]),
+        'total_donors': User.objects.filter(willing_to_donate=True).count(),
+        'total_donations': BloodDonation.objects.count(),
+        'total_requests': BloodRequest.objects.count(),
+    }
+
+
+def _rebuild(generation):
+    data = compute()
+    cache.set(_data_key(generation), data, settings.DASHBOARD_CACHE_TIMEOUT)
+    # The last good copy outlives the fresh one so waiting requests always have something to serve
+    cache.set(STALE_KEY, data, settings.DASHBOARD_CACHE_TIMEOUT * 4)
+    return data
+
+
+def get_dashboard():
+    """Return the dashboard data, rebuilding it under a lock when it is missing"""
+    generation = cache.get_or_set(GENERATION_KEY, 1, None)
+    data = cache.get(_data_key(generation))
+    if data is not None:
+        return data
+
+    lock_timeout = settings.DASHBOARD_CACHE_LOCK_TIMEOUT
+    if cache.add(LOCK_KEY, generation, lock_timeout):
+        try:
+            return _rebuild(generation)
+        finally:
+            cache.delete(LOCK_KEY)
+
+    stale = cache.get(STALE_KEY)
+    if stale is not None:
+        return stale
+    # Cold start: nothing to fall back on, so wait briefly for the rebuild
+    deadline = time.monotonic() + lock_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        data = cache.get(_data_key(generation))
+        if data is not None:
+            return data
+    return compute()
+
+
+def _bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Evicted or never set; any new value works as long as it differs from the cached ones
+        cache.set(GENERATION_KEY, time.time_ns(), None)
+
+
+def invalidate():
+    """Mark the dashboard stale once the current transaction (if any) commits"""
+    transaction.on_commit(_bump_generation)
@@ -0,0 +1,57 @@
+"""
+Who can give blood now (or on a given day).
+
+A donor is eligible when their stored age is within ``DONOR_MIN_AGE`` ..
+``DONOR_MAX_AGE`` and they have never donated, or their last donation was at
+least ``DONATION_INTERVAL_DAYS[gender]`` days ago. ``last_donation_date`` is
+kept on ``User`` by counters.py, so the whole rule is one WHERE clause with
+a cut-off date per gender, worked out before the query:
+
+    age BETWEEN 18 AND 65 AND (last_donation_date IS NULL
+        OR (gender = 'Male' AND last_donation_date <= '2026-07-20')
+        OR (gender = 'Female' AND last_donation_date <= '2026-06-20'))
+
+``donor_eligibility_idx`` (age, gender, last_donation_date) is partial, on
+willing donors only, so it serves querysets already narrowed with
+``willing_to_donate=True`` (as every caller does). SQLite searches it for the
+age window and has gender and last_donation_date at hand in each entry, but
+it is not a covering index: a count still reads the table row of each donor
+in the age window (the plan says ``USING INDEX``, not ``USING COVERING
+INDEX``).
+"""
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import User
+
+# Days between donations (whole blood), per gender
+DEFAULT_INTERVAL_DAYS = {'Male': 90, 'Female': 120}
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def interval_days(gender):
+    """Minimum days between donations for ``gender``; the longest configured for any other value"""
+    intervals = _setting('DONATION_INTERVAL_DAYS', DEFAULT_INTERVAL_DAYS)
+    return intervals.get(gender, max(intervals.values()))
+
+
+def eligible_q(on=None):
+    """``Q`` for donors who may donate on ``on`` (default today)"""
+    on = on or timezone.localdate()
+    gap = Q(last_donation_date__isnull=True)
+    for gender, _ in User.GENDER_CHOICES:
+        cutoff = on - datetime.timedelta(days=interval_days(gender))
+        gap |= Q(gender=gender, last_donation_date__lte=cutoff)
+    return Q(age__gte=_setting('DONOR_MIN_AGE', 18), age__lte=_setting('DONOR_MAX_AGE', 65)) & gap
+
+
+def eligible(queryset, on=None):
+    """Narrow ``queryset`` (donors) to those eligible on ``on`` (default today)"""
+    return queryset.filter(eligible_q(on))
+
@@ -0,0 +1,111 @@
+"""
+Streaming CSV / NDJSON exports of donors, donations and requests.
+
+Rows are read with ``values_list(...).iterator(chunk_size=EXPORT_CHUNK_SIZE)``
+and encoded as they arrive, so memory use does not grow with the export.
+The CSV header is sent before the query runs and the first row on its own,
+so the download starts at once. Filters come from ``BloodSearchForm``, the same as the donor list.
+"""
+import csv
+import json
+from collections import namedtuple
+
+from django.conf import settings
+
+from .models import BloodDonation, BloodRequest, User
+
+Export = namedtuple('Export', 'columns rows')
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def donors_matching(form):
+    donors, ordering = form.search_donors(User.objects.filter(willing_to_donate=True))
+    return donors.order_by(*ordering)
+
+
+def donations_matching(form):
+    donations = BloodDonation.objects.all()
+    if form.cleaned_data.get('blood_group'):
+        donations = donations.filter(blood_group=form.cleaned_data['blood_group'])
+    return form.filter_people(donations, 'donor__').order_by('-donation_date', '-id')
+
+
+def requests_matching(form):
+    requests = BloodRequest.objects.all()
+    if form.cleaned_data.get('blood_group'):
+        requests = requests.filter(blood_group=form.cleaned_data['blood_group'])
+    return form.filter_people(requests, 'requester__').order_by('-required_date', '-id')
+
+
+# (column name, field lookup) pairs per dataset
+EXPORTS = {
+    'donors': Export([
+        ('id', 'id'), ('name', 'name'), ('blood_group', 'blood_group'), ('age', 'age'), ('gender', 'gender'),
+        ('phone', 'phone'), ('email', 'email'), ('city', 'city'), ('district', 'district'), ('taluk', 'taluk'),
+        ('donation_count', 'donation_count'), ('last_donation_date', 'last_donation_date'),
+    ], donors_matching),
+    'donations': Export([
+        ('id', 'id'), ('donation_date', 'donation_date'), ('donor_id', 'donor_id'), ('donor_name', 'donor__name'),
+        ('donor_phone', 'donor__phone'), ('blood_group', 'blood_group'), ('units_donated', 'units_donated'),
+        ('hospital_name', 'hospital_name'), ('district', 'donor__district'), ('notes', 'notes'),
+    ], donations_matching),
+    'requests': Export([
+        ('id', 'id'), ('required_date', 'required_date'), ('blood_group', 'blood_group'),
+        ('hospital_name', 'hospital_name'), ('status', 'status'), ('requester_name', 'requester__name'),
+        ('requester_phone', 'requester__phone'), ('district', 'requester__district'),
+    ], requests_matching),
+}
+
+
+def export_rows(dataset, form):
+    """The columns and a lazy row iterator for ``dataset`` filtered by the valid ``form``"""
+    export = EXPORTS[dataset]
+    chunk_size = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+    rows = export.rows(form).values_list(*(lookup for _, lookup in export.columns))
+    return [name for name, _ in export.columns], rows.iterator(chunk_size=chunk_size)
+
+
+class _Echo:
+    """File-like object that hands back what csv.writer writes"""
+
+    def write(self, value):
+        return value
+
+
+def _batched(lines, batch=500):
+    """
+    Join ``lines`` into byte strings of ``batch`` lines; each yield is one write to the client.
+
+    The first line goes out alone so the client sees data as soon as the query returns.
+    """
+    lines = iter(lines)
+    first = next(lines, None)
+    if first is None:
+        return
+    yield first.encode()
+    pending = []
+    for line in lines:
+        pending.append(line)
+        if len(pending) == batch:
+            yield ''.join(pending).encode()
+            pending = []
+    if pending:
+        yield ''.join(pending).encode()
+
+
+def stream_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns).encode()
+    yield from _batched(writer.writerow(row) for row in rows)
+
+
+def stream_ndjson(columns, rows):
+    yield from _batched(json.dumps(dict(zip(columns, row)), default=str) + '\n' for row in rows)
+
+
+def stream(fmt, columns, rows):
+    return stream_csv(columns, rows) if fmt == 'csv' else stream_ndjson(columns, rows)
@@ -1,8 +1,20 @@
 from django import forms
 from django.core.validators import RegexValidator
+from . import geography
+from .eligibility import eligible
+from .matching import find_compatible_donors, near_taluk
 from .models import User, BloodRequest, BloodDonation, BloodInventory, EmergencyContact
 
 
+def validate_taluk_district(form, cleaned_data):
+    """Reject a taluk that is not in the chosen district"""
+    district = cleaned_data.get('district')
+    taluk = cleaned_data.get('taluk')
+    if district and taluk and not geography.taluk_in_district(taluk, district):
+        form.add_error('taluk', f'{taluk} is not a taluk of {district}.')
+    return cleaned_data
+
+
 class UserForm(forms.ModelForm):
     # Enhanced phone validation for Indian numbers
     phone = forms.CharField(
@@ -63,11 +75,16 @@ class UserForm(forms.ModelForm):
             }),
         }
 
+    def clean(self):
+        return validate_taluk_district(self, super().clean())
+
 
 class BloodRequestForm(forms.ModelForm):
     class Meta:
         model = BloodRequest
-        fields = ['blood_group', 'hospital_name', 'required_date']
+        fields = ['blood_group', 'hospital_name', 'taluk', 'required_date']
+        labels = {'taluk': 'Hospital taluk'}
+        help_texts = {'taluk': 'Alerts go to compatible donors near this taluk; leave blank to alert donors anywhere.'}
         widgets = {
             'blood_group': forms.Select(attrs={
                 'class': 'form-select form-select-lg',
@@ -77,6 +94,9 @@ class BloodRequestForm(forms.ModelForm):
                 'class': 'form-control form-control-lg',
                 'placeholder': 'Enter hospital name'
             }),
+            'taluk': forms.Select(attrs={
+                'class': 'form-select form-select-lg'
+            }),
             'required_date': forms.DateInput(attrs={
                 'class': 'form-control form-control-lg',
                 'type': 'date',
@@ -139,6 +159,38 @@ class BloodInventoryForm(forms.ModelForm):
         }
 
 
+class InventoryMovementForm(forms.Form):
+    """Units leaving stock; recorded in the inventory ledger"""
+    blood_group = forms.ChoiceField(
+        choices=User.BLOOD_GROUP_CHOICES,
+        widget=forms.Select(attrs={
+            'class': 'form-select form-select-lg'
+        })
+    )
+    kind = forms.ChoiceField(
+        choices=[('Issue', 'Issued to patient'), ('Expiry', 'Expired / discarded')],
+        widget=forms.Select(attrs={
+            'class': 'form-select form-select-lg'
+        })
+    )
+    units = forms.IntegerField(
+        min_value=1,
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control form-control-lg',
+            'min': '1',
+            'placeholder': 'Units'
+        })
+    )
+    note = forms.CharField(
+        max_length=200,
+        required=False,
+        widget=forms.TextInput(attrs={
+            'class': 'form-control form-control-lg',
+            'placeholder': 'Hospital, patient or batch reference (optional)'
+        })
+    )
+
+
 class EmergencyContactForm(forms.ModelForm):
     phone = forms.CharField(
         max_length=15,
@@ -191,7 +243,7 @@ class BloodSearchForm(forms.Form):
         })
     )
     taluk = forms.ChoiceField(
-        choices=[('', 'Any Taluk')],
+        choices=[('', 'Any Taluk')] + User.TALUK_CHOICES,
         required=False,
         widget=forms.Select(attrs={
             'class': 'form-select form-select-lg',
@@ -216,5 +268,84 @@ class BloodSearchForm(forms.Form):
             'placeholder': 'Max Age (100)'
         })
     )
+    near = forms.ChoiceField(
+        choices=[('', 'Anywhere')] + User.TALUK_CHOICES,
+        required=False,
+        label='Nearest to',
+        widget=forms.Select(attrs={
+            'class': 'form-select form-select-lg',
+            'id': 'search-near-select'
+        })
+    )
+    radius_km = forms.IntegerField(
+        required=False,
+        min_value=1,
+        max_value=600,
+        label='Within (km)',
+        widget=forms.NumberInput(attrs={
+            'class': 'form-control form-control-lg',
+            'placeholder': 'Any distance'
+        })
+    )
+    eligible_now = forms.BooleanField(
+        required=False,
+        label='Eligible to donate now',
+        widget=forms.CheckboxInput(attrs={
+            'class': 'form-check-input',
+            'id': 'search-eligible-now'
+        })
+    )
+
+    def clean(self):
+        cleaned_data = validate_taluk_district(self, super().clean())
+        if cleaned_data.get('radius_km') and not cleaned_data.get('near'):
+            self.add_error('radius_km', 'Choose the taluk to measure the distance from.')
+        return cleaned_data
+
+    def filter_people(self, queryset, person=''):
+        """Apply the district, taluk and age filters to ``queryset``, reaching the person through ``person`` (e.g. 'donor__')"""
+        data = self.cleaned_data
+        if data.get('district'):
+            queryset = queryset.filter(**{f'{person}district': data['district']})
+        if data.get('taluk'):
+            queryset = queryset.filter(**{f'{person}taluk': data['taluk']})
+        if data.get('min_age'):
+            queryset = queryset.filter(**{f'{person}age__gte': data['min_age']})
+        if data.get('max_age'):
+            queryset = queryset.filter(**{f'{person}age__lte': data['max_age']})
+        return queryset
 
+    def search_donors(self, donors):
+        """``donors`` matching the search, with the ordering the donor list uses (nearest first with ``near``)"""
+        ordering = ('name', 'id')
+        if self.cleaned_data.get('blood_group'):
+            donors = find_compatible_donors(self.cleaned_data['blood_group'], donors)
+            ordering = ('-exact_match', 'name', 'id')
+        if self.cleaned_data.get('eligible_now'):
+            donors = eligible(donors)
+        if self.cleaned_data.get('near'):
+            donors = near_taluk(donors, self.cleaned_data['near'], self.cleaned_data.get('radius_km'))
+            ordering = ('distance_km',) + ordering
+        return self.filter_people(donors), ordering
+
+
+class CertificateBatchForm(forms.Form):
+    date_from = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    date_to = forms.DateField(
+        required=False,
+        widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'})
+    )
+    hospital = forms.CharField(
+        required=False,
+        max_length=100,
+        widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Hospital (optional)'})
+    )
 
+    def clean(self):
+        cleaned_data = super().clean()
+        if not any(cleaned_data.get(field) for field in ('date_from', 'date_to', 'hospital')):
+            raise forms.ValidationError('Give a date range or a hospital.')
+        return cleaned_data
@@ -0,0 +1,219 @@
+"""
+Kerala districts and taluks.
+
+``KERALA`` is the single source for the district/taluk choices on ``User``,
+the taluk lookup behind the ``get-taluks`` endpoint and the form check that a
+taluk belongs to the chosen district. Everything below is derived from it
+once at import, so lookups are plain dict/set reads.
+
+``TALUK_CENTROIDS`` places each taluk at its headquarters town. The
+great-circle distances between every pair of taluks are worked out once at
+import too (74 x 74 pairs), and each row is kept sorted, so "taluks within
+r km" is a bisect rather than any arithmetic per donor.
+"""
+import bisect
+import hashlib
+import json
+import math
+
+# (district, [(taluk value, taluk label), ...]) in display order
+KERALA = [
+    ('Thiruvananthapuram', [
+        ('Thiruvananthapuram', 'Thiruvananthapuram'),
+        ('Nedumangadu', 'Nedumangadu'),
+        ('Chirayinkeezhu', 'Chirayinkeezhu'),
+        ('Kattakada', 'Kattakada'),
+        ('Neyyattinkara', 'Neyyattinkara'),
+        ('Varkala', 'Varkala'),
+    ]),
+    ('Kollam', [
+        ('Kollam', 'Kollam'),
+        ('Kunnathur', 'Kunnathur'),
+        ('Karunagappally', 'Karunagappally'),
+        ('Kottarakkara', 'Kottarakkara'),
+        ('Pathanapuram', 'Pathanapuram'),
+        ('Punalur', 'Punalur'),
+    ]),
+    ('Pathanamthitta', [
+        ('Adoor', 'Adoor'),
+        ('Konni', 'Konni'),
+        ('Kozhencherry', 'Kozhencherry'),
+        ('Ranni', 'Ranni'),
+        ('Thiruvalla', 'Thiruvalla'),
+        ('Mallappally', 'Mallappally'),
+    ]),
+    ('Alappuzha', [
+        ('Cherthala', 'Cherthala'),
+        ('Ambalappuzha', 'Ambalappuzha'),
+        ('Kuttanad', 'Kuttanad'),
+        ('Karthikappally', 'Karthikappally'),
+        ('Chengannur', 'Chengannur'),
+        ('Mavelikkara', 'Mavelikkara'),
+    ]),
+    ('Kottayam', [
+        ('Changanasserry', 'Changanasserry'),
+        ('Kottayam', 'Kottayam'),
+        ('Vaikom', 'Vaikom'),
+        ('Meenachil', 'Meenachil (Palai)'),
+        ('Kanjirappally', 'Kanjirappally'),
+    ]),
+    ('Idukki', [
+        ('Devikulam', 'Devikulam'),
+        ('Peermade', 'Peermade'),
+        ('Thodupuzha', 'Thodupuzha'),
+        ('Udumbanchola', 'Udumbanchola'),
+    ]),
+    ('Ernakulam', [
+        ('Aluva', 'Aluva'),
+        ('Kanayannur', 'Kanayannur (Eranakulam)'),
+        ('Kochi', 'Kochi (Fort Kochi)'),
+        ('Kothamangalam', 'Kothamangalam'),
+        ('Kunnathunad', 'Kunnathunad (Perumbavoor)'),
+        ('Muvattupuzha', 'Muvattupuzha'),
+        ('North Paravur', 'North Paravur'),
+    ]),
+    ('Thrissur', [
+        ('Thrissur', 'Thrissur'),
+        ('Chavakkad', 'Chavakkad'),
+        ('Kodungallur', 'Kodungallur'),
+        ('Mukundapuram', 'Mukundapuram (Irinjalakuda)'),
+        ('Kunnamkulam', 'Kunnamkulam'),
+        ('Thalapilly', 'Thalapilly (Wadakkancheri)'),
+    ]),
+    ('Palakkad', [
+        ('Palakkad', 'Palakkad'),
+        ('Alathur', 'Alathur'),
+        ('Chittur', 'Chittur'),
+        ('Mannarkkad', 'Mannarkkad'),
+        ('Pattambi', 'Pattambi'),
+        ('Ottappalam', 'Ottappalam'),
+        ('Attappady', 'Attappady (Agali)'),
+    ]),
+    ('Malappuram', [
+        ('Perinthalmanna', 'Perinthalmanna'),
+        ('Nilambur', 'Nilambur'),
+        ('Eranad', 'Eranad (Manjeri)'),
+        ('Kondotty', 'Kondotty'),
+        ('Tirur', 'Tirur'),
+        ('Tirurangadi', 'Tirurangadi'),
+        ('Ponnani', 'Ponnani'),
+    ]),
+    ('Kozhikode', [
+        ('Kozhikode', 'Kozhikode'),
+        ('Koyilandy', 'Koyilandy'),
+        ('Vadakara', 'Vadakara'),
+        ('Thamarassery', 'Thamarassery'),
+    ]),
+    ('Wayanad', [
+        ('Mananthavady', 'Mananthavady'),
+        ('Vythiri', 'Vythiri (Kalpetta)'),
+        ('Sulthan Bathery', 'Sulthan Bathery'),
+    ]),
+    ('Kannur', [
+        ('Kannur', 'Kannur'),
+        ('Thalassery', 'Thalassery'),
+        ('Taliparamba', 'Taliparamba'),
+        ('Iritty', 'Iritty'),
+        ('Payyanur', 'Payyanur'),
+    ]),
+    ('Kasaragod', [
+        ('Kasaragod', 'Kasaragod'),
+        ('Hosdurg', 'Hosdurg'),
+    ]),
+]
+
+DISTRICT_CHOICES = [(district, district) for district, _ in KERALA]
+TALUK_CHOICES = [choice for _, taluks in KERALA for choice in taluks]
+
+TALUKS_BY_DISTRICT = {district: tuple(value for value, _ in taluks) for district, taluks in KERALA}
+DISTRICT_BY_TALUK = {value: district for district, taluks in KERALA for value, _ in taluks}
+
+# The map only changes with a deploy, so its hash is a stable strong ETag
+TALUK_MAP_JSON = json.dumps(TALUKS_BY_DISTRICT, separators=(',', ':'))
+TALUK_MAP_ETAG = hashlib.sha256(TALUK_MAP_JSON.encode()).hexdigest()[:32]
+
+
+# (latitude, longitude) of each taluk's headquarters town
+TALUK_CENTROIDS = {
+    'Thiruvananthapuram': (8.5241, 76.9366), 'Nedumangadu': (8.6033, 77.0020),
+    'Chirayinkeezhu': (8.6530, 76.7860), 'Kattakada': (8.5080, 77.0810),
+    'Neyyattinkara': (8.4000, 77.0860), 'Varkala': (8.7379, 76.7163),
+    'Kollam': (8.8932, 76.6141), 'Kunnathur': (9.0380, 76.6330),
+    'Karunagappally': (9.0590, 76.5350), 'Kottarakkara': (9.0000, 76.7730),
+    'Pathanapuram': (9.0930, 76.8610), 'Punalur': (9.0170, 76.9260),
+    'Adoor': (9.1520, 76.7310), 'Konni': (9.2280, 76.8470),
+    'Kozhencherry': (9.3350, 76.7060), 'Ranni': (9.3860, 76.7850),
+    'Thiruvalla': (9.3835, 76.5741), 'Mallappally': (9.4460, 76.6560),
+    'Cherthala': (9.6840, 76.3360), 'Ambalappuzha': (9.3830, 76.3610),
+    'Kuttanad': (9.4300, 76.4200), 'Karthikappally': (9.2530, 76.4480),
+    'Chengannur': (9.3180, 76.6110), 'Mavelikkara': (9.2500, 76.5500),
+    'Changanasserry': (9.4450, 76.5410), 'Kottayam': (9.5916, 76.5222),
+    'Vaikom': (9.7480, 76.3930), 'Meenachil': (9.7130, 76.6830),
+    'Kanjirappally': (9.5580, 76.7900), 'Devikulam': (10.0630, 77.1030),
+    'Peermade': (9.5700, 76.9800), 'Thodupuzha': (9.8950, 76.7170),
+    'Udumbanchola': (9.8400, 77.1500), 'Aluva': (10.1076, 76.3516),
+    'Kanayannur': (9.9816, 76.2999), 'Kochi': (9.9658, 76.2421),
+    'Kothamangalam': (10.0600, 76.6350), 'Kunnathunad': (10.1150, 76.4780),
+    'Muvattupuzha': (9.9890, 76.5790), 'North Paravur': (10.1470, 76.2290),
+    'Thrissur': (10.5276, 76.2144), 'Chavakkad': (10.5820, 76.0110),
+    'Kodungallur': (10.2330, 76.1950), 'Mukundapuram': (10.3430, 76.2110),
+    'Kunnamkulam': (10.6500, 76.0700), 'Thalapilly': (10.6930, 76.2520),
+    'Palakkad': (10.7867, 76.6548), 'Alathur': (10.6480, 76.5380),
+    'Chittur': (10.6990, 76.7470), 'Mannarkkad': (10.9930, 76.4610),
+    'Pattambi': (10.8100, 76.1960), 'Ottappalam': (10.7700, 76.3770),
+    'Attappady': (11.0960, 76.6500), 'Perinthalmanna': (10.9760, 76.2250),
+    'Nilambur': (11.2760, 76.2250), 'Eranad': (11.1200, 76.1200),
+    'Kondotty': (11.1480, 75.9620), 'Tirur': (10.9140, 75.9210),
+    'Tirurangadi': (11.0410, 75.9240), 'Ponnani': (10.7670, 75.9250),
+    'Kozhikode': (11.2588, 75.7804), 'Koyilandy': (11.4390, 75.6950),
+    'Vadakara': (11.6080, 75.5910), 'Thamarassery': (11.4180, 75.9380),
+    'Mananthavady': (11.8010, 76.0020), 'Vythiri': (11.6050, 76.0830),
+    'Sulthan Bathery': (11.6650, 76.2600), 'Kannur': (11.8745, 75.3704),
+    'Thalassery': (11.7480, 75.4920), 'Taliparamba': (12.0360, 75.3600),
+    'Iritty': (11.9800, 75.6700), 'Payyanur': (12.1000, 75.2000),
+    'Kasaragod': (12.4996, 74.9869), 'Hosdurg': (12.3150, 75.0900),
+}
+EARTH_RADIUS_KM = 6371.0
+
+
+def _haversine_km(origin, destination):
+    lat1, lon1 = map(math.radians, origin)
+    lat2, lon2 = map(math.radians, destination)
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+# taluk -> {taluk: km} and taluk -> ((km, taluk), ...) nearest first, itself included
+DISTANCES = {
+    origin: {
+        destination: round(_haversine_km(TALUK_CENTROIDS[origin], TALUK_CENTROIDS[destination]), 1)
+        for destination in DISTRICT_BY_TALUK
+    }
+    for origin in DISTRICT_BY_TALUK
+}
+NEAREST = {
+    origin: tuple(sorted((km, destination) for destination, km in row.items()))
+    for origin, row in DISTANCES.items()
+}
+
+
+def taluks_for(district):
+    """Taluk values of ``district`` (empty for unknown districts)"""
+    return TALUKS_BY_DISTRICT.get(district, ())
+
+
+def taluk_in_district(taluk, district):
+    return DISTRICT_BY_TALUK.get(taluk) == district
+
+
+def distance_km(origin, destination):
+    """Distance between two taluk centroids, or None if either is unknown"""
+    return DISTANCES.get(origin, {}).get(destination)
+
+
+def taluks_within(taluk, radius_km=None):
+    """``[(taluk, km), ...]`` nearest first, up to ``radius_km`` away (every taluk if None)"""
+    row = NEAREST.get(taluk, ())
+    if radius_km is not None:
+        row = row[:bisect.bisect_right(row, (radius_km, '\uffff'))]
+    return [(destination, km) for km, destination in row]
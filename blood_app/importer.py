@@ -0,0 +1,276 @@
+"""
+Bulk import of donors and historic donations from CSV or NDJSON.
+
+Rows are streamed from the file and checked with the fields and ``clean()``
+of ``UserForm`` / ``BloodDonationForm``; the only checks done per chunk
+instead of per row are the ones that need the database (email uniqueness
+and donor lookup). Valid rows are written ``chunk_size`` at a time, each
+chunk in its own transaction with one ``executemany`` INSERT per table
+(``insert_rows``; a chunk that breaks a constraint is retried row by row),
+and the work the views do
+per save is applied once per chunk in aggregate: rollup totals, the name
+search index, donation counters and one inventory ledger entry per blood
+group. Rejected rows are written as NDJSON lines with their errors.
+
+Used by ``python manage.py import_donors`` and ``import_donations``.
+"""
+import csv
+import gzip
+import json
+from collections import Counter, namedtuple
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.forms.utils import ErrorDict
+
+from . import dashboard, inventory, rollups
+from .bulk import insert_rows
+from .counters import refresh_donation_counters
+from .forms import BloodDonationForm, UserForm
+from .models import BloodDonation, NameTrigram, User
+from .search import name_trigrams
+
+ImportResult = namedtuple('ImportResult', 'created rejected')
+
+
+def open_text(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8', newline='')
+    return open(path, encoding='utf-8', newline='')
+
+
+def read_rows(stream, fmt):
+    """Yield ``(line_number, row_dict)`` from a CSV or NDJSON text stream"""
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, {'__error__': f'Invalid JSON: {e}'}
+            continue
+        yield line_number, row if isinstance(row, dict) else {'__error__': 'Expected a JSON object'}
+
+
+def detect_format(path):
+    return 'csv' if path.removesuffix('.gz').endswith('.csv') else 'ndjson'
+
+
+class RowValidator:
+    """
+    Runs the field and form-level rules of ``form_class`` on plain dicts.
+
+    One unbound form is reused for every row, which skips the per-row model
+    instance and unique check queries of ``is_valid()``; the importer does
+    those per chunk.
+    """
+
+    # Cleaned values (or errors) remembered per field; imports repeat the same
+    # blood groups, districts, dates and ages on most rows
+    MEMO_SIZE = 4096
+
+    def __init__(self, form_class, exclude=()):
+        self.form = form_class()
+        self.fields = [(name, field, {}) for name, field in self.form.fields.items() if name not in exclude]
+
+    def _clean_field(self, field, memo, value):
+        try:
+            result = memo[value]
+        except KeyError:
+            try:
+                result = field.clean(value)
+            except ValidationError as e:
+                result = e
+            if len(memo) < self.MEMO_SIZE:
+                memo[value] = result
+        except TypeError:
+            # Unhashable (e.g. a list from NDJSON)
+            result = field.clean(value)
+        if isinstance(result, ValidationError):
+            raise result
+        return result
+
+    def clean(self, row):
+        """Return ``(cleaned_data, errors)`` for ``row``"""
+        form = self.form
+        form.cleaned_data = {}
+        form._errors = ErrorDict()
+        if '__error__' in row:
+            return None, {'__all__': [row['__error__']]}
+        for name, field, memo in self.fields:
+            value = row.get(name)
+            try:
+                form.cleaned_data[name] = self._clean_field(field, memo, '' if value is None else value)
+            except ValidationError as e:
+                form._errors[name] = form.error_class(e.messages)
+        if not form._errors:
+            form.cleaned_data = form.clean()
+        if form._errors:
+            return None, {name: list(errors) for name, errors in form._errors.items()}
+        return form.cleaned_data, None
+
+
+class RejectWriter:
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def write(self, line_number, row, errors):
+        if self._file is None:
+            self._file = open(self.path, 'w', encoding='utf-8')
+        self.count += 1
+        self._file.write(json.dumps({'line': line_number, 'errors': errors, 'row': row}, default=str) + '\n')
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+def _chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def import_donors(rows, rejects, chunk_size=5000):
+    """Create donors from ``(line_number, row)`` pairs; returns an ImportResult"""
+    validator = RowValidator(UserForm, exclude=('photo',))
+    seen_emails = set()
+    created = 0
+    for chunk in _chunks(rows, chunk_size):
+        valid = []
+        for line_number, row in chunk:
+            data, errors = validator.clean(row)
+            if errors:
+                rejects.write(line_number, row, errors)
+            else:
+                valid.append((line_number, row, data))
+        emails = [data['email'] for _, _, data in valid]
+        taken = set(User.objects.filter(email__in=emails).values_list('email', flat=True))
+        users = []
+        for line_number, row, data in valid:
+            if data['email'] in taken or data['email'] in seen_emails:
+                rejects.write(line_number, row, {'email': ['User with this Email already exists.']})
+                continue
+            seen_emails.add(data['email'])
+            users.append((line_number, row, data))
+        created += _save_chunk(_insert_donors, users, rejects)
+    if created:
+        dashboard.invalidate()
+    return ImportResult(created, rejects.count)
+
+
+def _save_chunk(insert, items, rejects):
+    """
+    ``insert`` the data of ``(line_number, row, data)`` items in one transaction; returns the number saved.
+
+    If the chunk breaks a constraint (e.g. an email registered while it was
+    being checked), it is retried row by row so only the offending rows are
+    rejected.
+    """
+    if not items:
+        return 0
+    try:
+        with transaction.atomic():
+            insert([data for _, _, data in items])
+        return len(items)
+    except IntegrityError:
+        pass
+    saved = 0
+    for line_number, row, data in items:
+        try:
+            with transaction.atomic():
+                insert([data])
+        except IntegrityError as e:
+            rejects.write(line_number, row, {'__all__': [f'Not saved: {e}']})
+        else:
+            saved += 1
+    return saved
+
+
+def _insert_donors(users):
+    insert_rows(User, users)
+    ids = dict(User.objects.filter(email__in=[u['email'] for u in users]).values_list('email', 'pk'))
+    insert_rows(NameTrigram, [
+        {'user_id': ids[u['email']], 'trigram': gram} for u in users for gram in name_trigrams(u['name'])
+    ])
+    rollups.add_donors(Counter((u['blood_group'], u['district']) for u in users if u['willing_to_donate']))
+
+
+def import_donations(rows, rejects, chunk_size=5000, stock=True):
+    """
+    Create donations from ``(line_number, row)`` pairs; returns an ImportResult.
+
+    Rows name the donor by ``donor`` (id) or ``donor_email``. With ``stock``
+    the imported units are added to inventory as one ledger entry per blood
+    group and chunk; leave it off for historic donations long since used.
+    """
+    validator = RowValidator(BloodDonationForm, exclude=('donor',))
+    created = 0
+    for chunk in _chunks(rows, chunk_size):
+        valid = []
+        for line_number, row in chunk:
+            data, errors = validator.clean(row)
+            if errors:
+                rejects.write(line_number, row, errors)
+            else:
+                valid.append((line_number, row, data))
+        ids = {str(row.get('donor') or '').strip() for _, row, _ in valid} - {''}
+        emails = {row.get('donor_email') for _, row, _ in valid} - {None, ''}
+        by_id = {str(pk): (pk, district) for pk, district in
+                 User.objects.filter(pk__in=[i for i in ids if i.isdigit()]).values_list('pk', 'district')}
+        by_email = {email: (pk, district) for email, pk, district in
+                    User.objects.filter(email__in=emails).values_list('email', 'pk', 'district')}
+        donations = []
+        for line_number, row, data in valid:
+            donor = by_id.get(str(row.get('donor') or '').strip()) or by_email.get(row.get('donor_email'))
+            if donor is None:
+                rejects.write(line_number, row, {'donor': ['Unknown donor.']})
+                continue
+            donations.append((line_number, row, (dict(data, donor_id=donor[0]), donor[1])))
+        created += _save_chunk(lambda items: _insert_donations(items, stock), donations, rejects)
+    if created:
+        dashboard.invalidate()
+    return ImportResult(created, rejects.count)
+
+
+def _insert_donations(items, stock):
+    """Insert ``(donation, donor_district)`` pairs with their counter, rollup and inventory effects"""
+    donations = [donation for donation, _ in items]
+    totals = Counter()
+    units = Counter()
+    for donation, district in items:
+        key = (donation['donation_date'], donation['blood_group'], district)
+        totals[key] += 1
+        units[key] += donation['units_donated']
+    insert_rows(BloodDonation, donations)
+    refresh_donation_counters({donation['donor_id'] for donation in donations})
+    rollups.add_donations({key: (count, units[key]) for key, count in totals.items()})
+    if stock:
+        by_group, count = Counter(), Counter()
+        for donation in donations:
+            by_group[donation['blood_group']] += donation['units_donated']
+            count[donation['blood_group']] += 1
+        for blood_group, group_units in by_group.items():
+            inventory.apply_transaction(
+                blood_group, 'Donation', group_units, note=f'Imported {count[blood_group]} donation(s)')
+
+
+def import_file(importer, path, fmt=None, rejects_path=None, **options):
+    """Run ``importer`` over the file at ``path``; returns ``(ImportResult, rejects_path)``"""
+    fmt = fmt or detect_format(path)
+    rejects_path = rejects_path or f'{path.removesuffix(".gz")}.rejects.ndjson'
+    rejects = RejectWriter(rejects_path)
+    try:
+        with open_text(path) as stream:
+            result = importer(read_rows(stream, fmt), rejects, **options)
+    finally:
+        rejects.close()
+    return result, rejects_path
@@ -0,0 +1,172 @@
+"""
+Per-request SQL and template timing.
+
+``RequestTimingMiddleware`` installs a database ``execute_wrapper`` for the
+length of each request, which counts queries, adds up their time and keeps
+the slowest few. ``TimedDjangoTemplates`` (the template backend in settings)
+adds up render time, which includes queries run from templates. The totals
+go out as a ``Server-Timing`` header, so they show in the browser's network
+panel:
+
+    Server-Timing: db;dur=12.4;desc="7 queries", tpl;dur=5.1, app;dur=31.0
+
+The header tells anyone how long the database took, so it is only sent with
+``DEBUG``, everywhere when ``SERVER_TIMING_HEADER`` is set, or to staff. The
+staff check uses ``request.user`` only if the view already loaded it, since
+looking it up would add a session and a user query to every request.
+
+Requests slower than ``SLOW_REQUEST_MS`` are logged, ``SLOW_REQUEST_SAMPLE_RATE``
+of them, as one JSON line on the ``blood_app.instrumentation`` logger. The line
+holds the slowest statements and a count of every SQL fingerprint (the
+statement with literals and IN lists collapsed), so an N+1 shows up as one
+fingerprint run many times.
+
+Per query the cost is two clock reads and a list append; fingerprints are only
+computed for the requests that get logged. Queries run while a streaming
+response is being sent come after the header and are not counted.
+"""
+import heapq
+import json
+import logging
+import random
+import re
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.template.backends.django import DjangoTemplates
+from django.utils.functional import empty
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_timing', default=None)
+
+# Statements kept per request for the fingerprint counts of the slow log
+MAX_STATEMENTS = 1000
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?),?)+\)', re.IGNORECASE)
+SPACE = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """``sql`` with literals, placeholders and IN lists normalised, for grouping statements"""
+    sql = SPACE.sub(' ', sql.strip())
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = IN_LIST.sub('IN (...)', sql)
+    return sql.replace('%s', '?')
+
+
+class RequestTiming:
+    def __init__(self, keep):
+        self.keep = keep
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = []
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.queries += 1
+            self.sql_time += elapsed
+            if len(self.statements) < MAX_STATEMENTS:
+                self.statements.append(sql)
+            if len(self.slowest) < self.keep:
+                heapq.heappush(self.slowest, (elapsed, self.queries, sql))
+            elif elapsed > self.slowest[0][0]:
+                heapq.heapreplace(self.slowest, (elapsed, self.queries, sql))
+
+    def server_timing(self, total):
+        return (f'db;dur={self.sql_time * 1000:.1f};desc="{self.queries} queries", '
+                f'tpl;dur={self.template_time * 1000:.1f}, app;dur={total * 1000:.1f}')
+
+    def log_record(self, request, response, total):
+        return {
+            'method': request.method,
+            'path': request.path,
+            'view': getattr(request.resolver_match, 'view_name', None),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 1),
+            'db_ms': round(self.sql_time * 1000, 1),
+            'queries': self.queries,
+            'template_ms': round(self.template_time * 1000, 1),
+            'slowest': [
+                {'ms': round(elapsed * 1000, 2), 'sql': fingerprint(sql)}
+                for elapsed, _, sql in sorted(self.slowest, reverse=True)
+            ],
+            'fingerprints': Counter(fingerprint(sql) for sql in self.statements).most_common(10),
+        }
+
+
+def _loaded_staff(request):
+    user = getattr(request, 'user', None)
+    if user is None or getattr(user, '_wrapped', None) is empty:
+        return False
+    return user.is_staff
+
+
+class RequestTimingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_TIMING', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.keep = getattr(settings, 'SLOW_REQUEST_TOP_QUERIES', 5)
+        self.slow = getattr(settings, 'SLOW_REQUEST_MS', 500) / 1000
+        self.sample_rate = getattr(settings, 'SLOW_REQUEST_SAMPLE_RATE', 1.0)
+        self.public_header = settings.DEBUG or getattr(settings, 'SERVER_TIMING_HEADER', False)
+
+    def __call__(self, request):
+        timing = RequestTiming(self.keep)
+        token = _current.set(timing)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timing):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        total = time.perf_counter() - start
+        if self.public_header or _loaded_staff(request):
+            response['Server-Timing'] = timing.server_timing(total)
+        if total >= self.slow and random.random() < self.sample_rate:
+            logger.warning(json.dumps(timing.log_record(request, response, total)))
+        return response
+
+
+class TimedTemplate:
+    """A backend template that adds its render time to the current request's timing"""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        timing = _current.get()
+        if timing is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            timing.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render times for RequestTimingMiddleware"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
@@ -0,0 +1,115 @@
+"""
+Race-free blood inventory updates.
+
+Every stock movement is appended to ``InventoryTransaction`` and applied to
+``BloodInventory.available_units`` with an atomic ``F()`` update in the same
+transaction, so concurrent writers never overwrite each other's increments.
+The ledger is the source of truth: ``reconcile_balances`` recomputes every
+balance from it in one aggregate query.
+"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import dashboard
+from .models import BloodInventory, InventoryTransaction
+
+
+class InsufficientInventory(ValueError):
+    pass
+
+
+def _ensure_row(blood_group):
+    BloodInventory.objects.get_or_create(blood_group=blood_group)
+
+
+def apply_transaction(blood_group, kind, units, donation=None, note=''):
+    """
+    Record a signed stock movement and apply it to the running balance.
+
+    Raises InsufficientInventory (and records nothing) if the movement would
+    take the balance below zero.
+    """
+    with transaction.atomic():
+        _ensure_row(blood_group)
+        balance = BloodInventory.objects.filter(blood_group=blood_group)
+        if units < 0:
+            balance = balance.filter(available_units__gte=-units)
+        if not balance.update(available_units=F('available_units') + units, last_updated=timezone.now()):
+            raise InsufficientInventory(f'Not enough {blood_group} units in stock')
+        # Balance updates bypass model signals
+        dashboard.invalidate()
+        return InventoryTransaction.objects.create(
+            blood_group=blood_group,
+            kind=kind,
+            units=units,
+            donation=donation,
+            note=note,
+        )
+
+
+def receive_donation(donation):
+    """Add a recorded donation to stock"""
+    return apply_transaction(donation.blood_group, 'Donation', donation.units_donated, donation=donation)
+
+
+def remove_units(blood_group, kind, units, note=''):
+    """Take ``units`` out of stock as an Issue or Expiry movement"""
+    return apply_transaction(blood_group, kind, -units, note=note)
+
+
+def set_available_units(blood_group, units, critical_level=None, note='Stock count'):
+    """
+    Bring the balance to ``units`` by recording the difference as an Adjustment.
+
+    The row is locked while the difference is computed, so a concurrent
+    movement is either counted before it or applied on top of it, never lost.
+    """
+    with transaction.atomic():
+        _ensure_row(blood_group)
+        inventory = BloodInventory.objects.select_for_update().get(blood_group=blood_group)
+        if critical_level is not None and critical_level != inventory.critical_level:
+            BloodInventory.objects.filter(pk=inventory.pk).update(critical_level=critical_level)
+            dashboard.invalidate()
+        delta = units - inventory.available_units
+        if delta:
+            apply_transaction(blood_group, 'Adjustment', delta, note=note)
+        return delta
+
+
+def reconcile_balances():
+    """
+    Recompute every balance from the ledger; returns {blood_group: (stored, ledger)} for fixed rows.
+
+    The balance rows are locked before the ledger is summed, so a movement
+    either commits first and is counted, or waits and is applied on top.
+    Drifted rows are set from a ``SUM`` subquery, i.e. from the ledger as it
+    is when the UPDATE runs.
+    """
+    fixed = {}
+    with transaction.atomic():
+        stored = dict(BloodInventory.objects.select_for_update().values_list('blood_group', 'available_units'))
+        ledger = dict(
+            InventoryTransaction.objects.order_by()
+            .values_list('blood_group')
+            .annotate(total=Sum('units'))
+        )
+        for blood_group, units in stored.items():
+            expected = ledger.pop(blood_group, 0)
+            if units != expected:
+                fixed[blood_group] = (units, expected)
+        if fixed:
+            total = (
+                InventoryTransaction.objects.filter(blood_group=OuterRef('blood_group'))
+                .order_by().values('blood_group').annotate(total=Sum('units')).values('total')
+            )
+            BloodInventory.objects.filter(blood_group__in=fixed).update(
+                available_units=Coalesce(Subquery(total), 0), last_updated=timezone.now(),
+            )
+        for blood_group, expected in ledger.items():
+            BloodInventory.objects.create(blood_group=blood_group, available_units=expected)
+            fixed[blood_group] = (None, expected)
+    if fixed:
+        dashboard.invalidate()
+    return fixed
@@ -0,0 +1,39 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blood_app.bulk_certificates import matching_donations, render_all, stream_zip
+
+
+def _date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise CommandError(f'Invalid date {value!r}, expected YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Render donation certificates for a date range and/or hospital into a ZIP of PDFs'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Path of the ZIP archive to write')
+        parser.add_argument('--from', dest='date_from', type=_date, help='First donation date (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', type=_date, help='Last donation date (YYYY-MM-DD)')
+        parser.add_argument('--hospital', default='', help='Only donations at this hospital (case-insensitive)')
+        parser.add_argument('--workers', type=int, default=None, help='Render processes (default: CERTIFICATE_WORKERS or CPU count, 0 = in-process)')
+
+    def handle(self, *args, **options):
+        donations = matching_donations(options['date_from'], options['date_to'], options['hospital'])
+        total = donations.count()
+        if not total:
+            raise CommandError('No donations match the given filters')
+
+        def progress(done, total):
+            if done == total or done % 50 == 0:
+                self.stderr.write(f'\r{done}/{total} certificates', ending='')
+
+        with open(options['output'], 'wb') as output:
+            for chunk in stream_zip(render_all(donations, workers=options['workers']), progress, total):
+                output.write(chunk)
+        self.stderr.write('')
+        self.stdout.write(self.style.SUCCESS(f"Wrote {total} certificate(s) to {options['output']}"))
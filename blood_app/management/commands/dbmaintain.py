@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from blood_app import sqlite
+
+
+class Command(BaseCommand):
+    help = 'Run ANALYZE, PRAGMA optimize, incremental vacuum and a WAL checkpoint on the SQLite database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--vacuum', action='store_true',
+                            help='Rebuild the whole file with VACUUM (locks the database while it runs)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'dbmaintain is for SQLite, not {connection.vendor}')
+        report = sqlite.maintain(connection, vacuum=options['vacuum'])
+        summary = ', '.join(f'{key}={value}' for key, value in report.items())
+        self.stdout.write(self.style.SUCCESS(f'Database maintained ({summary})'))
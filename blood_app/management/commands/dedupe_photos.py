@@ -0,0 +1,74 @@
+import posixpath
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from blood_app import thumbnails
+from blood_app.models import User
+
+HASHED_NAME = re.compile(r'[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+def walk(storage, directory):
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for name in directories:
+        yield from walk(storage, posixpath.join(directory, name))
+
+
+class Command(BaseCommand):
+    help = 'Move donor photos to content-hashed names, storing identical files once'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Report duplicates without changing anything')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        field = User._meta.get_field('photo')
+        storage = field.storage
+        directory = field.upload_to.rstrip('/')
+        if not storage.exists(directory):
+            self.stdout.write('No photos to deduplicate')
+            return
+
+        # Copy every legacy file to its hashed name; the originals stay until
+        # the references are rewritten
+        renamed, stored, freed = {}, set(), 0
+        for name in walk(storage, directory):
+            if HASHED_NAME.search(name) or name.endswith('.tmp'):
+                continue
+            with storage.open(name, 'rb') as content:
+                hashed = storage.hashed_name(name, content)
+                if hashed in stored or storage.exists(hashed):
+                    freed += storage.size(name)
+                elif not options['dry_run']:
+                    storage.save(name, content)
+            renamed[name] = hashed
+            stored.add(hashed)
+        kept = len(stored)
+        summary = f'{len(renamed)} file(s) to {kept} distinct, {freed / 1024:.0f} KB of duplicates'
+        if options['dry_run']:
+            self.stdout.write(f'Would move {summary}')
+            return
+
+        ready = {hashed: thumbnails.generate(field.attr_class(None, field, hashed)) for hashed in stored}
+        now = timezone.now()
+        users = []
+        with transaction.atomic():
+            for user in User.objects.exclude(photo='').exclude(photo__isnull=True).only('id', 'photo').iterator():
+                if user.photo.name not in renamed:
+                    continue
+                user.photo = renamed[user.photo.name]
+                user.photo_thumbnails = ready[user.photo.name]
+                # bulk_update skips auto_now; the certificate cache keys on updated_at
+                user.updated_at = now
+                users.append(user)
+            User.objects.bulk_update(users, ['photo', 'photo_thumbnails', 'updated_at'], batch_size=options['batch_size'])
+
+        for name in renamed:
+            storage.delete(name)
+            thumbnails.delete(name)
+        self.stdout.write(self.style.SUCCESS(f'Moved {summary}; rewrote {len(users)} photo reference(s)'))
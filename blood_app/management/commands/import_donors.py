@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from blood_app import importer
+
+
+class Command(BaseCommand):
+    help = 'Load donors from a CSV or NDJSON file (optionally .gz), checked with the registration form rules'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=['csv', 'ndjson'], help='Default: from the file extension')
+        parser.add_argument('--rejects', help='Where to write rejected rows (default: <path>.rejects.ndjson)')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        result, rejects = importer.import_file(
+            importer.import_donors, options['path'], options['format'], options['rejects'],
+            chunk_size=options['chunk_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Imported {result.created} donor(s)'))
+        if result.rejected:
+            self.stdout.write(self.style.WARNING(f'Rejected {result.rejected} row(s), see {rejects}'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from blood_app import thumbnails
+from blood_app.models import User
+
+
+class Command(BaseCommand):
+    help = 'Create the sized WebP/JPEG thumbnails for donor photos that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate thumbnails for every photo')
+
+    def handle(self, *args, **options):
+        users = User.objects.exclude(photo='').exclude(photo__isnull=True).only('id', 'photo', 'photo_thumbnails')
+        if not options['force']:
+            users = users.filter(photo_thumbnails=False)
+        made = failed = 0
+        done = {}
+        for user in users.iterator():
+            # Users share photo files, so each file is rendered once
+            if user.photo.name not in done:
+                done[user.photo.name] = thumbnails.generate(user.photo, force=options['force'])
+            if done[user.photo.name]:
+                made += 1
+                User.objects.filter(pk=user.pk).update(photo_thumbnails=True)
+            else:
+                failed += 1
+        self.stdout.write(self.style.SUCCESS(f'Made thumbnails for {made} photo(s), {failed} unreadable'))
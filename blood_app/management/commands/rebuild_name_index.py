@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blood_app.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Recreate the trigram index used by the certificate name search'
+
+    def handle(self, *args, **options):
+        users = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(f'Indexed the names of {users} user(s)'))
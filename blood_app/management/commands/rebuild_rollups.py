@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blood_app import rollups
+from blood_app.models import DonationRollup, DonorRollup
+
+
+class Command(BaseCommand):
+    help = 'Recompute the statistics rollup tables from donations and donors'
+
+    def handle(self, *args, **options):
+        rollups.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {DonationRollup.objects.count()} donation rollup row(s) '
+            f'and {DonorRollup.objects.count()} donor rollup row(s)'
+        ))
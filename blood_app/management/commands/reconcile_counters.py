@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from blood_app.counters import reconcile_donation_counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute donation_count, total_units and last_donation_date for users whose counters drifted'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_donation_counters()
+        self.stdout.write(self.style.SUCCESS(f'Fixed donation counters for {fixed} user(s)'))
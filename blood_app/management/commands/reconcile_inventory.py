@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from blood_app.inventory import reconcile_balances
+
+
+class Command(BaseCommand):
+    help = 'Recompute blood inventory balances from the transaction ledger'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_balances()
+        for blood_group, (stored, ledger) in sorted(fixed.items()):
+            self.stdout.write(f'{blood_group}: {stored} -> {ledger}')
+        self.stdout.write(self.style.SUCCESS(f'Fixed {len(fixed)} inventory balance(s)'))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from blood_app import synthetic
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with synthetic Kerala donors, donations, requests and emergency contacts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--donors', type=int, default=10000)
+        parser.add_argument('--donations', type=int, help='Default: two per donor')
+        parser.add_argument('--requests', type=int, help='Default: one per twenty donors')
+        parser.add_argument('--contacts', type=int, help='Default: one per two donors')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--replace', action='store_true', help='Delete earlier synthetic data first')
+
+    def handle(self, *args, **options):
+        if synthetic.exists():
+            if not options['replace']:
+                raise CommandError('Synthetic data already present; use --replace to regenerate it')
+            self.stdout.write(f'Deleted {synthetic.clear()} synthetic donor(s)')
+        start = time.perf_counter()
+        created = synthetic.generate(
+            options['donors'], options['donations'], options['requests'], options['contacts'],
+            seed=options['seed'], batch_size=options['batch_size'],
+        )
+        summary = ', '.join(f'{count} {table}' for table, count in created.items())
+        self.stdout.write(self.style.SUCCESS(f'Created {summary} in {time.perf_counter() - start:.1f}s'))
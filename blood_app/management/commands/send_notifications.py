@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blood_app.notifications import deliver_queued
+
+
+class Command(BaseCommand):
+    help = 'Send queued donor notifications in batches over a reused mail connection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help='Messages per connection (default: NOTIFICATION_BATCH_SIZE)')
+        parser.add_argument('--rate', type=float, default=None, help='Maximum messages per second (default: NOTIFICATION_RATE_LIMIT)')
+        parser.add_argument('--loop', action='store_true', help='Keep polling the queue instead of exiting when it is empty')
+        parser.add_argument('--interval', type=float, default=5.0, help='Seconds to sleep between polls with --loop')
+
+    def handle(self, *args, **options):
+        while True:
+            stats = deliver_queued(batch_size=options['batch_size'], rate_limit=options['rate'])
+            if stats['batches']:
+                self.stdout.write(f"Sent {stats['sent']}, failed {stats['failed']} in {stats['batches']} batch(es)")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,76 @@
+"""
+ABO/Rh compatibility-aware and proximity-ranked donor matching.
+
+The recipient -> compatible donor groups table is computed once at import from
+``User.BLOOD_GROUP_CHOICES``, so a request turns into a single
+``blood_group__in`` query whatever the number of compatible groups.
+Distances come from the taluk distance matrix in geography.py, so the radius
+is applied as a ``taluk__in`` filter before the query runs and the distance
+is a literal per taluk in the SQL.
+"""
+from django.db.models import BooleanField, Case, FloatField, Value, When
+
+from . import geography
+from .models import User
+
+BLOOD_GROUPS = tuple(value for value, _ in User.BLOOD_GROUP_CHOICES)
+
+
+def _can_donate(donor_group, recipient_group):
+    donor_abo, donor_rh = donor_group[:-1], donor_group[-1]
+    recipient_abo, recipient_rh = recipient_group[:-1], recipient_group[-1]
+    abo_ok = donor_abo == 'O' or donor_abo == recipient_abo or recipient_abo == 'AB'
+    rh_ok = donor_rh == '-' or recipient_rh == '+'
+    return abo_ok and rh_ok
+
+
+# Recipient group -> donor groups that can safely give to it, exact group first
+COMPATIBLE_DONOR_GROUPS = {
+    recipient: (recipient,) + tuple(
+        donor for donor in BLOOD_GROUPS
+        if donor != recipient and _can_donate(donor, recipient)
+    )
+    for recipient in BLOOD_GROUPS
+}
+
+
+def compatible_donor_groups(recipient_group):
+    """Get the donor blood groups that can give to ``recipient_group``"""
+    return COMPATIBLE_DONOR_GROUPS.get(recipient_group, ())
+
+
+def find_compatible_donors(blood_group, queryset=None):
+    """
+    Return willing donors who can give to ``blood_group`` as one query.
+
+    Rows are annotated with ``exact_match`` and ranked exact group first, then
+    by name. Pass ``queryset`` to add the compatibility filter on top of
+    other filters (district, age, ...).
+    """
+    if queryset is None:
+        queryset = User.objects.filter(willing_to_donate=True)
+    return queryset.filter(
+        blood_group__in=compatible_donor_groups(blood_group),
+    ).annotate(
+        exact_match=Case(
+            When(blood_group=blood_group, then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    ).order_by('-exact_match', 'name', 'id')
+
+
+def near_taluk(queryset, taluk, radius_km=None):
+    """
+    Narrow ``queryset`` (donors) to those within ``radius_km`` of ``taluk``, annotated with ``distance_km``.
+
+    Distances are between taluk centroids, so donors without a taluk are
+    left out. Order by ``distance_km`` to rank nearest first.
+    """
+    nearby = geography.taluks_within(taluk, radius_km)
+    return queryset.filter(taluk__in=[name for name, _ in nearby]).annotate(
+        distance_km=Case(
+            *(When(taluk=name, then=Value(km)) for name, km in nearby),
+            output_field=FloatField(),
+        ),
+    )
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0007_donornotification'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blooddonation',
+            index=models.Index(fields=['donor', 'donation_date'], name='donation_donor_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['status', 'required_date'], name='request_status_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('willing_to_donate', True)), fields=['blood_group', 'district', 'taluk', 'age'], name='donor_group_location_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('willing_to_donate', True)), fields=['district', 'taluk', 'age'], name='donor_location_idx'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0008_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='blooddonation',
+            index=models.Index(fields=['donation_date', 'id'], name='donation_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bloodrequest',
+            index=models.Index(fields=['required_date', 'id'], name='request_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['name', 'id'], name='user_name_id_idx'),
+        ),
+    ]
@@ -0,0 +1,71 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:45
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def populate_rollups(apps, schema_editor):
+    BloodDonation = apps.get_model('blood_app', 'BloodDonation')
+    User = apps.get_model('blood_app', 'User')
+    DonationRollup = apps.get_model('blood_app', 'DonationRollup')
+    DonorRollup = apps.get_model('blood_app', 'DonorRollup')
+    rows = (
+        BloodDonation.objects.order_by()
+        .values('donation_date', 'blood_group', 'donor__district')
+        .annotate(donations=Count('id'), units=Sum('units_donated'))
+    )
+    DonationRollup.objects.bulk_create([
+        DonationRollup(
+            date=row['donation_date'],
+            blood_group=row['blood_group'],
+            district=row['donor__district'],
+            donations=row['donations'],
+            units=row['units'],
+        )
+        for row in rows
+    ])
+    rows = (
+        User.objects.filter(willing_to_donate=True).order_by()
+        .values('blood_group', 'district')
+        .annotate(donors=Count('id'))
+    )
+    DonorRollup.objects.bulk_create([DonorRollup(**row) for row in rows])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0009_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('blood_group', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('O+', 'O+'), ('O-', 'O-'), ('AB+', 'AB+'), ('AB-', 'AB-')], max_length=5)),
+                ('district', models.CharField(blank=True, default='', max_length=50)),
+                ('donations', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DonorRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_group', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('O+', 'O+'), ('O-', 'O-'), ('AB+', 'AB+'), ('AB-', 'AB-')], max_length=5)),
+                ('district', models.CharField(blank=True, default='', max_length=50)),
+                ('donors', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='donorrollup',
+            constraint=models.UniqueConstraint(fields=('blood_group', 'district'), name='donor_rollup_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='donationrollup',
+            constraint=models.UniqueConstraint(fields=('date', 'blood_group', 'district'), name='donation_rollup_unique'),
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:46
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    BloodDonation = apps.get_model('blood_app', 'BloodDonation')
+    User = apps.get_model('blood_app', 'User')
+    donations = BloodDonation.objects.filter(donor=OuterRef('pk')).order_by().values('donor')
+    User.objects.update(
+        donation_count=Coalesce(Subquery(donations.annotate(n=Count('id')).values('n')), 0),
+        total_units=Coalesce(Subquery(donations.annotate(n=Sum('units_donated')).values('n')), 0),
+        last_donation_date=Subquery(donations.annotate(d=Max('donation_date')).values('d')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0010_statistics_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='donation_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='last_donation_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='total_units',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def record_opening_balances(apps, schema_editor):
+    BloodInventory = apps.get_model('blood_app', 'BloodInventory')
+    InventoryTransaction = apps.get_model('blood_app', 'InventoryTransaction')
+    InventoryTransaction.objects.bulk_create([
+        InventoryTransaction(
+            blood_group=inventory.blood_group,
+            kind='Adjustment',
+            units=inventory.available_units,
+            note='Opening balance',
+        )
+        for inventory in BloodInventory.objects.filter(available_units__gt=0)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0011_donation_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('blood_group', models.CharField(choices=[('A+', 'A+'), ('A-', 'A-'), ('B+', 'B+'), ('B-', 'B-'), ('O+', 'O+'), ('O-', 'O-'), ('AB+', 'AB+'), ('AB-', 'AB-')], max_length=5)),
+                ('kind', models.CharField(choices=[('Donation', 'Donation'), ('Issue', 'Issue'), ('Adjustment', 'Adjustment'), ('Expiry', 'Expiry')], max_length=20)),
+                ('units', models.IntegerField(help_text='Signed change in available units')),
+                ('note', models.CharField(blank=True, max_length=200)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('donation', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='inventory_transactions', to='blood_app.blooddonation')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['blood_group', 'created_at'], name='inventory_txn_group_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
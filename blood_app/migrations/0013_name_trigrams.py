@@ -0,0 +1,45 @@
+# Generated by Django 4.2.7 on 2026-10-18 18:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+import re
+
+
+def populate_trigrams(apps, schema_editor):
+    # Mirrors search.name_trigrams; migrations must not import app code
+    User = apps.get_model('blood_app', 'User')
+    NameTrigram = apps.get_model('blood_app', 'NameTrigram')
+    rows = []
+    for user_id, name in User.objects.values_list('id', 'name').iterator():
+        grams = set()
+        for word in re.findall(r'\w+', name.lower()):
+            padded = f' {word} '
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        rows.extend(NameTrigram(user_id=user_id, trigram=gram) for gram in grams)
+    NameTrigram.objects.bulk_create(rows, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0012_inventory_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NameTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='name_trigrams', to='blood_app.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['trigram', 'user'], name='name_trigram_lookup_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='nametrigram',
+            constraint=models.UniqueConstraint(fields=('user', 'trigram'), name='name_trigram_unique'),
+        ),
+        migrations.RunPython(populate_trigrams, migrations.RunPython.noop),
+    ]
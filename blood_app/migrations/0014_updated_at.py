@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0013_name_trigrams'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='blooddonation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
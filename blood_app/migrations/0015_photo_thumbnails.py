@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0014_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='photo_thumbnails',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+    ]
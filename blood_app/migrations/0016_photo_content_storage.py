@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:07
+
+import blood_app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0015_photo_thumbnails'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='photo',
+            field=models.FileField(blank=True, null=True, storage=blood_app.storage.ContentAddressedStorage(), upload_to='photos/'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 20:05
+
+from django.db import migrations
+
+# PostgreSQL only: trigram GIN indexes serve the admin's name/email/phone
+# search (``icontains`` is ``UPPER(col) LIKE UPPER('%q%')`` there), which no
+# b-tree can. SQLite keeps scanning; its fuzzy name search uses NameTrigram.
+TRIGRAM_INDEXES = [
+    ('user_name_trgm_idx', 'name'),
+    ('user_email_trgm_idx', 'email'),
+    ('user_phone_trgm_idx', 'phone'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, column in TRIGRAM_INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {name} ON blood_app_user USING gin (UPPER("{column}") gin_trgm_ops)'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0017_api_validators'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
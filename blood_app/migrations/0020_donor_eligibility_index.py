@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0019_request_taluk'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('willing_to_donate', True)), fields=['age', 'gender', 'last_donation_date'], name='donor_eligibility_idx'),
+        ),
+    ]
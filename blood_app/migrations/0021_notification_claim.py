@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-18 19:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blood_app', '0020_donor_eligibility_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donornotification',
+            name='claim',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='donornotification',
+            name='status',
+            field=models.CharField(choices=[('Queued', 'Queued'), ('Sending', 'Sending'), ('Sent', 'Sent'), ('Failed', 'Failed')], default='Queued', max_length=10),
+        ),
+    ]
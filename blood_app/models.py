@@ -1,6 +1,36 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 
+from . import geography
+from .storage import ContentAddressedStorage
+
+
+class UserQuerySet(models.QuerySet):
+    """Keeps the rollups and the dashboard cache correct for bulk updates that bypass model signals, such as the admin actions"""
+
+    def update(self, **kwargs):
+        from . import dashboard, rollups
+        moves = bool(set(rollups.DONOR_FIELDS) & set(kwargs))
+        with transaction.atomic(using=self.db, savepoint=False):
+            if moves:
+                # The rows may no longer match this queryset's filter once updated
+                same_rows = self.model.objects.filter(pk__in=list(self.values_list('pk', flat=True)))
+                donations = BloodDonation.objects.filter(donor__in=same_rows)
+                donors = rollups.donor_counts(same_rows)
+                filed = rollups.donation_totals(donations) if 'district' in kwargs else {}
+            # auto_now is not applied by queryset updates
+            kwargs.setdefault('updated_at', timezone.now())
+            count = super().update(**kwargs)
+            if moves:
+                moved = rollups.donor_counts(same_rows)
+                moved.subtract(donors)
+                rollups.add_donors(moved)
+            if 'district' in kwargs:
+                # Refile the donors' donations under their new districts
+                rollups.add_donations(rollups.merge_totals((rollups.donation_totals(donations), 1), (filed, -1)))
+        dashboard.invalidate()
+        return count
+
 
 class User(models.Model):
     GENDER_CHOICES = [
@@ -14,127 +44,9 @@ class User(models.Model):
         ('AB+', 'AB+'), ('AB-', 'AB-'),
     ]
     
-    # Kerala Districts and Taluks
-    DISTRICT_CHOICES = [
-        ('Thiruvananthapuram', 'Thiruvananthapuram'),
-        ('Kollam', 'Kollam'),
-        ('Pathanamthitta', 'Pathanamthitta'),
-        ('Alappuzha', 'Alappuzha'),
-        ('Kottayam', 'Kottayam'),
-        ('Idukki', 'Idukki'),
-        ('Ernakulam', 'Ernakulam'),
-        ('Thrissur', 'Thrissur'),
-        ('Palakkad', 'Palakkad'),
-        ('Malappuram', 'Malappuram'),
-        ('Kozhikode', 'Kozhikode'),
-        ('Wayanad', 'Wayanad'),
-        ('Kannur', 'Kannur'),
-        ('Kasaragod', 'Kasaragod'),
-    ]
-    
-    TALUK_CHOICES = [
-        # Thiruvananthapuram
-        ('Thiruvananthapuram', 'Thiruvananthapuram'),
-        ('Nedumangadu', 'Nedumangadu'),
-        ('Chirayinkeezhu', 'Chirayinkeezhu'),
-        ('Kattakada', 'Kattakada'),
-        ('Neyyattinkara', 'Neyyattinkara'),
-        ('Varkala', 'Varkala'),
-        
-        # Kollam
-        ('Kollam', 'Kollam'),
-        ('Kunnathur', 'Kunnathur'),
-        ('Karunagappally', 'Karunagappally'),
-        ('Kottarakkara', 'Kottarakkara'),
-        ('Pathanapuram', 'Pathanapuram'),
-        ('Punalur', 'Punalur'),
-        
-        # Pathanamthitta
-        ('Adoor', 'Adoor'),
-        ('Konni', 'Konni'),
-        ('Kozhencherry', 'Kozhencherry'),
-        ('Ranni', 'Ranni'),
-        ('Thiruvalla', 'Thiruvalla'),
-        ('Mallappally', 'Mallappally'),
-        
-        # Alappuzha
-        ('Cherthala', 'Cherthala'),
-        ('Ambalappuzha', 'Ambalappuzha'),
-        ('Kuttanad', 'Kuttanad'),
-        ('Karthikappally', 'Karthikappally'),
-        ('Chengannur', 'Chengannur'),
-        ('Mavelikkara', 'Mavelikkara'),
-        
-        # Kottayam
-        ('Changanasserry', 'Changanasserry'),
-        ('Kottayam', 'Kottayam'),
-        ('Vaikom', 'Vaikom'),
-        ('Meenachil', 'Meenachil (Palai)'),
-        ('Kanjirappally', 'Kanjirappally'),
-        
-        # Idukki
-        ('Devikulam', 'Devikulam'),
-        ('Peermade', 'Peermade'),
-        ('Thodupuzha', 'Thodupuzha'),
-        ('Udumbanchola', 'Udumbanchola'),
-        
-        # Ernakulam
-        ('Aluva', 'Aluva'),
-        ('Kanayannur', 'Kanayannur (Eranakulam)'),
-        ('Kochi', 'Kochi (Fort Kochi)'),
-        ('Kothamangalam', 'Kothamangalam'),
-        ('Kunnathunad', 'Kunnathunad (Perumbavoor)'),
-        ('Muvattupuzha', 'Muvattupuzha'),
-        ('North Paravur', 'North Paravur'),
-        
-        # Thrissur
-        ('Thrissur', 'Thrissur'),
-        ('Chavakkad', 'Chavakkad'),
-        ('Kodungallur', 'Kodungallur'),
-        ('Mukundapuram', 'Mukundapuram (Irinjalakuda)'),
-        ('Kunnamkulam', 'Kunnamkulam'),
-        ('Thalapilly', 'Thalapilly (Wadakkancheri)'),
-        
-        # Palakkad
-        ('Palakkad', 'Palakkad'),
-        ('Alathur', 'Alathur'),
-        ('Chittur', 'Chittur'),
-        ('Mannarkkad', 'Mannarkkad'),
-        ('Pattambi', 'Pattambi'),
-        ('Ottappalam', 'Ottappalam'),
-        ('Attappady', 'Attappady (Agali)'),
-        
-        # Malappuram
-        ('Perinthalmanna', 'Perinthalmanna'),
-        ('Nilambur', 'Nilambur'),
-        ('Eranad', 'Eranad (Manjeri)'),
-        ('Kondotty', 'Kondotty'),
-        ('Tirur', 'Tirur'),
-        ('Tirurangadi', 'Tirurangadi'),
-        ('Ponnani', 'Ponnani'),
-        
-        # Kozhikode
-        ('Kozhikode', 'Kozhikode'),
-        ('Koyilandy', 'Koyilandy'),
-        ('Vadakara', 'Vadakara'),
-        ('Thamarassery', 'Thamarassery'),
-        
-        # Wayanad
-        ('Mananthavady', 'Mananthavady'),
-        ('Vythiri', 'Vythiri (Kalpetta)'),
-        ('Sulthan Bathery', 'Sulthan Bathery'),
-        
-        # Kannur
-        ('Kannur', 'Kannur'),
-        ('Thalassery', 'Thalassery'),
-        ('Taliparamba', 'Taliparamba'),
-        ('Iritty', 'Iritty'),
-        ('Payyanur', 'Payyanur'),
-        
-        # Kasaragod
-        ('Kasaragod', 'Kasaragod'),
-        ('Hosdurg', 'Hosdurg'),
-    ]
+    # Kerala districts and taluks, see geography.py
+    DISTRICT_CHOICES = geography.DISTRICT_CHOICES
+    TALUK_CHOICES = geography.TALUK_CHOICES
     
     name = models.CharField(max_length=100)
     age = models.IntegerField()
@@ -144,54 +56,156 @@ class User(models.Model):
     city = models.CharField(max_length=50)
     district = models.CharField(max_length=50, choices=DISTRICT_CHOICES, default='', blank=True)
     taluk = models.CharField(max_length=50, choices=TALUK_CHOICES, default='', blank=True)
-    photo = models.FileField(upload_to='photos/', blank=True, null=True)
+    # Stored once per distinct file under its content hash (storage.py)
+    photo = models.FileField(upload_to='photos/', storage=ContentAddressedStorage(), blank=True, null=True)
+    # Set once thumbnails.py has written the sized derivatives of ``photo``
+    photo_thumbnails = models.BooleanField(default=False, editable=False)
     blood_group = models.CharField(max_length=5, choices=BLOOD_GROUP_CHOICES)
     willing_to_donate = models.BooleanField(default=True)
+    # Denormalized from BloodDonation and kept in sync by counters.py
+    donation_count = models.PositiveIntegerField(default=0, editable=False)
+    total_units = models.PositiveIntegerField(default=0, editable=False)
+    last_donation_date = models.DateField(null=True, blank=True, editable=False)
+    # Part of the certificate cache key (certificates.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = UserQuerySet.as_manager()
 
     def __str__(self) -> str:
         return f"{self.name} ({self.blood_group})"
     
     def get_donation_count(self):
         """Get the total number of blood donations made by this user"""
-        return self.blooddonation_set.count()
+        return self.donation_count
     
     def get_last_donation_date(self):
         """Get the date of the last blood donation"""
-        last_donation = self.blooddonation_set.order_by('-donation_date').first()
-        return last_donation.donation_date if last_donation else None
+        return self.last_donation_date
     
     @classmethod
     def get_taluks_by_district(cls, district):
         """Get taluks for a specific district"""
-        district_taluks = {
-            'Thiruvananthapuram': ['Thiruvananthapuram', 'Nedumangadu', 'Chirayinkeezhu', 'Kattakada', 'Neyyattinkara', 'Varkala'],
-            'Kollam': ['Kollam', 'Kunnathur', 'Karunagappally', 'Kottarakkara', 'Pathanapuram', 'Punalur'],
-            'Pathanamthitta': ['Adoor', 'Konni', 'Kozhencherry', 'Ranni', 'Thiruvalla', 'Mallappally'],
-            'Alappuzha': ['Cherthala', 'Ambalappuzha', 'Kuttanad', 'Karthikappally', 'Chengannur', 'Mavelikkara'],
-            'Kottayam': ['Changanasserry', 'Kottayam', 'Vaikom', 'Meenachil', 'Kanjirappally'],
-            'Idukki': ['Devikulam', 'Peermade', 'Thodupuzha', 'Udumbanchola'],
-            'Ernakulam': ['Aluva', 'Kanayannur', 'Kochi', 'Kothamangalam', 'Kunnathunad', 'Muvattupuzha', 'North Paravur'],
-            'Thrissur': ['Thrissur', 'Chavakkad', 'Kodungallur', 'Mukundapuram', 'Kunnamkulam', 'Thalapilly'],
-            'Palakkad': ['Palakkad', 'Alathur', 'Chittur', 'Mannarkkad', 'Pattambi', 'Ottappalam', 'Attappady'],
-            'Malappuram': ['Perinthalmanna', 'Nilambur', 'Eranad', 'Kondotty', 'Tirur', 'Tirurangadi', 'Ponnani'],
-            'Kozhikode': ['Kozhikode', 'Koyilandy', 'Vadakara', 'Thamarassery'],
-            'Wayanad': ['Mananthavady', 'Vythiri', 'Sulthan Bathery'],
-            'Kannur': ['Kannur', 'Thalassery', 'Taliparamba', 'Iritty', 'Payyanur'],
-            'Kasaragod': ['Kasaragod', 'Hosdurg'],
-        }
-        return district_taluks.get(district, [])
+        return list(geography.taluks_for(district))
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the name search index and thumbnailer skip saves that do not change them,
+        # and the rollups (rollups.py) move a donor that changed
+        instance._loaded_name = instance.__dict__.get('name')
+        instance._loaded_photo = instance.__dict__.get('photo')
+        instance._loaded_rollup = tuple(
+            instance.__dict__.get(name) for name in ('willing_to_donate', 'blood_group', 'district')
+        )
+        return instance
+
+    class Meta:
+        indexes = [
+            # donor_list / request_blood: blood_group IN (...) then district, taluk, age range
+            models.Index(
+                fields=['blood_group', 'district', 'taluk', 'age'],
+                name='donor_group_location_idx',
+                condition=models.Q(willing_to_donate=True),
+            ),
+            # donor_list filtered by location/age without a blood group
+            models.Index(
+                fields=['district', 'taluk', 'age'],
+                name='donor_location_idx',
+                condition=models.Q(willing_to_donate=True),
+            ),
+            # "Eligible now" (eligibility.py) among willing donors: searched by the age window,
+            # with gender and last_donation_date in each entry (not covering; rows are still read)
+            models.Index(
+                fields=['age', 'gender', 'last_donation_date'],
+                name='donor_eligibility_idx',
+                condition=models.Q(willing_to_donate=True),
+            ),
+            # Keyset pagination order for donor_list and the hospital dashboard
+            models.Index(fields=['name', 'id'], name='user_name_id_idx'),
+            # MAX(updated_at) for the API's Last-Modified (api.py)
+            models.Index(fields=['updated_at'], name='user_updated_idx'),
+        ]
+
+
+class BloodRequestQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # auto_now is not applied by queryset updates, and the API's Last-Modified reads it
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
 
 
 class BloodRequest(models.Model):
     requester = models.ForeignKey(User, on_delete=models.CASCADE)
     blood_group = models.CharField(max_length=5, choices=User.BLOOD_GROUP_CHOICES)
     hospital_name = models.CharField(max_length=100)
+    # Where the hospital is; donor alerts are limited to NOTIFICATION_RADIUS_KM around it
+    taluk = models.CharField(max_length=50, choices=User.TALUK_CHOICES, default='', blank=True)
     required_date = models.DateField()
     status = models.CharField(max_length=20, default='Pending')
+    # Last-Modified of the request listing API (api.py)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BloodRequestQuerySet.as_manager()
 
     def __str__(self) -> str:
         return f"{self.blood_group} needed at {self.hospital_name}"
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'required_date'], name='request_status_date_idx'),
+            models.Index(fields=['required_date', 'id'], name='request_date_id_idx'),
+            models.Index(fields=['updated_at'], name='request_updated_idx'),
+        ]
+
+
+class BloodDonationQuerySet(models.QuerySet):
+    """Keeps donor counters, rollups and the dashboard cache correct for bulk writes that bypass model signals"""
+
+    # Fields whose changes move a donation between rollup rows
+    ROLLUP_FIELDS = {'donor', 'donor_id', 'donation_date', 'blood_group', 'units_donated'}
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import dashboard, rollups
+        from .counters import refresh_donation_counters
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            refresh_donation_counters({obj.donor_id for obj in objs})
+            rollups.donations_created(objs)
+        dashboard.invalidate()
+        return objs
+
+    def update(self, **kwargs):
+        from . import dashboard, rollups
+        from .counters import refresh_donation_counters
+        moves = bool(self.ROLLUP_FIELDS & set(kwargs))
+        with transaction.atomic(using=self.db, savepoint=False):
+            rows = list(self.values_list('pk', 'donor_id'))
+            # The rows may no longer match this queryset's filter once updated
+            same_rows = self.model.objects.filter(pk__in=[pk for pk, _ in rows])
+            before = rollups.donation_totals(same_rows) if moves else {}
+            # auto_now is not applied by queryset updates
+            kwargs.setdefault('updated_at', timezone.now())
+            count = super().update(**kwargs)
+            donor_ids = {donor_id for _, donor_id in rows}
+            if {'donor', 'donor_id'} & set(kwargs):
+                # Read the new donors back: bulk_update() passes a Case expression, not a donor
+                donor_ids.update(same_rows.values_list('donor_id', flat=True))
+            refresh_donation_counters(donor_ids)
+            if moves:
+                rollups.add_donations(rollups.merge_totals((rollups.donation_totals(same_rows), 1), (before, -1)))
+        dashboard.invalidate()
+        return count
+
+    def delete(self):
+        from . import rollups
+        from .counters import deferred_counter_refresh
+        with transaction.atomic(using=self.db, savepoint=False):
+            totals = rollups.donation_totals(self)
+            with deferred_counter_refresh(), rollups.applied_in_bulk():
+                deleted = super().delete()
+            rollups.add_donations(totals, sign=-1)
+        return deleted
+
 
 class BloodDonation(models.Model):
     donor = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -201,12 +215,30 @@ class BloodDonation(models.Model):
     units_donated = models.PositiveIntegerField(default=1)
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BloodDonationQuerySet.as_manager()
     
     def __str__(self) -> str:
         return f"{self.donor.name} donated {self.units_donated} unit(s) on {self.donation_date}"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored donor so reassigning a donation refreshes both donors,
+        # and the stored rollup key so an edit moves the donation between rollup rows
+        instance._loaded_donor_id = instance.__dict__.get('donor_id')
+        instance._loaded_rollup = tuple(
+            instance.__dict__.get(name) for name in ('donor_id', 'donation_date', 'blood_group', 'units_donated')
+        )
+        return instance
     
     class Meta:
         ordering = ['-donation_date']
+        indexes = [
+            models.Index(fields=['donor', 'donation_date'], name='donation_donor_date_idx'),
+            models.Index(fields=['donation_date', 'id'], name='donation_date_id_idx'),
+        ]
 
 
 class BloodInventory(models.Model):
@@ -232,6 +264,32 @@ class BloodInventory(models.Model):
             return 'success'
 
 
+class InventoryTransaction(models.Model):
+    """Append-only ledger of stock movements; BloodInventory holds the running balance"""
+    KIND_CHOICES = [
+        ('Donation', 'Donation'),
+        ('Issue', 'Issue'),
+        ('Adjustment', 'Adjustment'),
+        ('Expiry', 'Expiry'),
+    ]
+
+    blood_group = models.CharField(max_length=5, choices=User.BLOOD_GROUP_CHOICES)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    units = models.IntegerField(help_text='Signed change in available units')
+    donation = models.ForeignKey(BloodDonation, on_delete=models.SET_NULL, null=True, blank=True, related_name='inventory_transactions')
+    note = models.CharField(max_length=200, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self) -> str:
+        return f"{self.kind} {self.units:+d} {self.blood_group}"
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['blood_group', 'created_at'], name='inventory_txn_group_idx'),
+        ]
+
+
 class EmergencyContact(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='emergency_contacts')
     name = models.CharField(max_length=100)
@@ -241,3 +299,92 @@ class EmergencyContact(models.Model):
     
     def __str__(self) -> str:
         return f"{self.name} ({self.relationship}) - {self.user.name}"
+
+
+class DonorNotification(models.Model):
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Sending', 'Sending'),
+        ('Sent', 'Sent'),
+        ('Failed', 'Failed'),
+    ]
+
+    blood_request = models.ForeignKey(BloodRequest, on_delete=models.CASCADE, related_name='notifications', null=True, blank=True)
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Set by the worker that claimed the row for sending (notifications.py)
+    claim = models.CharField(max_length=32, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self) -> str:
+        return f"{self.subject} -> {self.recipient} ({self.status})"
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='notification_due_idx'),
+        ]
+
+
+class DonationRollup(models.Model):
+    """Donation totals per day, blood group and donor district (see rollups.py)"""
+    date = models.DateField()
+    blood_group = models.CharField(max_length=5, choices=User.BLOOD_GROUP_CHOICES)
+    district = models.CharField(max_length=50, blank=True, default='')
+    donations = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.date} {self.blood_group} {self.district or '-'}: {self.donations} donation(s)"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'blood_group', 'district'], name='donation_rollup_unique'),
+        ]
+
+
+class DonorRollup(models.Model):
+    """Willing donor counts per blood group and district (see rollups.py)"""
+    blood_group = models.CharField(max_length=5, choices=User.BLOOD_GROUP_CHOICES)
+    district = models.CharField(max_length=50, blank=True, default='')
+    donors = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.blood_group} {self.district or '-'}: {self.donors} donor(s)"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['blood_group', 'district'], name='donor_rollup_unique'),
+        ]
+
+
+class ChangeMarker(models.Model):
+    """Counts deletes per table, which leave no ``updated_at`` behind (see changes.py)"""
+    name = models.CharField(max_length=50, unique=True)
+    version = models.PositiveIntegerField(default=0)
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.version}"
+
+
+class NameTrigram(models.Model):
+    """Trigram postings for fuzzy donor name search (see search.py)"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='name_trigrams')
+    trigram = models.CharField(max_length=3)
+
+    def __str__(self) -> str:
+        return f"{self.trigram!r} -> {self.user_id}"
+
+    class Meta:
+        constraints = [
+            # Also serves the per-user hit count in search_names
+            models.UniqueConstraint(fields=['user', 'trigram'], name='name_trigram_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['trigram', 'user'], name='name_trigram_lookup_idx'),
+        ]
@@ -0,0 +1,232 @@
+"""
+Queued email notifications for blood requests.
+
+``request_blood`` only writes rows to the ``DonorNotification`` table. The
+queue is drained by ``python manage.py send_notifications``, which sends each
+batch over a single mail connection, throttles to ``NOTIFICATION_RATE_LIMIT``
+messages per second and reschedules failures with exponential backoff.
+
+Each batch is claimed before anything is sent: one conditional UPDATE marks
+the due rows ``Sending`` with a token only this worker knows, and only the
+rows carrying that token are sent. Overlapping workers (cron plus
+``--loop``) therefore never send the same message twice. A claim lasts
+``NOTIFICATION_CLAIM_TIMEOUT`` seconds; rows left ``Sending`` by a worker
+that died are picked up again after that. With a rate limit, batches are cut
+to what can be sent in half that time, and results are only written to rows
+that still carry the worker's token, so a worker that overran its claim
+cannot overwrite the claim of one that retook the rows.
+
+When the request names the hospital's taluk, only donors within
+``NOTIFICATION_RADIUS_KM`` of it are alerted, nearest first, so they are also
+the first to be sent. With ``NOTIFICATION_ELIGIBLE_ONLY`` donors who will
+not be eligible to donate again by the required date (eligibility.py) are
+skipped.
+"""
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .eligibility import eligible
+from .matching import find_compatible_donors, near_taluk
+from .models import DonorNotification, User
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _confirmation_message(blood_request):
+    user = blood_request.requester
+    return DonorNotification(
+        blood_request=blood_request,
+        recipient=user.email,
+        subject=f"Your blood request for {blood_request.blood_group}",
+        body=(
+            f"Hi {user.name}, your request was received.\n\n"
+            f"Hospital: {blood_request.hospital_name}\n"
+            f"Required Date: {blood_request.required_date}\n"
+        ),
+    )
+
+
+def _donor_message(blood_request, donor_name, donor_email):
+    user = blood_request.requester
+    return DonorNotification(
+        blood_request=blood_request,
+        recipient=donor_email,
+        subject=f"Urgent: {blood_request.blood_group} blood needed",
+        body=(
+            f"Dear {donor_name},\n\n"
+            f"A recipient has requested {blood_request.blood_group} blood.\n\n"
+            f"Requester: {user.name}\n"
+            f"City: {user.city}\n"
+            f"Contact: {user.phone}{' / ' + user.email if user.email else ''}\n"
+            f"Hospital: {blood_request.hospital_name}\n"
+            f"Required Date: {blood_request.required_date}\n\n"
+            f"If you're available, please contact the requester or hospital directly.\n"
+        ),
+    )
+
+
+def queue_request_notifications(blood_request):
+    """Queue the requester confirmation and donor alerts for a blood request"""
+    notifications = []
+    if blood_request.requester.email:
+        notifications.append(_confirmation_message(blood_request))
+
+    # Every willing donor whose group can give to the requested one, near the hospital if we know where it is
+    donors = find_compatible_donors(
+        blood_request.blood_group,
+        # The requester already gets the confirmation
+        User.objects.filter(willing_to_donate=True).exclude(email='').exclude(pk=blood_request.requester_id),
+    )
+    if _setting('NOTIFICATION_ELIGIBLE_ONLY', True):
+        donors = eligible(donors, on=max(timezone.localdate(), blood_request.required_date))
+    if blood_request.taluk:
+        donors = near_taluk(donors, blood_request.taluk, _setting('NOTIFICATION_RADIUS_KM', 50))
+        donors = donors.order_by('distance_km', '-exact_match', 'name', 'id')
+    for donor_name, donor_email in donors.values_list('name', 'email').iterator(chunk_size=2000):
+        notifications.append(_donor_message(blood_request, donor_name, donor_email))
+
+    DonorNotification.objects.bulk_create(notifications, batch_size=500)
+    return len(notifications)
+
+
+def _claim_batch(batch_size):
+    """Claim up to ``batch_size`` due notifications for this worker and return them"""
+    now = timezone.now()
+    # Queued rows that are due, and claims whose worker ran out of time
+    due = DonorNotification.objects.filter(status__in=['Queued', 'Sending'], next_attempt_at__lte=now)
+    candidates = list(due.order_by('next_attempt_at', 'id').values_list('id', flat=True)[:batch_size])
+    if not candidates:
+        return []
+    claim = uuid.uuid4().hex
+    # Re-checked row by row as it is written, so a row another worker claimed in between is skipped
+    claimed = due.filter(id__in=candidates).update(
+        status='Sending', claim=claim,
+        next_attempt_at=now + timedelta(seconds=_setting('NOTIFICATION_CLAIM_TIMEOUT', 300)),
+    )
+    if not claimed:
+        return []
+    return list(DonorNotification.objects.filter(claim=claim, status='Sending').order_by('id'))
+
+
+def _record_failures(claim, failures, max_attempts, backoff):
+    now = timezone.now()
+    for notification, error in failures:
+        notification.attempts += 1
+        notification.last_error = error[:1000]
+        if notification.attempts >= max_attempts:
+            notification.status = 'Failed'
+        else:
+            notification.status = 'Queued'
+            delay = backoff * (2 ** (notification.attempts - 1))
+            notification.next_attempt_at = now + timedelta(seconds=delay)
+    DonorNotification.objects.filter(claim=claim, status='Sending').bulk_update(
+        [notification for notification, _ in failures],
+        ['attempts', 'last_error', 'status', 'next_attempt_at'],
+    )
+
+
+def _open_quietly(connection):
+    # If the server is unreachable, send_messages() retries the open and the
+    # error is recorded against each message instead of aborting the batch.
+    try:
+        connection.open()
+    except Exception:
+        pass
+
+
+def deliver_queued(batch_size=None, rate_limit=None, max_attempts=None, max_batches=None):
+    """
+    Send due notifications in batches and return delivery counters.
+
+    Each batch reuses one mail connection. A failed message does not abort the
+    batch: it is rescheduled (or marked Failed after ``max_attempts``) and the
+    connection is reopened for the next message.
+    """
+    batch_size = batch_size or _setting('NOTIFICATION_BATCH_SIZE', 100)
+    if rate_limit is None:
+        rate_limit = _setting('NOTIFICATION_RATE_LIMIT', 0)
+    max_attempts = max_attempts or _setting('NOTIFICATION_MAX_ATTEMPTS', 5)
+    backoff = _setting('NOTIFICATION_RETRY_BACKOFF', 60)
+    interval = 1.0 / rate_limit if rate_limit else 0
+    if rate_limit:
+        # Leave half the claim for slow SMTP round trips, so the batch is done before others may retake it
+        claim_timeout = _setting('NOTIFICATION_CLAIM_TIMEOUT', 300)
+        batch_size = max(1, min(batch_size, int(claim_timeout * rate_limit / 2)))
+
+    stats = {'sent': 0, 'failed': 0, 'batches': 0}
+    next_send = time.monotonic()
+    while max_batches is None or stats['batches'] < max_batches:
+        batch = _claim_batch(batch_size)
+        if not batch:
+            break
+        stats['batches'] += 1
+        claim = batch[0].claim
+
+        sent_ids = []
+        failures = []
+        connection = get_connection(fail_silently=False)
+        try:
+            _open_quietly(connection)
+            for notification in batch:
+                if interval:
+                    delay = next_send - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_send = max(next_send, time.monotonic()) + interval
+                message = EmailMessage(
+                    subject=notification.subject,
+                    body=notification.body,
+                    to=[notification.recipient],
+                    connection=connection,
+                )
+                try:
+                    connection.send_messages([message])
+                except Exception as exc:
+                    failures.append((notification, f"{exc.__class__.__name__}: {exc}"))
+                    # The server may have dropped us; continue the batch on a fresh connection.
+                    connection.close()
+                    _open_quietly(connection)
+                else:
+                    sent_ids.append(notification.id)
+        finally:
+            connection.close()
+
+        if sent_ids:
+            DonorNotification.objects.filter(id__in=sent_ids, claim=claim, status='Sending').update(
+                status='Sent',
+                sent_at=timezone.now(),
+                attempts=F('attempts') + 1,
+                last_error='',
+            )
+        if failures:
+            _record_failures(claim, failures, max_attempts, backoff)
+        stats['sent'] += len(sent_ids)
+        stats['failed'] += len(failures)
+    return stats
+
+
+def delivery_stats(blood_request):
+    """Get queued/sent/failed notification counts for a blood request"""
+    return DonorNotification.objects.filter(blood_request=blood_request).aggregate(**_stat_aggregates(''))
+
+
+def with_delivery_stats(queryset):
+    """Annotate a BloodRequest queryset with notification delivery counts"""
+    return queryset.annotate(**_stat_aggregates('notifications__'))
+
+
+def _stat_aggregates(prefix):
+    return {
+        'notifications_total': Count(f'{prefix}id'),
+        'notifications_sent': Count(f'{prefix}id', filter=Q(**{f'{prefix}status': 'Sent'})),
+        'notifications_failed': Count(f'{prefix}id', filter=Q(**{f'{prefix}status': 'Failed'})),
+        'notifications_queued': Count(f'{prefix}id', filter=Q(**{f'{prefix}status__in': ['Queued', 'Sending']})),
+    }
@@ -0,0 +1,171 @@
+"""
+Keyset (cursor) pagination.
+
+Pages are fetched with ``WHERE (ordering) > (last row seen)`` instead of
+OFFSET, so a deep page costs the same as the first one. Cursors are opaque
+url-safe tokens holding the ordering values of the boundary row.
+
+The ordering must end with a unique field (``id``) and must not contain
+nullable fields.
+"""
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values, direction='next'):
+    payload = json.dumps({'v': values, 'd': direction}, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        values, direction = payload['v'], payload['d']
+    except (ValueError, TypeError, KeyError):
+        raise InvalidCursor('Malformed pagination cursor')
+    if not isinstance(values, list) or direction not in ('next', 'previous'):
+        raise InvalidCursor('Malformed pagination cursor')
+    return values, direction
+
+
+def page_size_from(request, param='page_size'):
+    """Read a page size from the query string, clamped to PAGINATION_MAX_PAGE_SIZE"""
+    default = getattr(settings, 'PAGINATION_PAGE_SIZE', 25)
+    maximum = getattr(settings, 'PAGINATION_MAX_PAGE_SIZE', 100)
+    try:
+        size = int(request.GET.get(param, default))
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor, page_size):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.page_size = page_size
+        self.next_query = ''
+        self.previous_query = ''
+        self.first_query = ''
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    def __init__(self, queryset, ordering, page_size=25):
+        self.queryset = queryset
+        self.ordering = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        self.page_size = page_size
+
+    def _output_field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.queryset.model._meta.get_field(name)
+
+    def _values_of(self, row):
+        if isinstance(row, dict):
+            values = [row[name] for name, _ in self.ordering]
+        else:
+            values = [getattr(row, name) for name, _ in self.ordering]
+        return [value.isoformat() if hasattr(value, 'isoformat') else value for value in values]
+
+    def _boundary_filter(self, values, forward):
+        if len(values) != len(self.ordering):
+            raise InvalidCursor('Cursor does not match the ordering')
+        try:
+            values = [self._output_field(name).to_python(value) for (name, _), value in zip(self.ordering, values)]
+        except Exception:
+            raise InvalidCursor('Cursor holds invalid values')
+        clauses = []
+        for i, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending == forward else 'gt'
+            equal = {prev_name: values[j] for j, (prev_name, _) in enumerate(self.ordering[:i])}
+            clauses.append(Q(**equal, **{f'{name}__{lookup}': values[i]}))
+        # The redundant inclusive bound on the leading column lets the database
+        # seek into the index instead of scanning it from the top.
+        name, descending = self.ordering[0]
+        leading = Q(**{f"{name}__{'lte' if descending == forward else 'gte'}": values[0]})
+        return leading & reduce(or_, clauses)
+
+    def _order_by(self, forward):
+        return [
+            f'-{name}' if descending == forward else name
+            for name, descending in self.ordering
+        ]
+
+    def queryset_for(self, cursor=None):
+        """Build the (LIMIT page_size + 1) queryset for the page after or before ``cursor``"""
+        forward = True
+        queryset = self.queryset
+        if cursor:
+            values, direction = decode_cursor(cursor)
+            forward = direction == 'next'
+            queryset = queryset.filter(self._boundary_filter(values, forward))
+        return queryset.order_by(*self._order_by(forward))[:self.page_size + 1]
+
+    def page(self, cursor=None):
+        forward = not cursor or decode_cursor(cursor)[1] == 'next'
+        rows = list(self.queryset_for(cursor))
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if not forward:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or not forward:
+                next_cursor = encode_cursor(self._values_of(rows[-1]), 'next')
+            if cursor and (has_more or forward):
+                previous_cursor = encode_cursor(self._values_of(rows[0]), 'previous')
+        return KeysetPage(rows, next_cursor, previous_cursor, self.page_size)
+
+
+def paginate(request, queryset, ordering, param='cursor'):
+    """
+    Return the keyset page selected by ``request.GET[param]``.
+
+    The page carries ready-made query strings (``next_query``,
+    ``previous_query``, ``first_query``) that keep the other GET parameters,
+    so several paginated lists can share one page. A malformed cursor falls
+    back to the first page.
+    """
+    paginator = KeysetPaginator(queryset, ordering, page_size_from(request))
+    try:
+        page = paginator.page(request.GET.get(param))
+    except InvalidCursor:
+        page = paginator.page()
+
+    params = request.GET.copy()
+    params.pop(param, None)
+    page.first_query = params.urlencode()
+    if page.has_next:
+        params[param] = page.next_cursor
+        page.next_query = params.urlencode()
+    if page.has_previous:
+        params[param] = page.previous_cursor
+        page.previous_query = params.urlencode()
+    return page
@@ -0,0 +1,170 @@
+"""
+On-demand cProfile captures for staff.
+
+A staff user adds ``?_profile=1`` to any URL (or sends ``X-Profile: 1``) and
+that request runs under cProfile. Each capture is saved in ``PROFILE_DIR`` as
+
+* ``<id>.prof``: pstats data, for ``python -m pstats``, snakeviz and the like
+* ``<id>.collapsed``: collapsed stacks (``a;b;c <samples>``) for
+  flamegraph.pl or speedscope
+* ``<id>.json``: the summary shown on ``/profiles/``
+
+and only the newest ``PROFILE_KEEP`` captures are kept. cProfile only records
+caller/callee pairs, which cannot be put back together into stacks (the
+middleware chain alone calls the same two functions in turn), so the
+collapsed stacks come from a thread sampling the request's stack every
+``PROFILE_SAMPLE_INTERVAL`` seconds while cProfile runs (in practice every
+few milliseconds, since the sampler has to wait for the GIL).
+"""
+import cProfile
+import json
+import pstats
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+KINDS = ('prof', 'collapsed', 'json')
+CAPTURE_NAME = re.compile(r'^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}\.(?:prof|collapsed|json)$')
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILE_DIR', settings.BASE_DIR / 'cache' / 'profiles'))
+
+
+def wanted(request):
+    if request.GET.get('_profile') != '1' and request.headers.get('X-Profile') != '1':
+        return False
+    user = getattr(request, 'user', None)
+    return bool(user and user.is_staff)
+
+
+def _label(func):
+    filename, lineno, name = func
+    if filename == '~':
+        return name
+    parts = Path(filename).parts[-2:]
+    return f'{"/".join(parts)}:{lineno}({name})'
+
+
+class StackSampler(threading.Thread):
+    """Counts the stacks of thread ``thread_id`` below ``root`` (a code object) every ``interval`` seconds"""
+
+    def __init__(self, thread_id, root, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.root = root
+        self.interval = interval
+        self.stacks = Counter()
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(_label((code.co_filename, code.co_firstlineno, code.co_name)))
+                if code is self.root:
+                    break
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self.finished.set()
+        self.join()
+
+
+def _rotate(directory, keep):
+    summaries = sorted(directory.glob('*.json'), reverse=True)
+    for summary in summaries[keep:]:
+        for kind in KINDS:
+            summary.with_suffix(f'.{kind}').unlink(missing_ok=True)
+
+
+def save(profiler, stacks, request, response, elapsed):
+    """Write the three capture files; returns the capture id"""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    capture = f'{timezone.now():%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}'
+    base = directory / capture
+    profiler.dump_stats(base.with_suffix('.prof'))
+
+    with open(base.with_suffix('.collapsed'), 'w') as f:
+        for stack, samples in sorted(stacks.items()):
+            f.write(f'{stack} {samples}\n')
+    stats = pstats.Stats(profiler)
+    top = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:getattr(settings, 'PROFILE_TOP_FUNCTIONS', 15)]
+    summary = {
+        'id': capture,
+        'created': timezone.now().isoformat(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'view': getattr(request.resolver_match, 'view_name', None),
+        'status': response.status_code,
+        'user': request.user.get_username(),
+        'total_ms': round(elapsed * 1000, 1),
+        'samples': sum(stacks.values()),
+        'top': [
+            {'function': _label(func), 'calls': calls, 'own_ms': round(own * 1000, 2), 'cumulative_ms': round(cumulative * 1000, 2)}
+            for func, (_, calls, own, cumulative, _) in top
+        ],
+    }
+    base.with_suffix('.json').write_text(json.dumps(summary))
+    _rotate(directory, getattr(settings, 'PROFILE_KEEP', 50))
+    return capture
+
+
+def captures():
+    """Summaries of the saved captures, newest first"""
+    directory = profile_dir()
+    if not directory.exists():
+        return []
+    summaries = []
+    for path in sorted(directory.glob('*.json'), reverse=True):
+        try:
+            summaries.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            # Rotated away or half-written by a concurrent request
+            continue
+    return summaries
+
+
+def capture_file(name):
+    """Path of a saved capture file, or None for anything else"""
+    if not CAPTURE_NAME.match(name):
+        return None
+    path = profile_dir() / name
+    return path if path.exists() else None
+
+
+class ProfilerMiddleware:
+    """Profiles the rest of the request for staff who ask for it; goes after AuthenticationMiddleware"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not wanted(request):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(), ProfilerMiddleware.__call__.__code__,
+                               getattr(settings, 'PROFILE_SAMPLE_INTERVAL', 0.001))
+        sampler.start()
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            sampler.stop()
+        capture = save(profiler, sampler.stacks, request, response, time.perf_counter() - start)
+        response['X-Profile-Capture'] = capture
+        return response
@@ -0,0 +1,295 @@
+"""
+Statistics rollup tables.
+
+``DonationRollup`` keeps donation/unit totals per (day, blood group, donor
+district) and ``DonorRollup`` keeps willing donor counts per (blood group,
+district), so the statistics page reads a few small indexed tables instead of
+aggregating the full history. Like the donation counters (counters.py) they
+follow every write in the same transaction: saves and deletes through
+signals.py, using the state each row was loaded with, bulk
+``bulk_create``/``update``/``delete`` through ``BloodDonationQuerySet`` and
+bulk ``update`` (e.g. the admin's willing-to-donate actions) through
+``UserQuerySet``. The importer adds its totals per chunk. Donations are filed
+under their donor's current district, so moving a donor moves their donations
+too. ``python manage.py rebuild_rollups`` recomputes both from scratch (e.g.
+after raw SQL).
+"""
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import ExtractMonth
+
+from . import bulk
+from .models import BloodDonation, DonationRollup, DonorRollup, User
+
+# Donor fields the rollups depend on, remembered by User.from_db
+DONOR_FIELDS = ('willing_to_donate', 'blood_group', 'district')
+# Set while a BloodDonationQuerySet applies its own totals
+_bulk = ContextVar('rollups_bulk', default=False)
+
+
+def _bump(model, keys, **deltas):
+    """Atomically add ``deltas`` to the rollup row identified by ``keys``"""
+    increments = {field: F(field) + delta for field, delta in deltas.items()}
+    if model.objects.filter(**keys).update(**increments):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **deltas)
+    except IntegrityError:
+        # Another transaction created the row first
+        model.objects.filter(**keys).update(**increments)
+
+
+def _bump_many(model, key_fields, totals):
+    """Add ``{key_tuple: {field: delta}}`` to many rollup rows at once (bulk imports)"""
+    if not totals:
+        return
+    try:
+        with transaction.atomic():
+            bulk.add_to_rows(model, key_fields, totals)
+    except IntegrityError:
+        # Another transaction created one of the rows first
+        for key, deltas in totals.items():
+            _bump(model, dict(zip(key_fields, key)), **deltas)
+
+
+def add_donations(totals, sign=1):
+    """Add ``{(date, blood_group, district): (donations, units)}`` to the rollups (``sign=-1`` removes them)"""
+    deltas = {
+        key: {'donations': sign * donations, 'units': sign * units}
+        for key, (donations, units) in totals.items() if donations or units
+    }
+    # A negative value fails the CHECK of an upsert's INSERT half, so removals only UPDATE existing rows
+    removals = {key: delta for key, delta in deltas.items() if min(delta.values()) < 0}
+    bulk.increment_rows(DonationRollup, ('date', 'blood_group', 'district'), removals)
+    _bump_many(DonationRollup, ('date', 'blood_group', 'district'),
+               {key: delta for key, delta in deltas.items() if key not in removals})
+
+
+def add_donors(counts):
+    """Add ``{(blood_group, district): willing_donors}`` to the rollups (negative counts remove donors)"""
+    deltas = {key: {'donors': n} for key, n in counts.items() if n}
+    removals = {key: delta for key, delta in deltas.items() if delta['donors'] < 0}
+    bulk.increment_rows(DonorRollup, ('blood_group', 'district'), removals)
+    _bump_many(DonorRollup, ('blood_group', 'district'),
+               {key: delta for key, delta in deltas.items() if key not in removals})
+
+
+def donor_counts(users):
+    """``{(blood_group, district): willing_donors}`` for a ``User`` queryset, in one query"""
+    rows = (
+        users.filter(willing_to_donate=True).order_by()
+        .values('blood_group', 'district')
+        .annotate(donors=Count('id'))
+    )
+    return Counter({(row['blood_group'], row['district']): row['donors'] for row in rows})
+
+
+def donation_totals(donations):
+    """``{(date, blood_group, district): (donations, units)}`` for a ``BloodDonation`` queryset, in one query"""
+    rows = (
+        donations.order_by()
+        .values('donation_date', 'blood_group', 'donor__district')
+        .annotate(donations=Count('id'), units=Sum('units_donated'))
+    )
+    return {
+        (row['donation_date'], row['blood_group'], row['donor__district']): (row['donations'], row['units'])
+        for row in rows
+    }
+
+
+def merge_totals(*signed_totals):
+    """Net ``(totals, sign)`` pairs into one totals dict, dropping keys that cancel out"""
+    donations, units = Counter(), Counter()
+    for totals, sign in signed_totals:
+        for key, (n, u) in totals.items():
+            donations[key] += sign * n
+            units[key] += sign * u
+    return {key: (donations[key], units[key]) for key in donations if donations[key] or units[key]}
+
+
+def _day(value):
+    # The donation_date default is timezone.now, a datetime until the row is reloaded
+    return BloodDonation._meta.get_field('donation_date').to_python(value)
+
+
+def donation_state(donation):
+    return (donation.donor_id, _day(donation.donation_date), donation.blood_group, donation.units_donated)
+
+
+def _district(donor_id):
+    return User.objects.filter(pk=donor_id).values_list('district', flat=True).first()
+
+
+def _add_donation(state, district, sign):
+    if district is None:
+        # The donor is gone; rebuild() settles whatever is left
+        return
+    _, day, blood_group, units = state
+    _bump(DonationRollup, {'date': day, 'blood_group': blood_group, 'district': district},
+          donations=sign, units=sign * units)
+
+
+def record_donation(donation, sign=1):
+    """Add a donation to the rollups (``sign=-1`` removes it)"""
+    _add_donation(donation_state(donation), donation.donor.district, sign)
+
+
+def donations_created(donations):
+    """Add new donations (``bulk_create``), looking up their donors' districts in one query"""
+    districts = dict(User.objects.filter(pk__in={d.donor_id for d in donations}).values_list('pk', 'district'))
+    counts, units = Counter(), Counter()
+    for donation in donations:
+        key = (_day(donation.donation_date), donation.blood_group, districts[donation.donor_id])
+        counts[key] += 1
+        units[key] += donation.units_donated
+    add_donations({key: (n, units[key]) for key, n in counts.items()})
+
+
+def donation_saved(donation, created):
+    """Follow a saved donation: a new one, or a changed donor, date, blood group or units"""
+    state = donation_state(donation)
+    previous = None if created else getattr(donation, '_loaded_rollup', None)
+    if created:
+        record_donation(donation)
+    elif previous is not None and previous != state:
+        district = donation.donor.district
+        _add_donation(previous, district if previous[0] == state[0] else _district(previous[0]), -1)
+        _add_donation(state, district, 1)
+    donation._loaded_rollup = state
+
+
+def donation_deleted(donation):
+    """Take a deleted donation out, as it was stored"""
+    if _bulk.get():
+        return
+    state = getattr(donation, '_loaded_rollup', None) or donation_state(donation)
+    _add_donation(state, _district(state[0]), -1)
+
+
+@contextmanager
+def applied_in_bulk():
+    """Skip the per-donation delete signals inside the block; the caller adds its totals itself"""
+    token = _bulk.set(True)
+    try:
+        yield
+    finally:
+        _bulk.reset(token)
+
+
+def _add_donor(state, sign):
+    willing, blood_group, district = state
+    if willing:
+        _bump(DonorRollup, {'blood_group': blood_group, 'district': district}, donors=sign)
+
+
+def record_donor(user, sign=1):
+    """Add a willing donor to the rollups (``sign=-1`` removes them)"""
+    _add_donor(tuple(getattr(user, field) for field in DONOR_FIELDS), sign)
+
+
+def user_saved(user, created):
+    """Follow a saved user: a new donor, or a changed willingness, blood group or district"""
+    state = tuple(getattr(user, field) for field in DONOR_FIELDS)
+    previous = None if created else getattr(user, '_loaded_rollup', None)
+    if created:
+        _add_donor(state, 1)
+    elif previous is not None and previous != state:
+        _add_donor(previous, -1)
+        _add_donor(state, 1)
+        if previous[2] != state[2]:
+            # Refile the donor's donations under the new district
+            moved = donation_totals(BloodDonation.objects.filter(donor=user))
+            add_donations(merge_totals(
+                (moved, 1),
+                ({(day, group, previous[2]): totals for (day, group, _), totals in moved.items()}, -1),
+            ))
+    user._loaded_rollup = state
+
+
+def user_deleted(user):
+    """Take a deleted donor out, as stored; their donations go through donation_deleted"""
+    _add_donor(getattr(user, '_loaded_rollup', None) or tuple(getattr(user, field) for field in DONOR_FIELDS), -1)
+
+
+@transaction.atomic
+def rebuild():
+    """Recompute both rollup tables from the source tables"""
+    DonationRollup.objects.all().delete()
+    DonorRollup.objects.all().delete()
+    donation_rows = (
+        BloodDonation.objects.order_by()
+        .values('donation_date', 'blood_group', 'donor__district')
+        .annotate(donations=Count('id'), units=Sum('units_donated'))
+    )
+    DonationRollup.objects.bulk_create(
+        (
+            DonationRollup(
+                date=row['donation_date'],
+                blood_group=row['blood_group'],
+                district=row['donor__district'],
+                donations=row['donations'],
+                units=row['units'],
+            )
+            for row in donation_rows.iterator()
+        ),
+        batch_size=1000,
+    )
+    donor_rows = (
+        User.objects.filter(willing_to_donate=True).order_by()
+        .values('blood_group', 'district')
+        .annotate(donors=Count('id'))
+    )
+    DonorRollup.objects.bulk_create(
+        [DonorRollup(**row) for row in donor_rows],
+        batch_size=1000,
+    )
+
+
+def donation_years():
+    """Years that have at least one donation, newest first"""
+    return [d.year for d in DonationRollup.objects.dates('date', 'year', order='DESC')]
+
+
+def monthly_donations(year):
+    """Donation counts for each month of ``year`` (12 entries, zero-filled)"""
+    rows = (
+        DonationRollup.objects.filter(date__year=year)
+        .annotate(month=ExtractMonth('date'))
+        .values('month')
+        .annotate(count=Sum('donations'))
+        .order_by()
+    )
+    counts = {row['month']: row['count'] for row in rows}
+    return [counts.get(month, 0) for month in range(1, 13)]
+
+
+def donations_by_blood_group(year=None):
+    """Donation and unit totals per blood group, optionally limited to one year"""
+    rows = DonationRollup.objects.all()
+    if year:
+        rows = rows.filter(date__year=year)
+    return list(
+        rows.values('blood_group')
+        .annotate(total_donations=Sum('donations'), total_units=Sum('units'))
+        .filter(total_donations__gt=0)
+        .order_by('blood_group')
+    )
+
+
+def donors_by_blood_group():
+    """Willing donor counts per blood group"""
+    return list(
+        DonorRollup.objects.values('blood_group')
+        .annotate(count=Sum('donors'))
+        .filter(count__gt=0)
+        .order_by('blood_group')
+    )
+
+
+def total_donations():
+    return DonationRollup.objects.aggregate(total=Sum('donations'))['total'] or 0
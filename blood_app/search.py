@@ -0,0 +1,138 @@
+"""
+Fuzzy donor name search.
+
+Each word of a donor's name is padded (``" alice "``) and split into
+trigrams, which are stored in ``NameTrigram`` and kept in sync with ``User``
+saves (signals.py). A query is split the same way; donors sharing enough of
+its trigrams are candidates, ranked by how many they share. Padding makes
+prefixes match ("ali" -> "Alice") and a typo only costs the few trigrams
+around it ("alcie" still finds "Alice").
+
+A lookup never reads every posting of a common trigram (" ma", "an "). One
+query counts each query trigram's postings, stopping at
+``NAME_SEARCH_MAX_CANDIDATES``. Candidates are the donors found under the
+rarest trigrams, taken while their postings fit in that budget, and only
+they are scored against the whole query, through the (user, trigram) index.
+The work is bounded by the budget, not the size of the donor table.
+
+The results are exact while the rarest trigrams that every qualifying name
+must share (by pigeonhole, all but ``min_similarity`` of them) fit in the
+budget. Past that, a name sharing only common trigrams with the query can
+be missed; such names are weak matches anyway.
+
+``python manage.py rebuild_name_index`` recreates the table after bulk
+imports.
+"""
+import math
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from .models import NameTrigram, User
+
+WORD = re.compile(r'\w+')
+
+
+def name_trigrams(text):
+    grams = set()
+    for word in WORD.findall(text.lower()):
+        # One leading space, not pg_trgm's two: "  a" would be shared by every name starting with "a"
+        padded = f' {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def index_user(user):
+    """Replace the trigrams stored for ``user``"""
+    with transaction.atomic():
+        NameTrigram.objects.filter(user=user).delete()
+        NameTrigram.objects.bulk_create(
+            NameTrigram(user=user, trigram=gram) for gram in name_trigrams(user.name)
+        )
+
+
+@transaction.atomic
+def rebuild_index(batch_size=2000):
+    """Recreate the whole trigram table; returns the number of users indexed"""
+    NameTrigram.objects.all().delete()
+    users = 0
+    batch = []
+    for user_id, name in User.objects.values_list('id', 'name').iterator(chunk_size=batch_size):
+        users += 1
+        batch.extend(NameTrigram(user_id=user_id, trigram=gram) for gram in name_trigrams(name))
+        if len(batch) >= batch_size:
+            NameTrigram.objects.bulk_create(batch)
+            batch = []
+    NameTrigram.objects.bulk_create(batch)
+    return users
+
+
+def _capped_postings(grams, cap):
+    """{trigram: number of postings, counting no further than ``cap``} in one query"""
+    grams = sorted(grams)
+    table = NameTrigram._meta.db_table
+    columns = ', '.join(
+        f'(SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE trigram = %s LIMIT {int(cap)}) AS g{i})'
+        for i in range(len(grams))
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT {columns}', grams)
+        return dict(zip(grams, cursor.fetchone()))
+
+
+def _candidates(grams, filters):
+    """Ids (as a subquery) of the donors found under the rarest of ``grams``, read within the budget"""
+    budget = getattr(settings, 'NAME_SEARCH_MAX_CANDIDATES', 2000)
+    postings = _capped_postings(grams, budget + 1)
+    chosen, total = [], 0
+    for gram in sorted(grams, key=lambda gram: (postings[gram], gram)):
+        if chosen and total + postings[gram] > budget:
+            break
+        chosen.append(gram)
+        total += postings[gram]
+    # Bounded even when the rarest trigram alone is over budget
+    return NameTrigram.objects.filter(
+        trigram__in=chosen, **{f'user__{key}': value for key, value in filters.items()},
+    ).values('user')[:budget]
+
+
+def ranked_matches(query, min_similarity=0.3, **filters):
+    """
+    ``(user_id, name_hits)`` rows for names resembling ``query``, best match first.
+
+    ``filters`` are ``User`` lookups (e.g. ``age=30``) applied to the
+    candidates; a donor needs at least ``min_similarity`` of the query's
+    trigrams to be returned. Runs one query to choose the candidate
+    trigrams; the ranking itself is returned as a queryset.
+    """
+    grams = name_trigrams(query)
+    if not grams:
+        return NameTrigram.objects.none().values_list('user')
+    # Only user_id in the WHERE: each candidate's few postings are read through the (user, trigram) index
+    return (
+        NameTrigram.objects.filter(user__in=_candidates(grams, filters))
+        .values('user')
+        .annotate(name_hits=Count('id', filter=Q(trigram__in=grams)))
+        .filter(name_hits__gte=math.ceil(len(grams) * min_similarity))
+        .order_by('-name_hits', 'user')
+        .values_list('user', 'name_hits')
+    )
+
+
+def search_names(query, limit=50, min_similarity=0.3, **filters):
+    """
+    The best ``limit`` users for ``query`` as a list, each with ``name_hits`` set.
+
+    Three queries: the trigram counts, the ranking of the candidates, then the user rows.
+    """
+    ranking = list(ranked_matches(query, min_similarity, **filters)[:limit])
+    users = User.objects.in_bulk([user_id for user_id, _ in ranking])
+    results = []
+    for user_id, hits in ranking:
+        user = users[user_id]
+        user.name_hits = hits
+        results.append(user)
+    results.sort(key=lambda user: (-user.name_hits, user.name))
+    return results
@@ -0,0 +1,72 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import changes, dashboard, rollups, search, sqlite, thumbnails
+from .counters import refresh_donation_counters
+from .models import BloodDonation, BloodInventory, BloodRequest, User
+
+
+@receiver(post_save, sender=BloodDonation)
+def donation_saved(sender, instance, created, **kwargs):
+    # A reassigned donation changes the counters of the previous donor too
+    refresh_donation_counters({instance.donor_id, getattr(instance, '_loaded_donor_id', None)})
+    instance._loaded_donor_id = instance.donor_id
+    rollups.donation_saved(instance, created)
+
+
+@receiver(post_delete, sender=BloodDonation)
+def donation_deleted(sender, instance, **kwargs):
+    refresh_donation_counters({instance.donor_id})
+    rollups.donation_deleted(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    rollups.user_saved(instance, created)
+    # Trigram rows are removed with the user by the FK cascade
+    if created or instance.name != getattr(instance, '_loaded_name', None):
+        search.index_user(instance)
+        instance._loaded_name = instance.name
+    photo_name = instance.photo.name or None
+    previous = getattr(instance, '_loaded_photo', None) or None
+    if photo_name != previous:
+        # Photos are shared by content (storage.py), so keep derivatives others still use
+        if previous and not User.objects.filter(photo=previous).exists():
+            thumbnails.delete(previous)
+        ready = bool(photo_name) and thumbnails.generate(instance.photo)
+        if ready != instance.photo_thumbnails:
+            User.objects.filter(pk=instance.pk).update(photo_thumbnails=ready)
+            instance.photo_thumbnails = ready
+        instance._loaded_photo = photo_name
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    rollups.user_deleted(instance)
+    if instance.photo and not User.objects.filter(photo=instance.photo.name).exists():
+        thumbnails.delete(instance.photo.name)
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=BloodRequest)
+def api_row_deleted(sender, **kwargs):
+    # A delete moves no updated_at stamp, so the API's validators read this marker too
+    changes.bump(sender._meta.model_name)
+
+
+@receiver(post_save, sender=BloodInventory)
+@receiver(post_delete, sender=BloodInventory)
+@receiver(post_save, sender=BloodDonation)
+@receiver(post_delete, sender=BloodDonation)
+@receiver(post_save, sender=BloodRequest)
+@receiver(post_delete, sender=BloodRequest)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def dashboard_data_changed(sender, **kwargs):
+    dashboard.invalidate()
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    sqlite.configure_connection(connection)
@@ -0,0 +1,56 @@
+"""
+SQLite connection tuning and maintenance.
+
+``configure_connection`` runs for every new connection (see signals.py) and
+applies ``settings.SQLITE_PRAGMAS``: WAL so readers never block the writer,
+a busy timeout so concurrent writers wait instead of failing with "database
+is locked", and larger page cache / mmap / in-memory temp tables. ``maintain``
+is the periodic upkeep behind ``python manage.py dbmaintain``.
+"""
+from django.conf import settings
+
+
+def configure_connection(connection):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def pragma(connection, name):
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+
+def maintain(connection, vacuum=False):
+    """
+    Refresh planner statistics, reclaim free pages and checkpoint the WAL.
+
+    ``vacuum`` rebuilds the whole file once (switching it to incremental
+    auto-vacuum first if needed); without it only free pages are released,
+    which is cheap enough to run often. Returns a dict of what was done.
+    """
+    report = {}
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE')
+        cursor.execute('PRAGMA optimize')
+        if vacuum:
+            # auto_vacuum only changes on the next VACUUM
+            if pragma(connection, 'auto_vacuum') != 2:
+                cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            cursor.execute('VACUUM')
+            report['vacuumed'] = True
+        free_pages = pragma(connection, 'freelist_count')
+        if pragma(connection, 'auto_vacuum') == 2:
+            cursor.execute('PRAGMA incremental_vacuum')
+            report['freed_pages'] = free_pages
+        else:
+            report['free_pages'] = free_pages
+        if pragma(connection, 'journal_mode') == 'wal':
+            cursor.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            busy, log_pages, checkpointed = cursor.fetchone()
+            report['checkpointed_pages'] = checkpointed
+            report['checkpoint_busy'] = bool(busy)
+    return report
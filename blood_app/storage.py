@@ -0,0 +1,54 @@
+"""
+Content-addressed file storage for donor photos.
+
+``ContentAddressedStorage`` saves every upload as
+``<upload_to>/<sha[:2]>/<sha256>.<ext>``, so identical uploads are stored once
+and share a file. The hash is computed over ``content.chunks()``, so a large
+upload is never held in memory. Because a name always means the same bytes,
+a file is never overwritten and the thumbnails of an existing name are valid
+as they are.
+
+Files are shared between users, so they must only be deleted once no
+``User.photo`` refers to them. ``python manage.py dedupe_photos`` moves
+uploads saved before this storage to their hashed names.
+"""
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def content_hash(content):
+    """sha256 hex digest of a ``File``, read in chunks"""
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def hashed_name(self, name, content):
+        """The name ``content`` is stored under when saved as ``name``"""
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        digest = content_hash(content)
+        ext = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(directory, digest[:2], digest + ext)
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is chosen in _save() from the content
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            return name
+        # Write under a unique temporary name and rename into place, so two
+        # concurrent uploads of the same file both end up with ``name``
+        directory, filename = posixpath.split(name)
+        temporary = super()._save(posixpath.join(directory, f'.{filename}.{uuid.uuid4().hex}.tmp'), content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
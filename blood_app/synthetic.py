@@ -0,0 +1,240 @@
+"""
+Synthetic data at realistic proportions, for load tests and benchmarks.
+
+Donors are spread over the districts by population (2011 census) and evenly
+over each district's taluks, with India's blood group mix; donations over
+the last five years, blood requests and emergency contacts hang off them.
+Everything is drawn from one ``random.Random(seed)``, so a seed and scale
+always give the same rows. Rows go in ``batch_size`` at a time with
+``insert_rows``; donation counters, rollups and the dashboard are brought up
+to date once at the end.
+
+Synthetic donors have ``@synthetic.invalid`` addresses, which is how
+``clear`` finds them again. Used by ``python manage.py seed_synthetic``,
+benchmarks/bench_views.py and the query budget tests.
+"""
+import datetime
+import random
+from collections import Counter
+from itertools import islice
+
+from django.db import transaction
+from django.urls import URLPattern, reverse
+from django.utils import timezone
+
+from . import dashboard, geography, rollups
+from .bulk import insert_rows
+from .counters import reconcile_donation_counters
+from .inventory import set_available_units
+from .models import BloodDonation, BloodRequest, DonorNotification, EmergencyContact, InventoryTransaction, NameTrigram, User
+from .search import name_trigrams
+
+EMAIL_DOMAIN = 'synthetic.invalid'
+
+# Population in lakhs (2011 census)
+DISTRICT_WEIGHTS = {
+    'Thiruvananthapuram': 33.0, 'Kollam': 26.3, 'Pathanamthitta': 12.0, 'Alappuzha': 21.3,
+    'Kottayam': 19.7, 'Idukki': 11.1, 'Ernakulam': 32.8, 'Thrissur': 31.2, 'Palakkad': 28.1,
+    'Malappuram': 41.1, 'Kozhikode': 30.9, 'Wayanad': 8.2, 'Kannur': 25.2, 'Kasaragod': 13.1,
+}
+# Percent of the Indian population
+BLOOD_GROUP_WEIGHTS = {
+    'O+': 35.0, 'B+': 32.0, 'A+': 22.0, 'AB+': 7.5, 'O-': 1.0, 'B-': 1.0, 'A-': 1.0, 'AB-': 0.5,
+}
+MALE_NAMES = [
+    'Arjun', 'Abhijith', 'Akhil', 'Anand', 'Anoop', 'Arun', 'Basil', 'Biju', 'Deepak', 'Faisal', 'Gokul',
+    'Hari', 'Jithin', 'Joseph', 'Manu', 'Midhun', 'Muhammed', 'Nikhil', 'Rahul', 'Rajesh', 'Sajan',
+    'Sandeep', 'Shibu', 'Sreejith', 'Sunil', 'Thomas', 'Vishnu', 'Vivek',
+]
+FEMALE_NAMES = [
+    'Aiswarya', 'Anjali', 'Anu', 'Aparna', 'Arya', 'Athira', 'Deepa', 'Divya', 'Fathima', 'Gayathri',
+    'Jisha', 'Lakshmi', 'Maria', 'Meera', 'Neethu', 'Nisha', 'Parvathy', 'Reshma', 'Remya', 'Shahana',
+    'Sneha', 'Sreeja', 'Sruthi', 'Swathi',
+]
+FAMILY_NAMES = [
+    'Nair', 'Menon', 'Pillai', 'Kurup', 'Panicker', 'Warrier', 'Namboothiri', 'Thomas', 'Joseph',
+    'Varghese', 'Mathew', 'Kurian', 'Chacko', 'George', 'Abraham', 'Basheer', 'Rahman', 'Haneefa',
+    'Koya', 'Krishnan', 'Das', 'Kumar', 'Raj', 'Mohan', 'Gopal', 'Babu', 'Vijayan', 'Unnikrishnan',
+]
+HOSPITAL_KINDS = ['General Hospital', 'Government Medical College', 'District Hospital', 'Taluk Hospital',
+                  'Mission Hospital', 'Co-operative Hospital', 'Specialty Hospital']
+RELATIONSHIPS = ['Father', 'Mother', 'Spouse', 'Brother', 'Sister', 'Son', 'Daughter', 'Friend']
+REQUEST_STATUSES = {'Pending': 45, 'Approved': 20, 'Fulfilled': 30, 'Rejected': 5}
+
+
+def _weighted(rng, weights, count):
+    return rng.choices(list(weights), weights=list(weights.values()), k=count)
+
+
+def _batches(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+def _phone(rng):
+    return f'{rng.choice("6789")}{rng.randrange(10 ** 9):09d}'
+
+
+def _donors(rng, count):
+    districts = _weighted(rng, DISTRICT_WEIGHTS, count)
+    groups = _weighted(rng, BLOOD_GROUP_WEIGHTS, count)
+    for i in range(count):
+        gender = 'Male' if rng.random() < 0.55 else 'Female'
+        first = rng.choice(MALE_NAMES if gender == 'Male' else FEMALE_NAMES)
+        family = rng.choice(FAMILY_NAMES)
+        district = districts[i]
+        taluk = rng.choice(geography.TALUKS_BY_DISTRICT[district])
+        yield {
+            'name': f'{first} {family}',
+            'age': min(65, max(18, int(rng.gauss(34, 10)))),
+            'gender': gender,
+            'email': f'{first.lower()}.{family.lower()}.{i}@{EMAIL_DOMAIN}',
+            'phone': _phone(rng),
+            'city': taluk,
+            'district': district,
+            'taluk': taluk,
+            'blood_group': groups[i],
+            'willing_to_donate': rng.random() < 0.85,
+        }
+
+
+def _hospital(rng, district):
+    return f'{district} {rng.choice(HOSPITAL_KINDS)}'
+
+
+def _date_between(rng, start, end):
+    return start + datetime.timedelta(days=rng.randrange((end - start).days + 1))
+
+
+def exists():
+    return User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}').exists()
+
+
+@transaction.atomic
+def clear():
+    """Delete the synthetic donors and everything hanging off them; returns the number of donors"""
+    donors = User.objects.filter(email__endswith=f'@{EMAIL_DOMAIN}')
+    donations = BloodDonation.objects.filter(donor__in=donors)
+    requests = BloodRequest.objects.filter(requester__in=donors)
+    InventoryTransaction.objects.filter(donation__in=donations).update(donation=None)
+    # Raw deletes: the collector would load and signal every row, and the
+    # counters and rollups are rebuilt below anyway
+    for queryset in [
+        DonorNotification.objects.filter(blood_request__in=requests), requests, donations,
+        EmergencyContact.objects.filter(user__in=donors), NameTrigram.objects.filter(user__in=donors),
+    ]:
+        queryset._raw_delete(queryset.db)
+    count = donors._raw_delete(donors.db)
+    rollups.rebuild()
+    dashboard.invalidate()
+    return count
+
+
+def generate(donors, donations=None, requests=None, contacts=None, seed=42, batch_size=5000):
+    """
+    Insert ``donors`` synthetic donors and their related rows; returns a Counter of rows per table.
+
+    ``donations`` defaults to two per donor, ``requests`` to one per twenty
+    donors and ``contacts`` to one per two donors.
+    """
+    rng = random.Random(seed)
+    donations = donors * 2 if donations is None else donations
+    requests = donors // 20 if requests is None else requests
+    contacts = donors // 2 if contacts is None else contacts
+    created = Counter()
+
+    people = []
+    for batch in _batches(_donors(rng, donors), batch_size):
+        with transaction.atomic():
+            insert_rows(User, batch)
+            ids = dict(User.objects.filter(email__in=[row['email'] for row in batch]).values_list('email', 'pk'))
+            insert_rows(NameTrigram, [
+                {'user_id': ids[row['email']], 'trigram': gram} for row in batch for gram in name_trigrams(row['name'])
+            ])
+        people.extend((ids[row['email']], row['blood_group'], row['district']) for row in batch)
+        created['donors'] += len(batch)
+
+    today = timezone.localdate()
+    five_years_ago = today - datetime.timedelta(days=5 * 365)
+    rows = (
+        {
+            'donor_id': donor_id,
+            'donation_date': _date_between(rng, five_years_ago, today),
+            'hospital_name': _hospital(rng, district),
+            'blood_group': blood_group,
+            'units_donated': 1 if rng.random() < 0.9 else 2,
+            'notes': '',
+        }
+        for donor_id, blood_group, district in (rng.choice(people) for _ in range(donations))
+    )
+    for batch in _batches(rows, batch_size):
+        with transaction.atomic():
+            insert_rows(BloodDonation, batch)
+        created['donations'] += len(batch)
+
+    rows = (
+        {
+            'requester_id': requester_id,
+            'blood_group': _weighted(rng, BLOOD_GROUP_WEIGHTS, 1)[0],
+            'hospital_name': _hospital(rng, district),
+            'required_date': today + datetime.timedelta(days=rng.randint(-60, 30)),
+            'status': _weighted(rng, REQUEST_STATUSES, 1)[0],
+        }
+        for requester_id, _, district in (rng.choice(people) for _ in range(requests))
+    )
+    for batch in _batches(rows, batch_size):
+        with transaction.atomic():
+            insert_rows(BloodRequest, batch)
+        created['requests'] += len(batch)
+
+    rows = (
+        {
+            'user_id': user_id,
+            'name': f'{rng.choice(MALE_NAMES + FEMALE_NAMES)} {rng.choice(FAMILY_NAMES)}',
+            'relationship': rng.choice(RELATIONSHIPS),
+            'phone': _phone(rng),
+            'email': None,
+        }
+        for user_id, _, _ in (rng.choice(people) for _ in range(contacts))
+    )
+    for batch in _batches(rows, batch_size):
+        with transaction.atomic():
+            insert_rows(EmergencyContact, batch)
+        created['emergency contacts'] += len(batch)
+
+    reconcile_donation_counters()
+    rollups.rebuild()
+    for blood_group, weight in BLOOD_GROUP_WEIGHTS.items():
+        set_available_units(blood_group, int(weight * 2), note='Synthetic stock')
+    dashboard.invalidate()
+    return created
+
+
+def sample_urls():
+    """
+    ``(name, path)`` for every pattern in blood_app/urls.py, filled in with existing rows.
+
+    Used by the view benchmark and the query budget tests; needs at least one
+    donor with a donation and one blood request in the database.
+    """
+    from . import urls
+
+    donation = BloodDonation.objects.order_by('-donor__donation_count', 'pk').first()
+    values = {
+        'user_id': donation.donor_id,
+        'donation_id': donation.pk,
+        'request_id': BloodRequest.objects.order_by('pk').values_list('pk', flat=True).first(),
+        'dataset': 'donors',
+        'fmt': 'csv',
+    }
+    samples = []
+    for pattern in urls.urlpatterns:
+        if not isinstance(pattern, URLPattern):
+            continue
+        if pattern.name is None:
+            samples.append((str(pattern.pattern), f'/{pattern.pattern}'))
+            continue
+        kwargs = {name: values[name] for name in pattern.pattern.converters}
+        samples.append((pattern.name, reverse(pattern.name, kwargs=kwargs)))
+    return samples
@@ -0,0 +1,39 @@
+from django import template
+from django.utils.html import format_html
+
+from blood_app import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def donor_photo(user, size, css_class='rounded', style=''):
+    """
+    ``<picture>`` for ``user.photo`` shown at ``size`` CSS px, using the WebP/JPEG
+    thumbnails with a 2x ``srcset``. Falls back to the original upload until the
+    thumbnails exist, and renders nothing without a photo.
+    """
+    photo = user.photo
+    if not photo:
+        return ''
+    style = f'width:{size}px;height:{size}px;object-fit:cover;{style}'
+    if not user.photo_thumbnails:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" style="{}" width="{}" height="{}" loading="lazy">',
+            photo.url, user.name, css_class, style, size, size,
+        )
+    one_x, two_x = thumbnails.srcset_sizes(size)
+
+    def url(px, ext):
+        return thumbnails.url(photo.name, px, ext)
+
+    def srcset(ext):
+        if one_x == two_x:
+            return url(one_x, ext)
+        return f'{url(one_x, ext)} 1x, {url(two_x, ext)} 2x'
+
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}" alt="{}" class="{}" style="{}" width="{}" height="{}" loading="lazy"></picture>',
+        srcset('webp'), url(one_x, 'jpg'), srcset('jpg'), user.name, css_class, style, size, size,
+    )
@@ -0,0 +1,114 @@
+"""
+Query budgets for every page.
+
+Each URL in blood_app/urls.py (``synthetic.sample_urls``, plus the query
+string below) is requested as a superuser against synthetic data at two
+sizes. A view must stay within its budget and run the same number of queries
+at both sizes; a count that grows with the data is an N+1 (say a template
+reading ``donation.donor`` without ``select_related``). Failures list the
+SQL that ran.
+
+A new URL needs an entry here. If a change legitimately needs another query,
+raise the budget in the same commit.
+"""
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User as StaffUser
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from . import synthetic
+
+# url name: (most queries allowed, query string). Session and staff user
+# lookups are two of the queries on every page.
+BUDGETS = {
+    'home': (7, ''),
+    'accounts/profile/': (0, ''),
+    'register': (2, ''),
+    'donor_list': (3, '?blood_group=O%2B&min_age=25&near=Kanayannur&radius_km=60&eligible_now=on'),
+    'request_blood': (3, ''),
+    'request_list': (3, ''),
+    'hospital_dashboard': (4, ''),
+    'donor_certificate': (1, ''),
+    'donor_certificate_pdf': (1, ''),
+    'certificate_lookup': (0, ''),
+    'update_request_status': (2, ''),
+    'donation_list': (3, ''),
+    'record_donation': (3, ''),
+    'donation_certificate': (1, ''),
+    'donation_certificate_pdf': (1, ''),
+    'bulk_donation_certificates': (2, ''),
+    'export_data': (3, '?district=Ernakulam'),
+    'blood_inventory': (4, ''),
+    'add_emergency_contacts': (2, ''),
+    'user_profile': (3, ''),
+    'statistics': (9, ''),
+    'get_taluks': (0, ''),
+    'profile_captures': (2, ''),
+    'api_donors': (3, '?fields=name,blood_group,last_donation_date'),
+    'api_requests': (4, '?blood_group=O%2B'),
+    'api_inventory': (4, ''),
+}
+# Donors; at the small size every list fits on one page (25 rows), at the
+# large one they are full, so per-row queries change the count
+SIZES = (10, 200)
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Certificate and profile views write files; keep them out of the real cache/
+        cls.scratch_dirs = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+        cls.settings_override = override_settings(
+            CERTIFICATE_CACHE_DIR=cls.scratch_dirs[0], PROFILE_DIR=cls.scratch_dirs[1])
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        for directory in cls.scratch_dirs:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def measure(self):
+        """``{url name: (url, [sql, ...])}`` for one request to every URL"""
+        # Cached pages (the dashboard) must be measured cold
+        cache.clear()
+        runs = {}
+        for name, path in synthetic.sample_urls():
+            url = path + BUDGETS.get(name, (None, ''))[1]
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            self.assertLess(response.status_code, 400, url)
+            runs[name] = (url, [query['sql'] for query in queries])
+        return runs
+
+    def test_queries_stay_within_budget_at_every_size(self):
+        self.client.force_login(StaffUser.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        measured = []
+        for size in SIZES:
+            synthetic.clear()
+            synthetic.generate(size, requests=size // 5, seed=size)
+            measured.append((size, self.measure()))
+
+        self.assertEqual(set(measured[0][1]), set(BUDGETS), 'Every URL needs an entry in BUDGETS')
+        for name, (budget, _) in BUDGETS.items():
+            counts = {size: len(runs[name][1]) for size, runs in measured}
+            with self.subTest(name):
+                worst_size, worst = max(counts.items(), key=lambda item: item[1])
+                url, sql = dict(measured)[worst_size][name]
+                listing = '\n'.join(f'  {i}. {query}' for i, query in enumerate(sql, start=1))
+                self.assertLessEqual(
+                    worst, budget,
+                    f'{url} ran {worst} queries at {worst_size} donors, budget is {budget}:\n{listing}',
+                )
+                self.assertEqual(
+                    len(set(counts.values())), 1,
+                    f'{url} query count grows with the data {counts}:\n{listing}',
+                )
@@ -1,3 +1,1430 @@
-from django.test import TestCase
+import csv
+import gzip
+import json
+import os
+import pstats
+import shutil
+import socketserver
+import tempfile
+import threading
+import zipfile
+from io import BytesIO, StringIO
+from datetime import date, timedelta
+from pathlib import Path
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.contrib.auth.models import User as StaffUser
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template import Context, Template
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import certificates, dashboard, eligibility, geography, importer, instrumentation, rollups, sqlite, synthetic, thumbnails
+from .storage import content_hash
+from .counters import reconcile_donation_counters
+from .forms import BloodSearchForm
+from .inventory import InsufficientInventory, apply_transaction, reconcile_balances, remove_units, set_available_units
+from .bulk import insert_rows
+from .matching import COMPATIBLE_DONOR_GROUPS, find_compatible_donors, near_taluk
+from .models import User, BloodRequest, BloodDonation, BloodInventory, DonationRollup, DonorNotification, DonorRollup, InventoryTransaction, NameTrigram
+from .notifications import _claim_batch, deliver_queued, delivery_stats, queue_request_notifications
+from .pagination import KeysetPaginator, encode_cursor
+from .search import name_trigrams, ranked_matches, rebuild_index, search_names
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP to accept mail; rejects recipients listed on the server"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost stand-in')
+        while True:
+            line = self.rfile.readline().decode().strip()
+            if not line:
+                return
+            verb = line.split(' ', 1)[0].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'RCPT':
+                address = line.split(':', 1)[1].strip(' <>')
+                if address in server.rejected:
+                    self.reply('550 no such user')
+                else:
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 end with .')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with server.lock:
+                    server.messages += 1
+                self.reply('250 queued')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 OK')
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, rejected=()):
+        super().__init__(('127.0.0.1', 0), _SMTPHandler)
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.rejected = set(rejected)
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
+
+
+def make_user(name, blood_group='O+', **kwargs):
+    defaults = {
+        'name': name,
+        'age': 30,
+        'gender': 'Male',
+        'email': f'{name.lower().replace(" ", ".")}@example.com',
+        'phone': '9876543210',
+        'city': 'Kochi',
+        'district': 'Ernakulam',
+        'taluk': 'Kochi',
+        'blood_group': blood_group,
+    }
+    defaults.update(kwargs)
+    return User.objects.create(**defaults)
+
+
+class DonorNotificationTests(TestCase):
+    def setUp(self):
+        self.requester = make_user('Requester', blood_group='O+')
+        self.donors = [make_user(f'Donor {i}', blood_group='O+') for i in range(5)]
+        make_user('Other Group', blood_group='B+')
+        make_user('Unwilling', blood_group='O+', willing_to_donate=False)
+
+    def make_request(self):
+        return BloodRequest.objects.create(
+            requester=self.requester,
+            blood_group='O+',
+            hospital_name='General Hospital',
+            required_date=date(2026, 1, 1),
+        )
+
+    def test_view_queues_without_sending(self):
+        response = self.client.post(reverse('request_blood', args=[self.requester.id]), {
+            'blood_group': 'O+',
+            'hospital_name': 'General Hospital',
+            'required_date': '2026-01-01',
+        })
+        self.assertRedirects(response, reverse('request_list'))
+        self.assertEqual(mail.outbox, [])
+        # Requester confirmation plus every other willing O+ user
+        self.assertEqual(DonorNotification.objects.filter(status='Queued').count(), 6)
+        self.assertEqual(DonorNotification.objects.filter(recipient=self.requester.email).count(), 1)
+
+    def test_overlapping_workers_never_send_a_message_twice(self):
+        queued = queue_request_notifications(self.make_request())
+        # Another worker has claimed the first batch and is still sending it
+        other = _claim_batch(2)
+        self.assertEqual(len(other), 2)
+        with SMTPStandIn() as server:
+            host, port = server.server_address
+            with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                                   EMAIL_HOST=host, EMAIL_PORT=port):
+                stats = deliver_queued(batch_size=100, rate_limit=0)
+        self.assertEqual(stats['sent'], queued - 2)
+        self.assertEqual(set(DonorNotification.objects.filter(status='Sending')), set(other))
+
+        # Claims left behind by a worker that died are retaken once they time out
+        DonorNotification.objects.filter(status='Sending').update(next_attempt_at=timezone.now())
+        self.assertEqual(len(_claim_batch(100)), 2)
+
+    def test_rate_limited_batches_fit_in_the_claim(self):
+        queued = queue_request_notifications(self.make_request())
+        # 100 messages/s for a 0.04 s claim: batches of 2, sent in half of it
+        with override_settings(NOTIFICATION_CLAIM_TIMEOUT=0.04):
+            stats = deliver_queued(batch_size=100, rate_limit=100)
+        self.assertEqual(stats, {'sent': queued, 'failed': 0, 'batches': queued // 2})
+
+    def test_worker_that_lost_its_claim_records_nothing(self):
+        queued = queue_request_notifications(self.make_request())
+        send_messages = locmem.EmailBackend.send_messages
+
+        def send_after_claim_expired(backend, messages):
+            # This worker stalled past its claim and another one retook the rows
+            DonorNotification.objects.filter(status='Sending').update(claim='other')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(locmem.EmailBackend, 'send_messages', send_after_claim_expired):
+            deliver_queued(batch_size=100, rate_limit=0, max_batches=1)
+        self.assertEqual(DonorNotification.objects.filter(status='Sending', claim='other').count(), queued)
+
+    def test_batch_reuses_one_smtp_connection(self):
+        blood_request = self.make_request()
+        queued = queue_request_notifications(blood_request)
+        with SMTPStandIn() as server:
+            host, port = server.server_address
+            with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                                   EMAIL_HOST=host, EMAIL_PORT=port):
+                stats = deliver_queued(batch_size=100, rate_limit=0)
+        self.assertEqual(stats, {'sent': queued, 'failed': 0, 'batches': 1})
+        self.assertEqual(server.messages, queued)
+        self.assertEqual(server.connections, 1)
+        self.assertEqual(delivery_stats(blood_request)['notifications_sent'], queued)
+
+    def test_failed_recipient_is_retried_then_marked_failed(self):
+        blood_request = self.make_request()
+        queue_request_notifications(blood_request)
+        bad = self.donors[0].email
+        with SMTPStandIn(rejected=[bad]) as server:
+            host, port = server.server_address
+            with override_settings(EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+                                   EMAIL_HOST=host, EMAIL_PORT=port, NOTIFICATION_RETRY_BACKOFF=0):
+                first = deliver_queued(batch_size=100, rate_limit=0, max_attempts=2, max_batches=1)
+                second = deliver_queued(batch_size=100, rate_limit=0, max_attempts=2)
+        self.assertEqual(first['failed'], 1)
+        self.assertEqual(second, {'sent': 0, 'failed': 1, 'batches': 1})
+        failed = DonorNotification.objects.get(recipient=bad)
+        self.assertEqual((failed.status, failed.attempts), ('Failed', 2))
+        stats = delivery_stats(blood_request)
+        self.assertEqual(stats['notifications_failed'], 1)
+        self.assertEqual(stats['notifications_queued'], 0)
+
+
+class CompatibilityMatchingTests(TestCase):
+    def test_compatibility_table(self):
+        self.assertEqual(set(COMPATIBLE_DONOR_GROUPS['AB+']), {value for value, _ in User.BLOOD_GROUP_CHOICES})
+        self.assertEqual(COMPATIBLE_DONOR_GROUPS['O-'], ('O-',))
+        self.assertEqual(set(COMPATIBLE_DONOR_GROUPS['A+']), {'A+', 'A-', 'O+', 'O-'})
+        self.assertEqual(set(COMPATIBLE_DONOR_GROUPS['B-']), {'B-', 'O-'})
+
+    def test_one_query_exact_group_first(self):
+        for group in ['O-', 'A+', 'AB+', 'B-', 'AB-']:
+            make_user(f'Donor {group}', blood_group=group)
+        make_user('Zed AB+', blood_group='AB+')
+        make_user('Unwilling O-', blood_group='O-', willing_to_donate=False)
+        with self.assertNumQueries(1):
+            donors = list(find_compatible_donors('AB+'))
+        self.assertEqual(len(donors), 6)
+        self.assertEqual([d.name for d in donors[:2]], ['Donor AB+', 'Zed AB+'])
+        self.assertTrue(all(not d.exact_match for d in donors[2:]))
+
+
+class ProximityTests(TestCase):
+    def setUp(self):
+        make_user('Aluva Donor', taluk='Aluva')
+        make_user('Kochi Donor', taluk='Kochi')
+        make_user('Kasaragod Donor', district='Kasaragod', taluk='Kasaragod', blood_group='O-')
+        make_user('Nowhere Donor', taluk='')
+
+    def search(self, **data):
+        form = BloodSearchForm(data)
+        self.assertTrue(form.is_valid(), form.errors)
+        donors, ordering = form.search_donors(_willing())
+        return [(d.name, d.distance_km) for d in donors.order_by(*ordering)]
+
+    def test_distance_matrix_covers_every_taluk(self):
+        self.assertEqual(set(geography.TALUK_CENTROIDS), set(geography.DISTRICT_BY_TALUK))
+        self.assertEqual(geography.distance_km('Kochi', 'Kochi'), 0)
+        self.assertEqual(geography.distance_km('Kochi', 'Aluva'), geography.distance_km('Aluva', 'Kochi'))
+        self.assertGreater(geography.distance_km('Kasaragod', 'Thiruvananthapuram'), 450)
+        self.assertIsNone(geography.distance_km('Kochi', 'Atlantis'))
+        nearby = geography.taluks_within('Kanayannur', 30)
+        self.assertEqual(nearby[0], ('Kanayannur', 0))
+        self.assertEqual([km for _, km in nearby], sorted(km for _, km in nearby))
+        self.assertTrue(all(km <= 30 for _, km in nearby))
+        self.assertEqual(len(geography.taluks_within('Kanayannur')), len(geography.TALUK_CENTROIDS))
+
+    def test_search_ranks_nearest_first_within_radius(self):
+        self.assertEqual(self.search(near='Kanayannur', radius_km=30), [
+            ('Kochi Donor', geography.distance_km('Kanayannur', 'Kochi')),
+            ('Aluva Donor', geography.distance_km('Kanayannur', 'Aluva')),
+        ])
+        # No radius: everyone with a taluk, farthest last
+        self.assertEqual([name for name, _ in self.search(near='Kanayannur')],
+                         ['Kochi Donor', 'Aluva Donor', 'Kasaragod Donor'])
+        # Distance first, then the exact group
+        self.assertEqual([name for name, _ in self.search(near='Hosdurg', blood_group='O+')],
+                         ['Kasaragod Donor', 'Aluva Donor', 'Kochi Donor'])
+
+    def test_radius_needs_a_taluk(self):
+        form = BloodSearchForm({'radius_km': 20})
+        self.assertFalse(form.is_valid())
+        self.assertIn('radius_km', form.errors)
+
+    def test_donor_list_pages_by_distance(self):
+        url = reverse('donor_list')
+        response = self.client.get(url, {'near': 'Aluva', 'page_size': 1})
+        names = [d.name for d in response.context['donors']]
+        while response.context['donors'].has_next:
+            response = self.client.get(f"{url}?{response.context['donors'].next_query}")
+            names.extend(d.name for d in response.context['donors'])
+        self.assertEqual(names, ['Aluva Donor', 'Kochi Donor', 'Kasaragod Donor'])
+        self.assertContains(response, '~')
+
+    @override_settings(NOTIFICATION_RADIUS_KM=40)
+    def test_request_with_taluk_alerts_nearby_donors_nearest_first(self):
+        requester = make_user('Requester', blood_group='AB+', email='', willing_to_donate=False)
+        blood_request = BloodRequest.objects.create(
+            requester=requester, blood_group='O+', hospital_name='Taluk Hospital', taluk='Aluva',
+            required_date=date(2026, 1, 1),
+        )
+        queue_request_notifications(blood_request)
+        self.assertEqual(list(DonorNotification.objects.order_by('id').values_list('recipient', flat=True)),
+                         ['aluva.donor@example.com', 'kochi.donor@example.com'])
+
+
+class EligibilityTests(TestCase):
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.donors = {
+            'never': make_user('Never'),
+            'male 30 days': self.donor_who_gave('Male 30', 'Male', 30),
+            'male 100 days': self.donor_who_gave('Male 100', 'Male', 100),
+            'female 100 days': self.donor_who_gave('Female 100', 'Female', 100),
+            'female 130 days': self.donor_who_gave('Female 130', 'Female', 130),
+            'too old': make_user('Too Old', age=70),
+        }
+
+    def donor_who_gave(self, name, gender, days_ago):
+        donor = make_user(name, gender=gender)
+        BloodDonation.objects.create(donor=donor, donation_date=self.today - timedelta(days=days_ago),
+                                     hospital_name='H', blood_group='O+')
+        return donor
+
+    def eligible_names(self, **kwargs):
+        with self.assertNumQueries(1):
+            return set(eligibility.eligible(_willing(), **kwargs).values_list('name', flat=True))
+
+    def test_interval_per_gender_and_age_window(self):
+        self.assertEqual(self.eligible_names(), {'Never', 'Male 100', 'Female 130'})
+        # Female 100 can give again 120 days after, i.e. in 20 days
+        self.assertIn('Female 100', self.eligible_names(on=self.today + timedelta(days=20)))
+        with override_settings(DONATION_INTERVAL_DAYS={'Male': 28, 'Female': 28}, DONOR_MAX_AGE=70):
+            self.assertEqual(len(self.eligible_names()), 6)
+
+    def test_donor_list_eligible_now(self):
+        response = self.client.get(reverse('donor_list'), {'eligible_now': 'on'})
+        self.assertEqual({d.name for d in response.context['donors']}, {'Never', 'Male 100', 'Female 130'})
+
+    def test_notifications_skip_donors_not_eligible_by_the_required_date(self):
+        blood_request = BloodRequest.objects.create(
+            requester=self.donors['never'], blood_group='O+', hospital_name='H',
+            required_date=self.today + timedelta(days=20),
+        )
+        queue_request_notifications(blood_request)
+        recipients = set(DonorNotification.objects.values_list('recipient', flat=True))
+        # The requester confirmation plus Female 100, eligible again on the required date
+        self.assertEqual(recipients, {'never@example.com', 'male.100@example.com',
+                                      'female.100@example.com', 'female.130@example.com'})
+
+
+def _willing():
+    return User.objects.filter(willing_to_donate=True)
+
+
+# Hot read paths that must keep hitting an index
+HOT_QUERIES = {
+    'donor_list: blood group': lambda: find_compatible_donors('A+'),
+    'donor_list: district': lambda: _willing().filter(district='Ernakulam'),
+    'donor_list: district + taluk': lambda: _willing().filter(district='Ernakulam', taluk='Kochi'),
+    'donor_list: district + age range': lambda: _willing().filter(district='Ernakulam', age__gte=20, age__lte=40),
+    'donor_list: all filters': lambda: find_compatible_donors(
+        'B+', _willing().filter(district='Ernakulam', taluk='Kochi', age__gte=20, age__lte=40)),
+    'request_blood: donor targeting': lambda: find_compatible_donors(
+        'O+', _willing().exclude(email='')).values_list('name', 'email'),
+    'request_blood: donor targeting near the hospital': lambda: near_taluk(find_compatible_donors(
+        'O+', _willing().exclude(email='')), 'Aluva', 50).values_list('name', 'email'),
+    'donor_list: eligible now': lambda: eligibility.eligible(_willing()).values('id'),
+    'user_profile: donation history': lambda: BloodDonation.objects.filter(donor_id=1).order_by('-donation_date'),
+    'hospital: requests by status': lambda: BloodRequest.objects.filter(status='Pending').order_by('required_date'),
+    'donation_list: deep keyset page': lambda: KeysetPaginator(
+        BloodDonation.objects.all(), ('-donation_date', '-id')).queryset_for(encode_cursor(['2025-01-01', 500])),
+    'donor_list: deep keyset page': lambda: KeysetPaginator(
+        _willing(), ('name', 'id')).queryset_for(encode_cursor(['M', 500])),
+    'certificate_lookup: name search': lambda: ranked_matches('alcie', age=30),
+}
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+class QueryPlanTests(TestCase):
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_hot_queries_use_indexes(self):
+        for label, build in HOT_QUERIES.items():
+            with self.subTest(label):
+                plan = self.explain(build())
+                # A SCAN (even over an index) reads from the start; every hot path must SEARCH
+                scans = [step for step in plan if step.startswith('SCAN ')]
+                self.assertFalse(scans, f'{label} fell back to a full scan: {plan}')
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        donor = make_user('Donor')
+        # Several donations share a date so the id tie-breaker matters
+        BloodDonation.objects.bulk_create([
+            BloodDonation(donor=donor, donation_date=date(2025, 1 + i % 3, 1), hospital_name='H', blood_group='O+')
+            for i in range(23)
+        ])
+        self.expected = list(BloodDonation.objects.order_by('-donation_date', '-id').values_list('id', flat=True))
+
+    def walk(self, paginator):
+        seen, page = [], paginator.page()
+        pages = [page]
+        while True:
+            seen.extend(d.id for d in page)
+            if not page.has_next:
+                return seen, pages
+            page = paginator.page(page.next_cursor)
+            pages.append(page)
+
+    def test_forward_and_backward_walks_cover_every_row_once(self):
+        paginator = KeysetPaginator(BloodDonation.objects.all(), ('-donation_date', '-id'), page_size=5)
+        seen, pages = self.walk(paginator)
+        self.assertEqual(seen, self.expected)
+        self.assertFalse(pages[0].has_previous)
+        self.assertEqual(len(pages), 5)
+
+        back = paginator.page(pages[-1].previous_cursor)
+        self.assertEqual([d.id for d in back], [d.id for d in pages[-2]])
+        first = paginator.page(pages[1].previous_cursor)
+        self.assertEqual([d.id for d in first], [d.id for d in pages[0]])
+        self.assertFalse(first.has_previous)
+
+    def test_every_page_is_one_query_without_offset(self):
+        paginator = KeysetPaginator(BloodDonation.objects.all(), ('-donation_date', '-id'), page_size=5)
+        cursor = paginator.page().next_cursor
+        with self.assertNumQueries(1) as ctx:
+            paginator.page(cursor)
+        self.assertNotIn('OFFSET', ctx.captured_queries[0]['sql'])
+
+    def test_view_keeps_filters_and_ignores_bad_cursor(self):
+        response = self.client.get(reverse('donation_list'), {'page_size': 10, 'cursor': 'not-a-cursor'})
+        page = response.context['donations']
+        self.assertEqual([d.id for d in page], self.expected[:10])
+        self.assertIn('page_size=10', page.next_query)
+
+
+class StatisticsRollupTests(TestCase):
+    def setUp(self):
+        self.staff = StaffUser.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(self.staff)
+        self.donor = make_user('Donor', blood_group='A+', district='Kollam')
+
+    def record(self, donation_date, units):
+        return self.client.post(reverse('record_donation'), {
+            'donor': self.donor.id,
+            'donation_date': donation_date,
+            'hospital_name': 'District Hospital',
+            'blood_group': 'A+',
+            'units_donated': units,
+        })
+
+    def snapshot(self):
+        return list(DonationRollup.objects.order_by('date').values_list('date', 'blood_group', 'district', 'donations', 'units'))
+
+    def test_record_donation_updates_rollups_like_a_rebuild(self):
+        self.record('2024-03-05', 2)
+        self.record('2024-03-05', 1)
+        self.record('2025-07-01', 3)
+        incremental = self.snapshot()
+        self.assertEqual(incremental, [
+            (date(2024, 3, 5), 'A+', 'Kollam', 2, 3),
+            (date(2025, 7, 1), 'A+', 'Kollam', 1, 3),
+        ])
+        rollups.rebuild()
+        self.assertEqual(self.snapshot(), incremental)
+
+    def totals(self):
+        return (
+            sorted(DonationRollup.objects.filter(donations__gt=0)
+                   .values_list('date', 'blood_group', 'district', 'donations', 'units')),
+            sorted(DonorRollup.objects.filter(donors__gt=0).values_list('blood_group', 'district', 'donors')),
+        )
+
+    def assertMatchesRebuild(self):
+        incremental = self.totals()
+        rollups.rebuild()
+        self.assertEqual(self.totals(), incremental)
+
+    def test_rollups_follow_edits_bulk_writes_and_deletes(self):
+        other = make_user('Other', blood_group='B+', district='Idukki')
+        donation = BloodDonation.objects.create(
+            donor=self.donor, donation_date=date(2024, 3, 5), hospital_name='H', blood_group='A+', units_donated=2)
+        self.assertMatchesRebuild()
+
+        # Edits and deletes as the admin makes them
+        donation = BloodDonation.objects.get(pk=donation.pk)
+        donation.donation_date, donation.units_donated = date(2024, 4, 1), 3
+        donation.save()
+        self.assertMatchesRebuild()
+        donation.donor = other
+        donation.save()
+        self.assertMatchesRebuild()
+
+        BloodDonation.objects.bulk_create([
+            BloodDonation(donor=other, donation_date=date(2024, 4, d), hospital_name='H', blood_group='A+')
+            for d in (1, 2)
+        ])
+        self.assertMatchesRebuild()
+        BloodDonation.objects.filter(donor=other).update(blood_group='B+')
+        self.assertMatchesRebuild()
+
+        other = User.objects.get(pk=other.pk)
+        other.district, other.willing_to_donate = 'Kollam', False
+        other.save()
+        self.assertMatchesRebuild()
+        self.assertEqual(self.totals()[1], [('A+', 'Kollam', 1)])
+
+        BloodDonation.objects.filter(donation_date=date(2024, 4, 2)).delete()
+        self.assertMatchesRebuild()
+        User.objects.get(pk=other.pk).delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(self.totals(), ([], [('A+', 'Kollam', 1)]))
+
+    def test_admin_willing_to_donate_actions_move_donor_counts(self):
+        other = make_user('Other', blood_group='B+', district='Idukki')
+        BloodDonation.objects.create(donor=other, donation_date=date(2024, 3, 5), hospital_name='H', blood_group='B+')
+        self.client.force_login(StaffUser.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        url = reverse('admin:blood_app_user_changelist')
+        selected = {'_selected_action': [self.donor.pk, other.pk], 'index': 0}
+
+        self.client.post(url, {'action': 'make_not_willing_to_donate', **selected})
+        self.assertEqual(rollups.donors_by_blood_group(), [])
+        self.assertMatchesRebuild()
+        self.client.post(url, {'action': 'make_willing_to_donate', **selected})
+        self.assertEqual(rollups.donors_by_blood_group(), [
+            {'blood_group': 'A+', 'count': 1}, {'blood_group': 'B+', 'count': 1},
+        ])
+        self.assertMatchesRebuild()
+
+        User.objects.filter(pk=other.pk).update(district='Kollam')
+        self.assertMatchesRebuild()
+        self.assertEqual(self.totals()[0], [(date(2024, 3, 5), 'B+', 'Kollam', 1, 1)])
+
+    def test_statistics_reads_selected_year(self):
+        self.record('2024-03-05', 2)
+        self.record('2025-07-01', 3)
+        response = self.client.get(reverse('statistics'), {'year': 2024})
+        self.assertEqual(response.context['years'], [2025, 2024])
+        counts = [m['count'] for m in response.context['monthly_donations']]
+        self.assertEqual(counts[2], 1)
+        self.assertEqual(sum(counts), 1)
+        self.assertEqual(response.context['donation_stats'], [{'blood_group': 'A+', 'total_donations': 1, 'total_units': 2}])
+        self.assertEqual(response.context['total_donations'], 2)
+
+
+class DonationCounterTests(TestCase):
+    def setUp(self):
+        self.alice = make_user('Alice')
+        self.bob = make_user('Bob')
+
+    def donate(self, donor, day, units=1):
+        return BloodDonation.objects.create(
+            donor=donor, donation_date=date(2025, 1, day), hospital_name='H', blood_group='O+', units_donated=units)
+
+    def counters(self, user):
+        user.refresh_from_db()
+        return user.donation_count, user.total_units, user.last_donation_date
+
+    def test_create_edit_reassign_and_delete(self):
+        first = self.donate(self.alice, 1, units=2)
+        self.donate(self.alice, 5)
+        self.assertEqual(self.counters(self.alice), (2, 3, date(2025, 1, 5)))
+
+        donation = BloodDonation.objects.get(pk=first.pk)
+        donation.donor = self.bob
+        donation.save()
+        self.assertEqual(self.counters(self.alice), (1, 1, date(2025, 1, 5)))
+        self.assertEqual(self.counters(self.bob), (1, 2, date(2025, 1, 1)))
+
+        donation.delete()
+        self.assertEqual(self.counters(self.bob), (0, 0, None))
+
+    def test_bulk_paths(self):
+        BloodDonation.objects.bulk_create([
+            BloodDonation(donor=self.alice, donation_date=date(2025, 1, d), hospital_name='H', blood_group='O+')
+            for d in (1, 2, 3)
+        ])
+        self.assertEqual(self.counters(self.alice), (3, 3, date(2025, 1, 3)))
+
+        BloodDonation.objects.filter(donation_date=date(2025, 1, 3)).update(donor=self.bob, units_donated=4)
+        self.assertEqual(self.counters(self.alice), (2, 2, date(2025, 1, 2)))
+        self.assertEqual(self.counters(self.bob), (1, 4, date(2025, 1, 3)))
+
+        with self.assertNumQueries(6):
+            # rollup totals, collect, detach ledger rows, delete, then one counter refresh for
+            # every affected donor and one rollup update
+            BloodDonation.objects.filter(donor=self.alice).delete()
+        self.assertEqual(self.counters(self.alice), (0, 0, None))
+
+    def test_bulk_update_reassignment(self):
+        carol = make_user('Carol')
+        first, second = self.donate(self.alice, 1, units=2), self.donate(self.bob, 2)
+        first.donor, second.donor = carol, carol
+        BloodDonation.objects.bulk_update([first, second], ['donor'])
+        self.assertEqual(self.counters(self.alice), (0, 0, None))
+        self.assertEqual(self.counters(self.bob), (0, 0, None))
+        self.assertEqual(self.counters(carol), (2, 3, date(2025, 1, 2)))
+
+    def test_reconcile_fixes_drift(self):
+        self.donate(self.alice, 7, units=2)
+        User.objects.filter(pk=self.alice.pk).update(donation_count=9, last_donation_date=None)
+        User.objects.filter(pk=self.bob.pk).update(total_units=3)
+        self.assertEqual(reconcile_donation_counters(), 2)
+        self.assertEqual(self.counters(self.alice), (1, 2, date(2025, 1, 7)))
+        self.assertEqual(self.counters(self.bob), (0, 0, None))
+        self.assertEqual(reconcile_donation_counters(), 0)
+
+    def test_admin_changelist_query_count_is_constant(self):
+        admin = StaffUser.objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin)
+        url = reverse('admin:blood_app_user_changelist')
+        self.donate(self.alice, 1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        for i in range(20):
+            self.donate(make_user(f'Extra {i}'), 2)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(url)
+        self.assertEqual(len(small), len(large))
+
+
+class InventoryLedgerTests(TestCase):
+    def balance(self, blood_group='O+'):
+        return BloodInventory.objects.get(blood_group=blood_group).available_units
+
+    def ledger(self, blood_group='O+'):
+        return sum(InventoryTransaction.objects.filter(blood_group=blood_group).values_list('units', flat=True))
+
+    def test_movements_keep_balance_equal_to_ledger(self):
+        apply_transaction('O+', 'Donation', 5)
+        remove_units('O+', 'Issue', 2, note='Ward 3')
+        self.assertEqual(set_available_units('O+', 10), 7)
+        remove_units('O+', 'Expiry', 1)
+        self.assertEqual(self.balance(), 9)
+        self.assertEqual(self.ledger(), 9)
+        self.assertEqual(
+            list(InventoryTransaction.objects.values_list('kind', flat=True)),
+            ['Expiry', 'Adjustment', 'Issue', 'Donation'],
+        )
+
+    def test_overdraw_is_rejected_without_a_ledger_row(self):
+        apply_transaction('A-', 'Donation', 1)
+        with self.assertRaises(InsufficientInventory):
+            remove_units('A-', 'Issue', 2)
+        self.assertEqual(self.balance('A-'), 1)
+        self.assertEqual(InventoryTransaction.objects.filter(blood_group='A-').count(), 1)
+
+    def test_recorded_donation_is_added_to_stock(self):
+        staff = StaffUser.objects.create_user('staff', password='pw')
+        self.client.force_login(staff)
+        donor = make_user('Alice', blood_group='B+')
+        self.client.post(reverse('record_donation'), {
+            'donor': donor.id, 'donation_date': '2025-01-01', 'hospital_name': 'H', 'blood_group': 'B+', 'units_donated': 2,
+        })
+        txn = InventoryTransaction.objects.get()
+        self.assertEqual((txn.kind, txn.units, txn.donation.donor_id), ('Donation', 2, donor.id))
+        self.assertEqual(self.balance('B+'), 2)
+
+        self.client.post(reverse('blood_inventory'), {
+            'action': 'movement', 'blood_group': 'B+', 'kind': 'Issue', 'units': 3, 'note': '',
+        })
+        self.assertEqual(self.balance('B+'), 2)
+        self.client.post(reverse('blood_inventory'), {'blood_group': 'B+', 'available_units': 6, 'critical_level': 4})
+        inventory = BloodInventory.objects.get(blood_group='B+')
+        self.assertEqual((inventory.available_units, inventory.critical_level), (6, 4))
+        self.assertEqual(self.ledger('B+'), 6)
+
+    def test_reconcile_restores_ledger_balance(self):
+        apply_transaction('O+', 'Donation', 4)
+        apply_transaction('AB-', 'Donation', 1)
+        BloodInventory.objects.filter(blood_group='O+').update(available_units=40)
+        BloodInventory.objects.filter(blood_group='AB-').delete()
+        self.assertEqual(reconcile_balances(), {'O+': (40, 4), 'AB-': (None, 1)})
+        self.assertEqual((self.balance(), self.balance('AB-')), (4, 1))
+        self.assertEqual(reconcile_balances(), {})
+
+    def test_admin_stock_count_goes_through_the_ledger(self):
+        apply_transaction('O+', 'Donation', 4)
+        inventory = BloodInventory.objects.get(blood_group='O+')
+        self.client.force_login(StaffUser.objects.create_superuser('admin', 'admin@example.com', 'pw'))
+        url = reverse('admin:blood_app_bloodinventory_change', args=[inventory.pk])
+        form = self.client.get(url).context['adminform'].form
+        self.assertNotIn('available_units', form.fields)
+
+        response = self.client.post(url, {'critical_level': 3, 'counted_units': 7, 'available_units': 500})
+        self.assertEqual(response.status_code, 302)
+        adjustment = InventoryTransaction.objects.get(kind='Adjustment')
+        self.assertEqual((adjustment.units, adjustment.note), (3, 'Admin stock count by admin'))
+        inventory.refresh_from_db()
+        self.assertEqual((inventory.available_units, inventory.critical_level), (7, 3))
+
+        self.client.post(reverse('admin:blood_app_bloodinventory_add'),
+                         {'blood_group': 'A-', 'critical_level': 5, 'counted_units': 2})
+        self.assertEqual(BloodInventory.objects.get(blood_group='A-').available_units, 2)
+        self.assertEqual(reconcile_balances(), {})
+
+
+class DashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.donor = make_user('Alice')
+
+    def test_warm_hit_runs_no_queries(self):
+        self.client.get(reverse('home'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(response.context['total_donors'], 1)
+
+    def test_writes_invalidate_after_commit(self):
+        self.assertEqual(dashboard.get_dashboard()['total_requests'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            BloodRequest.objects.create(
+                requester=self.donor, blood_group='O+', hospital_name='H', required_date=date(2025, 1, 1))
+        self.assertEqual(dashboard.get_dashboard()['total_requests'], 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            apply_transaction('O+', 'Donation', 3)
+        self.assertEqual([inv.available_units for inv in dashboard.get_dashboard()['inventory']], [3])
+
+        # The admin's bulk actions update users without post_save
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.filter(pk=self.donor.pk).update(willing_to_donate=False)
+        self.assertEqual(dashboard.get_dashboard()['total_donors'], 0)
+
+    def test_concurrent_rebuild_serves_previous_copy(self):
+        dashboard.get_dashboard()
+        with self.captureOnCommitCallbacks(execute=True):
+            make_user('Bob')
+        # Another request is already rebuilding the entry
+        self.assertTrue(cache.add(dashboard.LOCK_KEY, 1, 10))
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard.get_dashboard()['total_donors'], 1)
+        cache.delete(dashboard.LOCK_KEY)
+        self.assertEqual(dashboard.get_dashboard()['total_donors'], 2)
+
+
+class GeographyTests(TestCase):
+    def test_registry_backs_model_choices(self):
+        self.assertEqual(len(User.DISTRICT_CHOICES), 14)
+        self.assertEqual(set(geography.DISTRICT_BY_TALUK), {value for value, _ in User.TALUK_CHOICES})
+        self.assertEqual(User.get_taluks_by_district('Wayanad'), ['Mananthavady', 'Vythiri', 'Sulthan Bathery'])
+        self.assertEqual(User.get_taluks_by_district('Atlantis'), [])
+
+    def test_search_form_checks_taluk_belongs_to_district(self):
+        self.assertTrue(BloodSearchForm({'district': 'Ernakulam', 'taluk': 'Kochi'}).is_valid())
+        self.assertTrue(BloodSearchForm({'taluk': 'Kochi'}).is_valid())
+        form = BloodSearchForm({'district': 'Kollam', 'taluk': 'Kochi'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('taluk', form.errors)
+
+    def test_taluk_endpoint_is_cacheable(self):
+        url = reverse('get_taluks')
+        response = self.client.get(url, {'district': 'Kasaragod'})
+        self.assertEqual(response.json(), {'taluks': ['Kasaragod', 'Hosdurg']})
+        self.assertIn('max-age=86400', response['Cache-Control'])
+        etag = response['ETag']
+        self.assertFalse(etag.startswith('W/'))
+
+        with self.assertNumQueries(0):
+            revalidated = self.client.get(url, {'district': 'Kasaragod'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(revalidated.status_code, 304)
+        self.assertIn('max-age=86400', revalidated['Cache-Control'])
+
+
+class NameSearchTests(TestCase):
+    def setUp(self):
+        for name in ('Alice Thomas', 'Alicia Mathew', 'Alan Joseph', 'Bob Varghese'):
+            make_user(name, age=30)
+
+    def names(self, query, **filters):
+        return [user.name for user in search_names(query, **filters)]
+
+    def test_prefix_and_typo_matches_are_ranked(self):
+        self.assertEqual(self.names('alice')[:2], ['Alice Thomas', 'Alicia Mathew'])
+        self.assertEqual(self.names('ali')[:2], ['Alice Thomas', 'Alicia Mathew'])
+        self.assertEqual(self.names('alcie thomas')[0], 'Alice Thomas')
+        self.assertNotIn('Bob Varghese', self.names('alice'))
+        self.assertEqual(self.names('zzz'), [])
+
+    def test_index_follows_renames_and_deletes(self):
+        bob = User.objects.get(name='Bob Varghese')
+        bob.name = 'Robert Varghese'
+        bob.save()
+        self.assertEqual(self.names('robert'), ['Robert Varghese'])
+        self.assertEqual(self.names('bob'), [])
+        with self.assertNumQueries(1):
+            # Saves that keep the name leave the index alone
+            bob.save()
+        bob.delete()
+        self.assertEqual(self.names('robert'), [])
+
+    def test_rebuild_matches_incremental_index(self):
+        before = set(NameTrigram.objects.values_list('user_id', 'trigram'))
+        self.assertEqual(rebuild_index(), 4)
+        self.assertEqual(set(NameTrigram.objects.values_list('user_id', 'trigram')), before)
+        self.assertEqual(name_trigrams('Al'), {' al', 'al '})
+
+    @override_settings(NAME_SEARCH_MAX_CANDIDATES=3)
+    def test_candidates_come_from_rarest_trigrams(self):
+        for i in range(5):
+            make_user(f'Alan Kurian {i}', age=30)
+        # " al" and "ala" have more postings than the budget; "tho" and "oma" do not
+        self.assertEqual(self.names('alan thomas')[0], 'Alice Thomas')
+        self.assertEqual(self.names('thomas'), ['Alice Thomas'])
+        # Every trigram over budget: still answers, from the first postings only
+        self.assertLessEqual(len(self.names('alan kurian')), 3)
+
+    def test_lookup_queries(self):
+        make_user('Zara Khan', age=41)
+        with self.assertNumQueries(3):
+            # trigram counts, ranking, then the matched rows
+            response = self.client.post(reverse('certificate_lookup'), {'name': 'zara', 'age': '41'})
+        # A single match goes straight to the profile
+        self.assertEqual(response.status_code, 302)
+        response = self.client.post(reverse('certificate_lookup'), {'name': 'ali', 'age': '30'})
+        self.assertEqual([u.name for u in response.context['results']][:2], ['Alice Thomas', 'Alicia Mathew'])
+
+
+class CertificateCacheTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        settings_override = override_settings(CERTIFICATE_CACHE_DIR=self.cache_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.donor = make_user('Alice (Ann) Thomas')
+        self.donation = BloodDonation.objects.create(
+            donor=self.donor, donation_date=date(2025, 3, 1), hospital_name='General', blood_group='O+')
+        self.url = reverse('donation_certificate', args=[self.donation.id])
+
+    def cached_files(self):
+        return sorted(path.name for path in Path(self.cache_dir).iterdir())
+
+    def test_rendered_once_and_revalidated(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn(b'Alice (Ann) Thomas', b''.join(first.streaming_content))
+        files = self.cached_files()
+        self.assertEqual(len(files), 1)
+
+        with self.assertTemplateNotUsed('blood_app/blood_donation_certificate.html'):
+            again = self.client.get(self.url)
+        self.assertEqual(again['ETag'], first['ETag'])
+        not_modified = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+
+        self.donation.hospital_name = 'City Hospital'
+        self.donation.save()
+        changed = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn(b'City Hospital', b''.join(changed.streaming_content))
+        self.assertNotEqual(self.cached_files(), files)
+        self.assertEqual(len(self.cached_files()), 1)
+
+    def test_new_donation_changes_key(self):
+        etag = self.client.get(self.url)['ETag']
+        BloodDonation.objects.create(
+            donor=self.donor, donation_date=date(2025, 6, 1), hospital_name='General', blood_group='O+')
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_pdf(self):
+        response = self.client.get(reverse('donation_certificate_pdf', args=[self.donation.id]))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        body = b''.join(response.streaming_content)
+        self.assertTrue(body.startswith(b'%PDF-1.4'))
+        self.assertTrue(body.rstrip().endswith(b'%%EOF'))
+        self.assertIn(b'(Alice \\(Ann\\) Thomas)', body)
+
+        donor_pdf = self.client.get(reverse('donor_certificate_pdf', args=[self.donor.id]))
+        self.assertTrue(b''.join(donor_pdf.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(self.client.get(reverse('donor_certificate', args=[self.donor.id])).status_code, 200)
+
+    def test_concurrent_builds_in_one_process(self):
+        both_written = threading.Barrier(2, timeout=5)
+        replace = os.replace
+        errors = []
+
+        def replace_together(src, dst):
+            # Both threads have written their temporary file before either renames it
+            both_written.wait()
+            replace(src, dst)
+
+        def request():
+            try:
+                certificates._materialise('donation-1', 'k', '.html', lambda: b'certificate')
+            except Exception as e:
+                errors.append(e)
+
+        with mock.patch('blood_app.certificates.os.replace', side_effect=replace_together):
+            threads = [threading.Thread(target=request) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(self.cached_files(), ['donation-1-k.html'])
+
+        with mock.patch('blood_app.certificates.os.replace', side_effect=OSError('disk full')):
+            with self.assertRaises(OSError):
+                certificates._materialise('donation-2', 'k', '.html', lambda: b'certificate')
+        # No temporary file left behind
+        self.assertEqual(self.cached_files(), ['donation-1-k.html'])
+
+
+class BulkCertificateTests(TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        settings_override = override_settings(CERTIFICATE_CACHE_DIR=self.cache_dir, CERTIFICATE_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        donor = make_user('Camp Donor')
+        for day, hospital in ((1, 'General'), (2, 'General'), (3, 'Mission'), (20, 'General')):
+            BloodDonation.objects.create(
+                donor=donor, donation_date=date(2025, 5, day), hospital_name=hospital, blood_group='O+')
+
+    def test_staff_endpoint_streams_a_zip(self):
+        url = reverse('bulk_donation_certificates')
+        self.client.force_login(StaffUser.objects.create_user('nurse', password='pw'))
+        self.assertEqual(self.client.get(url, {'hospital': 'General'}).status_code, 302)
+
+        self.client.force_login(StaffUser.objects.create_user('staff', password='pw', is_staff=True))
+        response = self.client.get(url, {'date_from': '2025-05-01', 'date_to': '2025-05-10', 'hospital': 'general'})
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(len(archive.namelist()), 2)
+        self.assertIsNone(archive.testzip())
+        self.assertTrue(all(archive.read(name).startswith(b'%PDF') for name in archive.namelist()))
+        # Rendered certificates land in the per-donation cache
+        self.assertEqual(len(list(Path(self.cache_dir).glob('donation-*.pdf'))), 2)
+
+    def test_command_uses_a_process_pool(self):
+        output = Path(self.cache_dir) / 'camp.zip'
+        call_command('bulk_certificates', str(output), '--from', '2025-05-01', '--workers', '2', stdout=StringIO(), stderr=StringIO())
+        with zipfile.ZipFile(output) as archive:
+            self.assertEqual(len(archive.namelist()), 4)
+            self.assertIsNone(archive.testzip())
+
+
+def jpeg_upload(width=1200, height=800, orientation=None):
+    image = Image.new('RGB', (width, height), 'red')
+    exif = Image.Exif()
+    exif[0x010F] = 'PhoneMaker'
+    if orientation:
+        exif[0x0112] = orientation
+    output = BytesIO()
+    image.save(output, 'JPEG', exif=exif, quality=95)
+    return SimpleUploadedFile('selfie.jpg', output.getvalue(), content_type='image/jpeg')
+
+
+class PhotoThumbnailTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def open_derivative(self, user, size, ext):
+        return Image.open(Path(self.media) / thumbnails.derivative_name(user.photo.name, size, ext))
+
+    def test_upload_makes_oriented_stripped_thumbnails(self):
+        # Orientation 6: the camera was rotated, so the stored landscape image displays as portrait
+        user = make_user('Photo Donor', photo=jpeg_upload(1200, 800, orientation=6))
+        user.refresh_from_db()
+        self.assertTrue(user.photo_thumbnails)
+        for size in thumbnails.SIZES:
+            for ext in thumbnails.FORMATS:
+                image = self.open_derivative(user, size, ext)
+                self.assertEqual(image.size, (size, size))
+                self.assertFalse(image.getexif())
+        original = (Path(self.media) / user.photo.name).stat().st_size
+        small = (Path(self.media) / thumbnails.derivative_name(user.photo.name, 48, 'webp')).stat().st_size
+        self.assertLess(small * 10, original)
+
+    def test_replacing_photo_replaces_thumbnails(self):
+        user = make_user('Photo Donor', photo=jpeg_upload())
+        old = thumbnails.derivative_name(user.photo.name, 48, 'jpg')
+        user = User.objects.get(pk=user.pk)
+        user.photo = jpeg_upload(300, 300)
+        user.save()
+        self.assertFalse((Path(self.media) / old).exists())
+        self.assertTrue((Path(self.media) / thumbnails.derivative_name(user.photo.name, 48, 'jpg')).exists())
+
+    def test_tag_uses_srcset_and_falls_back_to_original(self):
+        user = make_user('Photo Donor', photo=jpeg_upload())
+        template = Template('{% load photos %}{% donor_photo user 48 %}')
+        html = template.render(Context({'user': user}))
+        self.assertIn('type="image/webp"', html)
+        self.assertIn('-48.webp 1x', html)
+        self.assertIn('-100.jpg 2x', html)
+
+        User.objects.filter(pk=user.pk).update(photo_thumbnails=False)
+        html = template.render(Context({'user': User.objects.get(pk=user.pk)}))
+        self.assertNotIn('srcset', html)
+        self.assertIn(user.photo.url, html)
+
+    def test_backfill_command(self):
+        user = make_user('Photo Donor', photo=jpeg_upload())
+        shutil.rmtree(Path(self.media) / 'thumbs')
+        User.objects.filter(pk=user.pk).update(photo_thumbnails=False)
+        call_command('make_thumbnails', stdout=StringIO())
+        self.assertTrue(User.objects.get(pk=user.pk).photo_thumbnails)
+        self.assertTrue(self.open_derivative(user, 150, 'webp'))
+
+    def test_identical_uploads_share_one_file(self):
+        upload = jpeg_upload()
+        digest = content_hash(upload)
+        first = make_user('First Donor', photo=upload)
+        second = make_user('Second Donor', email='second@example.com', photo=jpeg_upload())
+        self.assertEqual(first.photo.name, f'photos/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(second.photo.name, first.photo.name)
+        self.assertEqual(len(list((Path(self.media) / 'photos').rglob('*.jpg'))), 1)
+
+        # Derivatives stay while another donor still uses the photo
+        first.delete()
+        self.assertTrue(self.open_derivative(second, 48, 'webp'))
+        second.delete()
+        self.assertFalse((Path(self.media) / thumbnails.derivative_name(second.photo.name, 48, 'webp')).exists())
+
+    def test_dedupe_command_rewrites_references(self):
+        legacy = FileSystemStorage(location=self.media)
+        data = jpeg_upload().read()
+        legacy.save('photos/selfie.jpeg', ContentFile(data))
+        legacy.save('photos/selfie_vlG4SWy.jpeg', ContentFile(data))
+        first = make_user('First Donor')
+        second = make_user('Second Donor', email='second@example.com')
+        User.objects.filter(pk=first.pk).update(photo='photos/selfie.jpeg')
+        User.objects.filter(pk=second.pk).update(photo='photos/selfie_vlG4SWy.jpeg')
+        stamp = User.objects.get(pk=first.pk).updated_at
+
+        call_command('dedupe_photos', stdout=StringIO())
+
+        first, second = User.objects.get(pk=first.pk), User.objects.get(pk=second.pk)
+        digest = content_hash(ContentFile(data))
+        self.assertEqual(first.photo.name, f'photos/{digest[:2]}/{digest}.jpeg')
+        self.assertEqual(second.photo.name, first.photo.name)
+        self.assertTrue(first.photo_thumbnails)
+        self.assertGreater(first.updated_at, stamp)
+        self.assertEqual([p.name for p in (Path(self.media) / 'photos').rglob('*.jpeg')], [f'{digest}.jpeg'])
+
+
+class BulkImportTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def write(self, name, text):
+        path = Path(self.directory) / name
+        path.write_text(text)
+        return str(path)
+
+    def rejects(self, path):
+        return [json.loads(line) for line in Path(f'{path}.rejects.ndjson').read_text().splitlines()]
+
+    def test_import_donors_from_csv(self):
+        make_user('Existing', email='taken@example.com')
+        path = self.write('donors.csv', (
+            'name,age,gender,email,phone,city,district,taluk,blood_group,willing_to_donate\n'
+            'Lakshmi Menon,34,Female,lakshmi@example.com,9847000001,Aluva,Ernakulam,Aluva,B+,True\n'
+            'Joseph Thomas,41,Male,joseph@example.com,9847000002,Kochi,Ernakulam,Kochi,B+,False\n'
+            'Wrong Taluk,30,Male,wrong@example.com,9847000003,Kochi,Ernakulam,Thalassery,O+,True\n'
+            'Bad Age,abc,Male,badage@example.com,9847000004,Kochi,Ernakulam,Kochi,O+,True\n'
+            'Taken,30,Male,taken@example.com,9847000005,Kochi,Ernakulam,Kochi,O+,True\n'
+            'Twice,30,Male,lakshmi@example.com,9847000006,Kochi,Ernakulam,Kochi,O+,True\n'
+        ))
+        call_command('import_donors', path, stdout=StringIO())
+
+        lakshmi = User.objects.get(email='lakshmi@example.com')
+        self.assertEqual((lakshmi.name, lakshmi.age, lakshmi.taluk), ('Lakshmi Menon', 34, 'Aluva'))
+        self.assertFalse(User.objects.get(email='joseph@example.com').willing_to_donate)
+        self.assertEqual(User.objects.count(), 3)
+        rejected = {r['line']: set(r['errors']) for r in self.rejects(path)}
+        self.assertEqual(rejected, {4: {'taluk'}, 5: {'age'}, 6: {'email'}, 7: {'email'}})
+        # Aggregate side effects: name index and donor rollups
+        self.assertEqual([u.pk for u in search_names('lakshmi menon')], [lakshmi.pk])
+        self.assertEqual(DonorRollup.objects.get(blood_group='B+', district='Ernakulam').donors, 1)
+
+    def test_constraint_failure_rejects_only_the_offending_rows(self):
+        # As if late@example.com registered after the chunk's email check
+        make_user('Late', email='late@example.com')
+        fields = dict(age=30, gender='Male', phone='9847000001', city='Kochi', district='Ernakulam',
+                      taluk='Kochi', blood_group='O+', willing_to_donate=True)
+        items = [
+            (2, {}, dict(fields, name='Early One', email='one@example.com')),
+            (3, {'email': 'late@example.com'}, dict(fields, name='Late Again', email='late@example.com')),
+            (4, {}, dict(fields, name='Early Two', email='two@example.com')),
+        ]
+        rejects = importer.RejectWriter(str(Path(self.directory) / 'donors.rejects.ndjson'))
+        try:
+            self.assertEqual(importer._save_chunk(importer._insert_donors, items, rejects), 2)
+        finally:
+            rejects.close()
+        self.assertEqual([r['line'] for r in self.rejects(str(Path(self.directory) / 'donors'))], [3])
+        self.assertEqual(User.objects.filter(name__startswith='Early').count(), 2)
+        self.assertEqual(NameTrigram.objects.filter(trigram='ear').count(), 2)
+        self.assertEqual(DonorRollup.objects.get(blood_group='O+', district='Ernakulam').donors, 3)
+
+    def test_import_donations_from_ndjson(self):
+        alice = make_user('Alice', blood_group='A+', district='Kottayam', taluk='Kottayam', email='alice@example.com')
+        bob = make_user('Bob', blood_group='O-', email='bob@example.com')
+        rows = [
+            {'donor_email': 'alice@example.com', 'donation_date': '2024-01-05', 'hospital_name': 'MCH',
+             'blood_group': 'A+', 'units_donated': 2},
+            {'donor_email': 'alice@example.com', 'donation_date': '2024-03-05', 'hospital_name': 'MCH',
+             'blood_group': 'A+', 'units_donated': 1},
+            {'donor': bob.pk, 'donation_date': '2024-03-05', 'hospital_name': 'GH', 'blood_group': 'O-',
+             'units_donated': 1},
+            {'donor_email': 'nobody@example.com', 'donation_date': '2024-03-05', 'hospital_name': 'GH',
+             'blood_group': 'O-', 'units_donated': 1},
+            {'donor': bob.pk, 'donation_date': '2024-03-05', 'hospital_name': 'GH', 'blood_group': 'O-'},
+        ]
+        path = self.write('donations.ndjson', '\n'.join(json.dumps(row) for row in rows) + '\n{not json\n')
+        call_command('import_donations', path, '--chunk-size', '2', stdout=StringIO())
+
+        alice.refresh_from_db()
+        self.assertEqual((alice.donation_count, alice.total_units, alice.last_donation_date), (2, 3, date(2024, 3, 5)))
+        self.assertEqual(User.objects.get(pk=bob.pk).donation_count, 1)
+        self.assertEqual([r['line'] for r in self.rejects(path)], [4, 5, 6])
+        self.assertEqual(BloodInventory.objects.get(blood_group='A+').available_units, 3)
+        # One ledger entry per blood group and chunk
+        self.assertEqual(list(InventoryTransaction.objects.filter(blood_group='A+').values_list('units', 'note')),
+                         [(3, 'Imported 2 donation(s)')])
+        self.assertEqual(
+            DonationRollup.objects.get(date=date(2024, 3, 5), blood_group='A+', district='Kottayam').units, 1)
+
+    def test_historic_import_leaves_stock_alone(self):
+        make_user('Alice', email='alice@example.com')
+        path = self.write('donations.csv', (
+            'donor_email,donation_date,hospital_name,blood_group,units_donated\n'
+            'alice@example.com,2019-06-01,GH,O+,1\n'
+        ))
+        call_command('import_donations', path, '--no-stock', stdout=StringIO())
+        self.assertEqual(BloodDonation.objects.count(), 1)
+        self.assertFalse(InventoryTransaction.objects.exists())
+        self.assertFalse(Path(f'{path}.rejects.ndjson').exists())
+
+    def test_rollup_bulk_add_increments_existing_rows(self):
+        rollups.add_donations({(date(2024, 1, 1), 'O+', 'Ernakulam'): (1, 2)})
+        rollups.add_donations({(date(2024, 1, 1), 'O+', 'Ernakulam'): (2, 3), (date(2024, 1, 2), 'O+', ''): (1, 1)})
+        row = DonationRollup.objects.get(date=date(2024, 1, 1), blood_group='O+', district='Ernakulam')
+        self.assertEqual((row.donations, row.units), (3, 5))
+        self.assertEqual(DonationRollup.objects.count(), 2)
+
+
+class BulkWriteTests(TestCase):
+    def rows(self, prefix, count):
+        return [
+            {'name': f'{prefix} {i}', 'age': 30, 'gender': 'Male', 'email': f'{prefix}{i}@example.com',
+             'phone': '9847000001', 'city': 'Kochi', 'district': 'Ernakulam', 'blood_group': 'O+'}
+            for i in range(count)
+        ]
+
+    def test_multi_row_path_writes_what_executemany_writes(self):
+        # The multi-row INSERTs other databases get, run here by claiming another vendor
+        with mock.patch.object(connection, 'vendor', 'postgresql'), mock.patch('blood_app.bulk.MULTI_ROW_BATCH', 2):
+            insert_rows(User, self.rows('multi', 5))
+        insert_rows(User, self.rows('many', 5))
+        columns = ('name', 'age', 'district', 'taluk', 'willing_to_donate', 'donation_count')
+        multi = list(User.objects.filter(email__startswith='multi').order_by('email').values_list(*columns))
+        many = list(User.objects.filter(email__startswith='many').order_by('email').values_list(*columns))
+        self.assertEqual(len(multi), 5)
+        self.assertEqual([row[1:] for row in multi], [row[1:] for row in many])
+        self.assertTrue(all(user.updated_at for user in User.objects.all()))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.staff = StaffUser.objects.create_user('staff', password='pw', is_staff=True)
+        self.client.force_login(self.staff)
+        self.exact = make_user('Exact Match', blood_group='A-', email='exact@example.com')
+        self.universal = make_user('Universal', blood_group='O-', email='universal@example.com')
+        make_user('Incompatible', blood_group='B+', email='incompatible@example.com')
+        make_user('Elsewhere', blood_group='A-', district='Kannur', taluk='Kannur', email='elsewhere@example.com')
+
+    def get(self, dataset, fmt, **params):
+        return self.client.get(reverse('export_data', args=[dataset, fmt]), params)
+
+    def test_donor_csv_uses_search_filters_and_ordering(self):
+        response = self.get('donors', 'csv', blood_group='A-', district='Ernakulam')
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment; filename="donors-', response['Content-Disposition'])
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'name', 'blood_group'])
+        self.assertEqual([row[1] for row in rows[1:]], ['Exact Match', 'Universal'])
+
+    def test_donation_ndjson_gzipped(self):
+        for donor, units in [(self.exact, 2), (self.universal, 1)]:
+            BloodDonation.objects.create(donor=donor, hospital_name='MCH', blood_group=donor.blood_group, units_donated=units)
+        response = self.client.get(reverse('export_data', args=['donations', 'ndjson']), {'blood_group': 'O-'},
+                                   HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode().splitlines()
+        self.assertEqual([json.loads(line)['donor_name'] for line in lines], ['Universal'])
+
+    def test_staff_only_and_bad_input(self):
+        self.assertEqual(self.get('requests', 'csv', district='Nowhere').status_code, 400)
+        self.assertEqual(self.get('passwords', 'csv').status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.get('donors', 'csv').status_code, 302)
+
+
+class APITests(TestCase):
+    def setUp(self):
+        self.alice = make_user('Alice', blood_group='A-', email='alice@example.com')
+        self.bob = make_user('Bob', blood_group='O-', email='bob@example.com')
+        make_user('Carol', blood_group='B+', email='carol@example.com')
+
+    def test_donor_search_with_projection_and_pages(self):
+        url = reverse('api_donors')
+        response = self.client.get(url, {'blood_group': 'A-', 'fields': 'name,blood_group', 'page_size': 1})
+        data = response.json()
+        self.assertEqual(data['results'], [{'name': 'Alice', 'blood_group': 'A-'}])
+        self.assertIsNone(data['previous'])
+        data = self.client.get(data['next']).json()
+        self.assertEqual(data['results'], [{'name': 'Bob', 'blood_group': 'O-'}])
+        self.assertIsNone(data['next'])
+
+        self.assertEqual(self.client.get(url, {'fields': 'name,email'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'cursor': 'garbage'}).status_code, 400)
+
+    def test_pollers_get_304_until_data_changes(self):
+        url = reverse('api_donors')
+        first = self.client.get(url)
+        self.assertEqual(first['Cache-Control'], 'no-cache')
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(2):
+            # newest updated_at and the delete marker
+            repeat = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+
+        BloodDonation.objects.create(donor=self.bob, hospital_name='MCH', blood_group='O-')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.json()['results'][1]['donation_count'], 1)
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite specific')
+    def test_validator_is_an_index_lookup(self):
+        url = reverse('api_donors')
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                cursor.execute(f"EXPLAIN QUERY PLAN {query['sql']}")
+                plan = [row[-1] for row in cursor.fetchall()]
+                self.assertTrue(all(step.startswith('SEARCH ') for step in plan), plan)
+
+    def test_deletes_and_bulk_updates_change_the_etag(self):
+        url = reverse('api_donors')
+        first = self.client.get(url)['ETag']
+        # Bob is not the newest donor, so MAX(updated_at) stays the same
+        self.bob.delete()
+        second = self.client.get(url, HTTP_IF_NONE_MATCH=first)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(len(second.json()['results']), 2)
+
+        requests_url = reverse('api_requests')
+        request = BloodRequest.objects.create(
+            requester=self.alice, blood_group='A-', hospital_name='H', required_date=date(2025, 1, 1))
+        etag = self.client.get(requests_url)['ETag']
+        BloodRequest.objects.filter(pk=request.pk).update(status='Fulfilled')
+        self.assertEqual(self.client.get(requests_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.client.get(requests_url)['ETag']
+        request.delete()
+        self.assertEqual(self.client.get(requests_url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_eligible_now_validators_change_at_midnight(self):
+        url = reverse('api_donors')
+        first = self.client.get(url, {'eligible_now': 'on'})
+        self.assertEqual(self.client.get(url, {'eligible_now': 'on'}, HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        with mock.patch.object(timezone, 'localdate', return_value=tomorrow):
+            later = self.client.get(url, {'eligible_now': 'on'}, HTTP_IF_NONE_MATCH=first['ETag'],
+                                    HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(later.status_code, 200)
+
+    def test_inventory_and_requests(self):
+        self.assertEqual(self.client.get(reverse('api_inventory')).status_code, 302)
+        self.client.force_login(StaffUser.objects.create_user('staff', password='pw'))
+        apply_transaction('O-', 'Donation', 4)
+        first = self.client.get(reverse('api_inventory'))
+        self.assertEqual(first.json()['results'][0]['available_units'], 4)
+        apply_transaction('O-', 'Donation', 1)
+        self.assertEqual(self.client.get(reverse('api_inventory'), HTTP_IF_NONE_MATCH=first['ETag']).status_code, 200)
+
+        request = BloodRequest.objects.create(requester=self.alice, blood_group='A-', hospital_name='GH',
+                                              required_date=date(2030, 1, 1))
+        url = reverse('api_requests')
+        first = self.client.get(url, {'blood_group': 'A-'})
+        self.assertEqual(first.json()['results'][0]['status'], 'Pending')
+        request.status = 'Fulfilled'
+        request.save()
+        second = self.client.get(url, {'blood_group': 'A-'}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.json()['results'][0]['status'], 'Fulfilled')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite pragmas')
+class SQLiteTuningTests(TestCase):
+    def test_new_connections_get_pragmas_and_maintenance_runs(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        other = connections['default'].__class__({**connection.settings_dict, 'NAME': f'{directory}/db.sqlite3'}, alias='tuning')
+        other.ensure_connection()
+        try:
+            self.assertEqual(sqlite.pragma(other, 'journal_mode'), 'wal')
+            self.assertEqual(sqlite.pragma(other, 'synchronous'), 1)
+            self.assertEqual(sqlite.pragma(other, 'busy_timeout'), 20000)
+            self.assertEqual(sqlite.pragma(other, 'temp_store'), 2)
+            with other.cursor() as cursor:
+                cursor.execute('CREATE TABLE t (x TEXT)')
+                cursor.executemany('INSERT INTO t VALUES (?)', [('x' * 500,)] * 200)
+                cursor.execute('DELETE FROM t')
+            report = sqlite.maintain(other, vacuum=True)
+            self.assertTrue(report['vacuumed'])
+            self.assertEqual(sqlite.pragma(other, 'auto_vacuum'), 2)
+            self.assertIn('checkpointed_pages', report)
+        finally:
+            other.close()
+
+        out = StringIO()
+        call_command('dbmaintain', stdout=out)
+        self.assertIn('Database maintained', out.getvalue())
+
+
+@skipUnless(connection.vendor == 'postgresql', 'PostgreSQL specific')
+class PostgresTests(TestCase):
+    def test_trigram_indexes_exist(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'blood_app_user'")
+            names = {row[0] for row in cursor.fetchall()}
+        self.assertLessEqual({'user_name_trgm_idx', 'user_email_trgm_idx', 'user_phone_trgm_idx'}, names)
+
+    def test_iterators_stream_through_server_side_cursors(self):
+        make_user('Alice', email='alice@example.com')
+        make_user('Bob', email='bob@example.com')
+        rows = User.objects.values_list('name', flat=True).iterator(chunk_size=1)
+        self.assertIn(next(rows), {'Alice', 'Bob'})
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_cursors WHERE name LIKE '_django_curs_%'")
+            self.assertEqual(cursor.fetchone()[0], 1)
+        rows.close()
+
+
+class SyntheticDataTests(TestCase):
+    def test_seeding_is_repeatable_and_consistent(self):
+        created = synthetic.generate(300, seed=7)
+        self.assertEqual(created, {'donors': 300, 'donations': 600, 'requests': 15, 'emergency contacts': 150})
+        first = list(User.objects.order_by('pk').values_list('name', 'district', 'taluk', 'blood_group')[:20])
+        self.assertEqual(User.objects.values('district').distinct().count(), len(geography.KERALA))
+        self.assertTrue(all(geography.DISTRICT_BY_TALUK[taluk] == district for _, district, taluk, _ in first))
+        # Counters and rollups were brought up to date after the raw inserts
+        self.assertEqual(reconcile_donation_counters(), 0)
+        self.assertEqual(rollups.total_donations(), 600)
+
+        with self.assertRaises(CommandError):
+            call_command('seed_synthetic', donors=300, stdout=StringIO())
+        call_command('seed_synthetic', donors=300, seed=7, replace=True, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 300)
+        self.assertEqual(list(User.objects.order_by('pk').values_list('name', 'district', 'taluk', 'blood_group')[:20]), first)
+
+        names = [name for name, _ in synthetic.sample_urls()]
+        self.assertIn('donation_certificate', names)
+        self.assertIn('api_inventory', names)
+
+
+class InstrumentationTests(TestCase):
+    def test_fingerprints_collapse_literals_and_in_lists(self):
+        self.assertEqual(
+            instrumentation.fingerprint('SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = \'Bob\' LIMIT 21'),
+            instrumentation.fingerprint('SELECT *  FROM t\nWHERE id IN (%s) AND name = \'Alice\' LIMIT 5'),
+        )
+
+    def test_server_timing_header_and_slow_log(self):
+        for i in range(3):
+            make_user(f'Donor {i}', email=f'donor{i}@example.com')
+        self.assertNotIn('Server-Timing', self.client.get(reverse('donor_list')))
+        self.client.force_login(StaffUser.objects.create_user('staff', password='pw', is_staff=True))
+        response = self.client.get(reverse('donor_list'))
+        self.assertRegex(response['Server-Timing'], r'^db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+, app;dur=[\d.]+$')
+        self.assertNotIn('tpl;dur=0.0,', response['Server-Timing'])
+        with self.settings(SERVER_TIMING_HEADER=True):
+            self.assertIn('Server-Timing', Client().get(reverse('donor_list')))
+
+        with self.settings(SLOW_REQUEST_MS=0, SLOW_REQUEST_SAMPLE_RATE=1.0):
+            # Middleware settings are read when the handler is built
+            with self.assertLogs('blood_app.instrumentation', 'WARNING') as logs:
+                Client().get(reverse('donor_list'), {'blood_group': 'O+'})
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['view'], 'donor_list')
+        self.assertEqual(record['queries'], sum(count for _, count in record['fingerprints']))
+        self.assertTrue(all('%s' not in entry['sql'] for entry in record['slowest']))
+
+
+class ProfilerTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.settings_override = self.settings(PROFILE_DIR=Path(directory), PROFILE_KEEP=2)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.directory = Path(directory)
+
+    def test_only_staff_can_profile(self):
+        response = self.client.get(reverse('donor_list'), {'_profile': '1'})
+        self.assertNotIn('X-Profile-Capture', response)
+        self.client.force_login(StaffUser.objects.create_user('clerk', password='pw'))
+        response = self.client.get(reverse('donor_list'), HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Capture', response)
+        self.assertEqual(list(self.directory.iterdir()), [])
+
+    def test_captures_are_saved_rotated_and_listed(self):
+        self.client.force_login(StaffUser.objects.create_user('staff', password='pw', is_staff=True))
+        make_user('Alice', email='alice@example.com')
+        ids = [self.client.get(reverse('donor_list'), {'_profile': '1', 'n': n})['X-Profile-Capture'] for n in range(3)]
+        self.assertEqual(sorted(path.stem for path in self.directory.glob('*.json')), sorted(ids[1:]))
+
+        stats = pstats.Stats(str(self.directory / f'{ids[2]}.prof'))
+        self.assertTrue(any(name == 'donor_list' for _, _, name in stats.stats))
+        for line in (self.directory / f'{ids[2]}.collapsed').read_text().splitlines():
+            stack, samples = line.rsplit(' ', 1)
+            self.assertTrue(stack.startswith('blood_app/profiling.py'))
+            self.assertGreater(int(samples), 0)
+
+        page = self.client.get(reverse('profile_captures'))
+        self.assertContains(page, '/donors/?_profile=1&amp;n=2')
+        self.assertContains(page, 'Cumulative ms')
+        download = self.client.get(reverse('profile_captures'), {'file': f'{ids[2]}.collapsed'})
+        self.assertEqual(download.status_code, 200)
+        self.assertIn('attachment', download['Content-Disposition'])
+        download.close()
+        self.assertEqual(self.client.get(reverse('profile_captures'), {'file': '../settings.py'}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('profile_captures'), {'file': f'{ids[0]}.prof'}).status_code, 404)
@@ -0,0 +1,85 @@
+"""
+Sized derivatives of donor photos.
+
+Uploads are kept as they are, and square thumbnails at ``SIZES`` pixels are
+written next to them under ``thumbs/`` in WebP and JPEG, with the EXIF
+orientation applied and all metadata dropped. Listing pages reference them
+through the ``donor_photo`` template tag (``<picture>`` with 1x/2x
+``srcset``) instead of shipping the full-size original.
+
+Derivatives are written through ``default_storage`` by their own names; the
+photo storage would rename them by content. Photo names are content hashes,
+so existing derivatives of a name are reused rather than rendered again.
+Thumbnails are made when a photo is saved (signals.py) and by
+``python manage.py make_thumbnails`` for existing uploads.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+SIZES = (48, 100, 150)
+FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 6},
+    'jpg': {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True},
+}
+
+
+def derivative_name(photo_name, size, ext):
+    stem = posixpath.splitext(photo_name)[0]
+    return posixpath.join('thumbs', f'{stem}-{size}.{ext}')
+
+
+def derivative_names(photo_name):
+    return [derivative_name(photo_name, size, ext) for size in SIZES for ext in FORMATS]
+
+
+def render(image, size, ext):
+    """Encode a square ``size`` px crop of ``image`` (already transposed) without metadata"""
+    thumb = ImageOps.fit(image, (size, size), Image.LANCZOS)
+    output = BytesIO()
+    # Passing no exif/icc arguments means Pillow writes none
+    thumb.save(output, **FORMATS[ext])
+    return output.getvalue()
+
+
+def generate(photo, force=False):
+    """Write every derivative of ``photo`` (a FieldFile); returns False if it is not a readable image"""
+    names = derivative_names(photo.name)
+    if not force and all(default_storage.exists(name) for name in names):
+        return True
+    try:
+        with photo.storage.open(photo.name, 'rb') as source:
+            image = Image.open(source)
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGB')
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.warning('Cannot make thumbnails for %s: %s', photo.name, e)
+        return False
+    for size in SIZES:
+        for ext in FORMATS:
+            name = derivative_name(photo.name, size, ext)
+            default_storage.delete(name)
+            default_storage.save(name, ContentFile(render(image, size, ext)))
+    return True
+
+
+def delete(photo_name):
+    for name in derivative_names(photo_name):
+        default_storage.delete(name)
+
+
+def url(photo_name, size, ext):
+    return default_storage.url(derivative_name(photo_name, size, ext))
+
+
+def srcset_sizes(display_size):
+    """The derivative sizes to offer for ``display_size`` CSS px at 1x and 2x"""
+    one_x = next((size for size in SIZES if size >= display_size), SIZES[-1])
+    two_x = next((size for size in SIZES if size >= display_size * 2), SIZES[-1])
+    return one_x, two_x
@@ -1,6 +1,6 @@
 from django.urls import path
 from django.views.generic import RedirectView
-from . import views
+from . import api, views
 
 
 urlpatterns = [
@@ -13,16 +13,24 @@ urlpatterns = [
     path('requests/', views.request_list, name='request_list'),
     path('hospital/', views.hospital_dashboard, name='hospital_dashboard'),
     path('certificate/<int:user_id>/', views.donor_certificate, name='donor_certificate'),
+    path('certificate/<int:user_id>/pdf/', views.donor_certificate_pdf, name='donor_certificate_pdf'),
     path('certificate/lookup/', views.certificate_lookup, name='certificate_lookup'),
     path('requests/<int:request_id>/status/', views.update_request_status, name='update_request_status'),
     path('donations/', views.donation_list, name='donation_list'),
     path('donations/record/', views.record_donation, name='record_donation'),
     path('donations/<int:donation_id>/certificate/', views.donation_certificate, name='donation_certificate'),
+    path('donations/<int:donation_id>/certificate/pdf/', views.donation_certificate_pdf, name='donation_certificate_pdf'),
+    path('donations/certificates.zip', views.bulk_donation_certificates, name='bulk_donation_certificates'),
+    path('exports/<slug:dataset>.<slug:fmt>', views.export_data, name='export_data'),
     path('inventory/', views.blood_inventory, name='blood_inventory'),
     path('user/<int:user_id>/emergency-contacts/', views.add_emergency_contacts, name='add_emergency_contacts'),
     path('user/<int:user_id>/profile/', views.user_profile, name='user_profile'),
     path('statistics/', views.statistics, name='statistics'),
     path('get-taluks/', views.get_taluks, name='get_taluks'),
+    path('profiles/', views.profile_captures, name='profile_captures'),
+    path('api/v1/donors/', api.donors, name='api_donors'),
+    path('api/v1/requests/', api.requests, name='api_requests'),
+    path('api/v1/inventory/', api.inventory, name='api_inventory'),
 ]
 
 
@@ -2,32 +2,27 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.utils import timezone
-from django.core.mail import send_mail
-from django.db.models import Q, Count
-from .models import User, BloodRequest, BloodDonation, BloodInventory, EmergencyContact
-from .forms import UserForm, BloodRequestForm, BloodDonationForm, BloodInventoryForm, EmergencyContactForm, BloodSearchForm
+from django.db import transaction
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.cache import cache_control
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
+from .models import User, BloodRequest, BloodDonation, BloodInventory, EmergencyContact, InventoryTransaction
+from . import bulk_certificates, certificates, dashboard, exports, geography, profiling, rollups
+from .forms import UserForm, BloodRequestForm, BloodDonationForm, BloodInventoryForm, InventoryMovementForm, EmergencyContactForm, BloodSearchForm, CertificateBatchForm
+from .inventory import InsufficientInventory, receive_donation, remove_units, set_available_units
+from .notifications import queue_request_notifications, with_delivery_stats
+from .pagination import paginate
+from .search import search_names
 
 
 def home(request):
-    # Get blood inventory status for dashboard
-    inventory = BloodInventory.objects.all()
-    critical_blood_groups = [inv for inv in inventory if inv.is_critical()]
-    
-    # Get recent donations
-    recent_donations = BloodDonation.objects.select_related('donor').order_by('-donation_date')[:5]
-    
-    # Get statistics
-    total_donors = User.objects.filter(willing_to_donate=True).count()
-    total_donations = BloodDonation.objects.count()
-    total_requests = BloodRequest.objects.count()
-    
+    # Inventory, recent donations and counts come from the cache; see dashboard.py
     return render(request, 'blood_app/home.html', {
-        'inventory': inventory,
-        'critical_blood_groups': critical_blood_groups,
-        'recent_donations': recent_donations,
-        'total_donors': total_donors,
-        'total_donations': total_donations,
-        'total_requests': total_requests,
+        **dashboard.get_dashboard(),
         'districts': User.DISTRICT_CHOICES,
     })
 
@@ -37,7 +32,8 @@ def register_user(request):
         form = UserForm(request.POST, request.FILES)
         if form.is_valid():
             try:
-                user = form.save()
+                with transaction.atomic():
+                    user = form.save()
                 messages.success(request, 'Registration successful!')
                 return redirect('add_emergency_contacts', user_id=user.id)
             except Exception as e:
@@ -55,27 +51,12 @@ def register_user(request):
 def donor_list(request):
     form = BloodSearchForm(request.GET)
     donors = User.objects.filter(willing_to_donate=True)
-    
+    ordering = ('name', 'id')
     if form.is_valid():
-        blood_group = form.cleaned_data.get('blood_group')
-        district = form.cleaned_data.get('district')
-        taluk = form.cleaned_data.get('taluk')
-        min_age = form.cleaned_data.get('min_age')
-        max_age = form.cleaned_data.get('max_age')
-        
-        if blood_group:
-            donors = donors.filter(blood_group=blood_group)
-        if district:
-            donors = donors.filter(district=district)
-        if taluk:
-            donors = donors.filter(taluk=taluk)
-        if min_age:
-            donors = donors.filter(age__gte=min_age)
-        if max_age:
-            donors = donors.filter(age__lte=max_age)
-    
+        donors, ordering = form.search_donors(donors)
+
     return render(request, 'blood_app/donor_list.html', {
-        'donors': donors,
+        'donors': paginate(request, donors, ordering),
         'form': form,
         'blood_groups': User.BLOOD_GROUP_CHOICES,
         'districts': User.DISTRICT_CHOICES,
@@ -88,9 +69,12 @@ def request_blood(request, user_id):
     if request.method == 'POST':
         form = BloodRequestForm(request.POST)
         if form.is_valid():
-            blood_request = form.save(commit=False)
-            blood_request.requester = user
-            blood_request.save()
+            with transaction.atomic():
+                blood_request = form.save(commit=False)
+                blood_request.requester = user
+                blood_request.save()
+                # Queue the requester confirmation and donor alerts; `send_notifications` delivers them
+                queue_request_notifications(blood_request)
             messages.success(request, 'Blood request submitted!')
             
             # Check inventory and notify if critical
@@ -100,49 +84,6 @@ def request_blood(request, user_id):
                     messages.warning(request, f'Warning: {blood_request.blood_group} blood is at critical level!')
             except BloodInventory.DoesNotExist:
                 pass
-            
-            # Notify the requester (confirmation)
-            try:
-                if user.email:
-                    send_mail(
-                        subject=f"Your blood request for {blood_request.blood_group}",
-                        message=(
-                            f"Hi {user.name}, your request was received.\n\n"
-                            f"Hospital: {blood_request.hospital_name}\n"
-                            f"Required Date: {blood_request.required_date}\n"
-                        ),
-                        from_email=None,
-                        recipient_list=[user.email],
-                        fail_silently=True,
-                    )
-            except Exception:
-                pass
-
-            # Notify willing donors of the same blood group
-            try:
-                matching_donors = User.objects.filter(
-                    willing_to_donate=True,
-                    blood_group=blood_request.blood_group,
-                ).exclude(email='')
-                for donor in matching_donors:
-                    send_mail(
-                        subject=f"Urgent: {blood_request.blood_group} blood needed",
-                        message=(
-                            f"Dear {donor.name},\n\n"
-                            f"A recipient has requested {blood_request.blood_group} blood.\n\n"
-                            f"Requester: {user.name}\n"
-                            f"City: {user.city}\n"
-                            f"Contact: {user.phone}{' / ' + user.email if user.email else ''}\n"
-                            f"Hospital: {blood_request.hospital_name}\n"
-                            f"Required Date: {blood_request.required_date}\n\n"
-                            f"If you're available, please contact the requester or hospital directly.\n"
-                        ),
-                        from_email=None,
-                        recipient_list=[donor.email],
-                        fail_silently=True,
-                    )
-            except Exception:
-                pass
             return redirect('request_list')
     else:
         form = BloodRequestForm()
@@ -150,32 +91,55 @@ def request_blood(request, user_id):
 
 
 def request_list(request):
-    requests = BloodRequest.objects.all()
+    requests = paginate(request, BloodRequest.objects.select_related('requester'), ('-required_date', '-id'))
     return render(request, 'blood_app/request_list.html', {'requests': requests})
 
 
 @login_required
 def hospital_dashboard(request):
-    users = User.objects.all().order_by('name')
-    requests = BloodRequest.objects.select_related('requester').order_by('-required_date')
-    donations = BloodDonation.objects.select_related('donor').order_by('-donation_date')
+    users = paginate(request, User.objects.all(), ('name', 'id'), param='users_cursor')
+    requests = paginate(
+        request,
+        with_delivery_stats(BloodRequest.objects.select_related('requester')),
+        ('-required_date', '-id'),
+        param='requests_cursor',
+    )
     inventory = BloodInventory.objects.all()
     
     return render(request, 'blood_app/hospital_dashboard.html', {
         'users': users,
         'requests': requests,
-        'donations': donations,
         'inventory': inventory,
         'request_statuses': ['Pending', 'Approved', 'Rejected', 'Fulfilled'],
+        'certificate_form': CertificateBatchForm(),
     })
 
 
+def _certificate_response(request, certificate, content_type, filename=None):
+    """Serve a cached certificate file, answering conditional GETs with 304"""
+    etag = quote_etag(certificate.etag)
+    last_modified = int(certificate.last_modified.timestamp())
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = FileResponse(open(certificate.path, 'rb'), content_type=content_type, filename=filename)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Revalidate every time: the cache key changes as soon as the donor or donation is edited
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
 def donor_certificate(request, user_id):
     donor = get_object_or_404(User, id=user_id)
-    if not donor.willing_to_donate:
-        # Optional: could restrict certificate
-        pass
-    return render(request, 'blood_app/donor_certificate.html', {'donor': donor})
+    return _certificate_response(request, certificates.donor_certificate(donor), 'text/html; charset=utf-8')
+
+
+def donor_certificate_pdf(request, user_id):
+    donor = get_object_or_404(User, id=user_id)
+    return _certificate_response(
+        request, certificates.donor_certificate(donor, 'pdf'), 'application/pdf',
+        filename=f'donor-certificate-{donor.id}.pdf',
+    )
 
 
 def certificate_lookup(request):
@@ -185,62 +149,53 @@ def certificate_lookup(request):
     # Accept multiple search modes:
     # 1) By email (gmail or any email)
     # 2) By name + age
-    # 3) Fallback: name + district (legacy)
+    # 3) By name alone, optionally narrowed by district/taluk
     email = request.POST.get('email', '').strip()
     name = request.POST.get('name', '').strip()
     age_raw = request.POST.get('age', '').strip()
     district = request.POST.get('district', '').strip()
     taluk = request.POST.get('taluk', '').strip()
 
-    matches = User.objects.none()
-
     # Prefer email if provided
     if email:
-        matches = User.objects.filter(email__iexact=email)
-        if not matches.exists():
+        matches = list(User.objects.filter(email__iexact=email))
+        if not matches:
             messages.error(request, 'No user found with that email.')
             return redirect('home')
-    # Next, try name + age
-    elif name and age_raw:
-        try:
-            age_val = int(age_raw)
-        except ValueError:
-            messages.error(request, 'Age must be a number.')
-            return redirect('home')
-        qs = User.objects.filter(name__icontains=name, age=age_val)
-        if district:
-            qs = qs.filter(district__icontains=district)
-        if taluk:
-            qs = qs.filter(taluk__icontains=taluk)
-        matches = qs
-        if not matches.exists():
-            messages.error(request, 'No matching user found for the given name and age.')
-            return redirect('home')
-    # Legacy: name + district, or name only fallback
     elif name:
-        qs = User.objects.filter(name__icontains=name)
+        filters = {}
+        if age_raw:
+            try:
+                filters['age'] = int(age_raw)
+            except ValueError:
+                messages.error(request, 'Age must be a number.')
+                return redirect('home')
         if district:
-            qs = qs.filter(district__icontains=district)
+            filters['district__iexact'] = district
         if taluk:
-            qs = qs.filter(taluk__icontains=taluk)
-        matches = qs
-        if not matches.exists():
-            messages.error(request, 'No matching user found. Please check the details provided.')
+            filters['taluk__iexact'] = taluk
+        # Ranked trigram search: tolerates typos and partial names (see search.py)
+        matches = search_names(name, **filters)
+        if not matches:
+            if age_raw:
+                messages.error(request, 'No matching user found for the given name and age.')
+            else:
+                messages.error(request, 'No matching user found. Please check the details provided.')
             return redirect('home')
     else:
         messages.error(request, 'Please provide email, or name with age.')
         return redirect('home')
 
     # One match → if user has donations, open latest donation certificate; else go to profile
-    if matches.count() == 1:
-        user = matches.first()
-        latest_donation = user.blooddonation_set.order_by('-donation_date').first()
+    if len(matches) == 1:
+        user = matches[0]
+        latest_donation = user.donation_count and user.blooddonation_set.order_by('-donation_date').first()
         if latest_donation:
             return redirect('donation_certificate', donation_id=latest_donation.id)
         return redirect('user_profile', user_id=user.id)
 
     return render(request, 'blood_app/certificate_results.html', {
-        'results': matches.order_by('name'),
+        'results': matches,
         'q_name': name,
         'q_district': district,
     })
@@ -266,18 +221,11 @@ def record_donation(request):
     if request.method == 'POST':
         form = BloodDonationForm(request.POST)
         if form.is_valid():
-            donation = form.save()
-            
-            # Update blood inventory
-            try:
-                inventory = BloodInventory.objects.get(blood_group=donation.blood_group)
-                inventory.available_units += donation.units_donated
-                inventory.save()
-            except BloodInventory.DoesNotExist:
-                BloodInventory.objects.create(
-                    blood_group=donation.blood_group,
-                    available_units=donation.units_donated
-                )
+            with transaction.atomic():
+                donation = form.save()
+                
+                # Update blood inventory through the ledger
+                receive_donation(donation)
             
             messages.success(request, f'Blood donation recorded successfully for {donation.donor.name}!')
             return redirect('donation_certificate', donation_id=donation.id)
@@ -298,40 +246,105 @@ def record_donation(request):
 
 
 def donation_certificate(request, donation_id):
-    donation = get_object_or_404(BloodDonation, id=donation_id)
-    return render(request, 'blood_app/blood_donation_certificate.html', {'donation': donation})
+    donation = get_object_or_404(BloodDonation.objects.select_related('donor'), id=donation_id)
+    return _certificate_response(request, certificates.donation_certificate(donation), 'text/html; charset=utf-8')
+
+
+def donation_certificate_pdf(request, donation_id):
+    donation = get_object_or_404(BloodDonation.objects.select_related('donor'), id=donation_id)
+    return _certificate_response(
+        request, certificates.donation_certificate(donation, 'pdf'), 'application/pdf',
+        filename=f'donation-certificate-{donation.id}.pdf',
+    )
+
+
+@staff_member_required
+def bulk_donation_certificates(request):
+    """ZIP of PDF certificates for every donation matching the date range / hospital"""
+    form = CertificateBatchForm(request.GET)
+    if not form.is_valid():
+        messages.error(request, 'Choose a valid date range or hospital for the certificate batch.')
+        return redirect('hospital_dashboard')
+    donations = bulk_certificates.matching_donations(**form.cleaned_data)
+    if not donations.exists():
+        messages.warning(request, 'No donations match those filters.')
+        return redirect('hospital_dashboard')
+    response = StreamingHttpResponse(
+        bulk_certificates.stream_zip(bulk_certificates.render_all(donations)),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = 'attachment; filename="donation-certificates.zip"'
+    return response
+
+
+@staff_member_required
+@gzip_page
+def export_data(request, dataset, fmt):
+    """Stream donors, donations or requests matching the donor search filters as CSV or NDJSON"""
+    if dataset not in exports.EXPORTS or fmt not in exports.FORMATS:
+        raise Http404('Unknown export')
+    form = BloodSearchForm(request.GET)
+    if not form.is_valid():
+        return HttpResponseBadRequest(form.errors.as_text(), content_type='text/plain; charset=utf-8')
+    columns, rows = exports.export_rows(dataset, form)
+    response = StreamingHttpResponse(exports.stream(fmt, columns, rows), content_type=exports.FORMATS[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{dataset}-{timezone.localdate():%Y-%m-%d}.{fmt}"'
+    return response
+
+
+@staff_member_required
+def profile_captures(request):
+    """Recent profiler captures (see profiling.py), or one of their files with ?file="""
+    name = request.GET.get('file')
+    if name:
+        path = profiling.capture_file(name)
+        if path is None:
+            raise Http404('No such capture')
+        return FileResponse(open(path, 'rb'), as_attachment=True, filename=name)
+    return render(request, 'blood_app/profile_captures.html', {'captures': profiling.captures()})
 
 
 def donation_list(request):
-    donations = BloodDonation.objects.select_related('donor').order_by('-donation_date')
+    donations = paginate(request, BloodDonation.objects.select_related('donor'), ('-donation_date', '-id'))
     return render(request, 'blood_app/donation_list.html', {'donations': donations})
 
 
 @login_required
 def blood_inventory(request):
-    if request.method == 'POST':
-        form = BloodInventoryForm(request.POST)
+    form = BloodInventoryForm()
+    movement_form = InventoryMovementForm()
+    if request.method == 'POST' and request.POST.get('action') == 'movement':
+        movement_form = InventoryMovementForm(request.POST)
+        if movement_form.is_valid():
+            data = movement_form.cleaned_data
+            try:
+                remove_units(data['blood_group'], data['kind'], data['units'], note=data['note'])
+            except InsufficientInventory as e:
+                movement_form.add_error('units', str(e))
+            else:
+                messages.success(request, f"{data['kind']} of {data['units']} {data['blood_group']} unit(s) recorded")
+                return redirect('blood_inventory')
+    elif request.method == 'POST':
+        # Bind to the existing row (if any) so the unique blood group check passes on updates
+        existing = BloodInventory.objects.filter(blood_group=request.POST.get('blood_group')).first()
+        form = BloodInventoryForm(request.POST, instance=existing)
         if form.is_valid():
-            inventory, created = BloodInventory.objects.get_or_create(
-                blood_group=form.cleaned_data['blood_group'],
-                defaults={
-                    'available_units': form.cleaned_data['available_units'],
-                    'critical_level': form.cleaned_data['critical_level']
-                }
+            blood_group = form.cleaned_data['blood_group']
+            # Recorded as an Adjustment in the ledger rather than overwriting the balance
+            set_available_units(
+                blood_group,
+                form.cleaned_data['available_units'],
+                critical_level=form.cleaned_data['critical_level'],
             )
-            if not created:
-                inventory.available_units = form.cleaned_data['available_units']
-                inventory.critical_level = form.cleaned_data['critical_level']
-                inventory.save()
-            messages.success(request, f'Blood inventory updated for {inventory.blood_group}')
+            messages.success(request, f'Blood inventory updated for {blood_group}')
             return redirect('blood_inventory')
-    else:
-        form = BloodInventoryForm()
     
     inventory_list = BloodInventory.objects.all().order_by('blood_group')
     return render(request, 'blood_app/blood_inventory.html', {
         'form': form,
-        'inventory_list': inventory_list
+        'movement_form': movement_form,
+        'inventory_list': inventory_list,
+        'recent_transactions': InventoryTransaction.objects.all()[:10],
     })
 
 
@@ -370,33 +383,34 @@ def user_profile(request, user_id):
 
 
 def statistics(request):
+    # All figures come from the rollup tables maintained in rollups.py
+    years = rollups.donation_years()
+    try:
+        year = int(request.GET.get('year', ''))
+    except ValueError:
+        year = None
+    if year not in years:
+        year = years[0] if years else timezone.now().year
+
     # Blood group distribution
-    blood_group_stats = User.objects.filter(willing_to_donate=True).values('blood_group').annotate(
-        count=Count('id')
-    ).order_by('blood_group')
+    blood_group_stats = rollups.donors_by_blood_group()
+    total_donors = sum(stat['count'] for stat in blood_group_stats)
+    for stat in blood_group_stats:
+        stat['percentage'] = 100 * stat['count'] / total_donors
     
-    # Donation statistics
-    donation_stats = BloodDonation.objects.values('blood_group').annotate(
-        total_units=Count('units_donated'),
-        total_donations=Count('id')
-    ).order_by('blood_group')
+    # Donation statistics for the selected year
+    donation_stats = rollups.donations_by_blood_group(year)
     
-    # Monthly donation trends (improved for SQLite)
-    monthly_donations = []
+    # Monthly donation trends for the selected year
     month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
                    'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    
-    for month in range(1, 13):
-        count = BloodDonation.objects.filter(donation_date__month=month).count()
-        monthly_donations.append({
-            'month': month, 
-            'month_name': month_names[month-1],
-            'count': count
-        })
+    monthly_donations = [
+        {'month': month, 'month_name': month_names[month - 1], 'count': count}
+        for month, count in enumerate(rollups.monthly_donations(year), start=1)
+    ]
     
     # Additional statistics for the template
-    total_donors = User.objects.filter(willing_to_donate=True).count()
-    total_donations = BloodDonation.objects.count()
+    total_donations = rollups.total_donations()
     total_requests = BloodRequest.objects.count()
     
     # Get critical blood groups
@@ -404,6 +418,8 @@ def statistics(request):
     critical_blood_groups = [inv for inv in inventory if inv.is_critical()]
     
     return render(request, 'blood_app/statistics.html', {
+        'year': year,
+        'years': years,
         'blood_group_stats': blood_group_stats,
         'donation_stats': donation_stats,
         'monthly_donations': monthly_donations,
@@ -414,12 +430,10 @@ def statistics(request):
     })
 
 
+@cache_control(public=True, max_age=86400)
+@condition(etag_func=lambda request: geography.TALUK_MAP_ETAG)
 def get_taluks(request):
     """AJAX view to get taluks for a selected district"""
-    from django.http import JsonResponse
-    
+    # The map is fixed per deploy: browsers revalidate daily and get a 304 while the ETag matches
     district = request.GET.get('district')
-    if district:
-        taluks = User.get_taluks_by_district(district)
-        return JsonResponse({'taluks': taluks})
-    return JsonResponse({'taluks': []})
+    return JsonResponse({'taluks': list(geography.taluks_for(district))})